@@ -0,0 +1,104 @@
+r"""Benchmark global layer allocation on synthetic heterogeneous fleets.
+
+Builds fleets of randomly mixed GPUs and times `global_allocation` of the layer
+allocators, the cost a scheduler pays on every global rebalance.
+
+Run from the repository root:
+    PYTHONPATH=src python src/backend/benchmark/benchmark_layer_allocation.py \
+        --num-nodes 50 100 200 500 \
+        --num-layers 36 \
+        --strategy dp
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from scheduling.layer_allocation import (
+    DynamicProgrammingLayerAllocator,
+    GreedyLayerAllocator,
+)
+from scheduling.model_info import ModelInfo
+from scheduling.node import Node, NodeHardwareInfo
+
+# (name, tflops_fp16, memory_gb, memory_bandwidth_gbps)
+GPU_TYPES = [
+    ("a100-80g", 312.0, 80.0, 2039.0),
+    ("a100-40g", 312.0, 40.0, 1935.0),
+    ("rtx5090", 104.8, 32.0, 1792.0),
+    ("rtx4090", 82.6, 24.0, 1008.0),
+]
+
+
+def build_model_info(num_layers: int) -> ModelInfo:
+    """GPT-OSS-like MoE model with `num_layers` decoder layers."""
+    return ModelInfo(
+        model_name=f"GPUOss-{num_layers}L",
+        mlx_model_name=f"MLXOss-{num_layers}L",
+        head_size=64,
+        hidden_dim=2880,
+        intermediate_dim=2880,
+        num_attention_heads=64,
+        num_kv_heads=8,
+        vocab_size=201088,
+        num_layers=num_layers,
+        ffn_num_projections=3,
+        num_local_experts=128,
+        num_experts_per_tok=4,
+        param_bytes_per_element=1,
+        mlx_param_bytes_per_element=1,
+        cache_bytes_per_element=2,
+        embedding_bytes_per_element=2,
+    )
+
+
+def build_fleet(num_nodes: int, model_info: ModelInfo, seed: int) -> List[Node]:
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(num_nodes):
+        name, tflops, memory_gb, bandwidth = rng.choice(GPU_TYPES)
+        hardware = NodeHardwareInfo(f"{name}-{i}", 1, tflops, "", memory_gb, bandwidth, "cuda")
+        nodes.append(Node(node_id=hardware.node_id, hardware=hardware, model_info=model_info))
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--num-nodes", type=int, nargs="+", default=[50, 100, 200, 500])
+    parser.add_argument("--num-layers", type=int, default=36)
+    parser.add_argument("--strategy", choices=["dp", "greedy"], default="dp")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--time-budget-s",
+        type=float,
+        default=None,
+        help="Time budget of the DP search (dp strategy only)",
+    )
+    args = parser.parse_args()
+
+    model_info = build_model_info(args.num_layers)
+    print(f"{'nodes':>6} {'pipelines':>10} {'best_s':>10} {'mean_s':>10}")
+    for num_nodes in args.num_nodes:
+        timings = []
+        for repeat in range(args.repeats):
+            nodes = build_fleet(num_nodes, model_info, seed=args.seed + repeat)
+            if args.strategy == "dp":
+                allocator = DynamicProgrammingLayerAllocator(
+                    model_info, nodes, time_budget_s=args.time_budget_s
+                )
+            else:
+                allocator = GreedyLayerAllocator(model_info, nodes)
+            start = time.perf_counter()
+            allocator.global_allocation()
+            timings.append(time.perf_counter() - start)
+        num_pipelines = len(allocator.embedding_node_ids)
+        print(
+            f"{num_nodes:>6} {num_pipelines:>10} {min(timings):>10.3f} "
+            f"{sum(timings) / len(timings):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -177,6 +177,7 @@ if __name__ == "__main__":
         announce_maddrs=args.announce_maddrs,
         http_port=args.port,
         use_hfcache=args.use_hfcache,
+        allocation_time_budget_s=args.allocation_time_budget_s,
     )
 
     request_handler.set_scheduler_manage(scheduler_manage)
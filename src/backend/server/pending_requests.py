@@ -0,0 +1,115 @@
+"""
+Requests waiting for routing capacity.
+
+When every pipeline is busy the scheduler resolves a request with an empty routing
+table. Instead of sleeping a fixed interval before asking again, RequestHandler parks
+the request in a PendingRequestQueue. The scheduler calls `notify` as soon as nodes
+report freed capacity, which wakes the longest-waiting requests first (ordered by when
+they were first received, so a request keeps its place across retries). A fallback
+timeout still re-polls the scheduler in case a notification is missed.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import List
+
+from parallax_utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(order=True)
+class _Waiter:
+    received_ts: float
+    seq: int
+    loop: asyncio.AbstractEventLoop = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    # Set under the queue lock; exactly one of them ends up True
+    woken: bool = field(default=False, compare=False)
+    abandoned: bool = field(default=False, compare=False)
+
+
+class PendingRequestQueue:
+    """Oldest-first queue of requests waiting for capacity; `notify` is thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: List[_Waiter] = []
+        self._num_abandoned = 0
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._waiters) - self._num_abandoned
+
+    async def wait(self, received_ts: float, timeout: float) -> bool:
+        """
+        Waits until capacity frees up for this request or `timeout` expires.
+
+        Args:
+            received_ts: When the request was first received; earlier requests are
+                woken first.
+            timeout: Longest time to wait in seconds.
+
+        Returns:
+            True if woken by `notify`, False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(received_ts, next(self._seq), loop, loop.create_future())
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max(0.0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            with self._lock:
+                if not waiter.woken:
+                    self._abandon(waiter)
+                    return False
+            # Woken concurrently with the timeout; take the wake-up
+            await waiter.future
+            return True
+        finally:
+            # Also reached when the waiting task is cancelled
+            with self._lock:
+                if not waiter.woken:
+                    self._abandon(waiter)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.abandoned:
+            return
+        waiter.abandoned = True
+        self._num_abandoned += 1
+        # Drop timed-out entries once they make up most of the heap
+        if self._num_abandoned > len(self._waiters) // 2:
+            self._waiters = [w for w in self._waiters if not w.abandoned]
+            heapq.heapify(self._waiters)
+            self._num_abandoned = 0
+
+    def notify(self, n: int = 1) -> int:
+        """Wakes up to `n` of the longest-waiting requests; returns how many were woken."""
+        woken = 0
+        with self._lock:
+            while woken < n and self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                if waiter.abandoned:
+                    self._num_abandoned -= 1
+                    continue
+                try:
+                    waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+                except RuntimeError:
+                    # The waiter's event loop is gone
+                    continue
+                waiter.woken = True
+                woken += 1
+        if woken:
+            logger.debug(f"Woke {woken} requests waiting for capacity")
+        return woken
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(True)
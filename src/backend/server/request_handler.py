@@ -1,4 +1,5 @@
 import json
+import math
 import time
 from typing import Dict
 
@@ -20,11 +21,15 @@ class RequestHandler:
 
     Behavior for routing resolution:
     - routing_table is None: scheduler has not decided yet -> treat as error for this attempt
-    - routing_table is []: all pipelines are full now -> retry up to max attempts
+    - routing_table is []: all pipelines are full now -> wait in the scheduler manager's
+      pending queue until a node frees capacity (oldest request first), then retry, up
+      to ROUTING_DEADLINE_SEC after the request was received. Without a wake-up, retry
+      after the scheduler's Retry-After hint or RETRY_DELAY_SEC.
+    - routing_table is [] and the request was rejected -> 429 with Retry-After right away
     - routing_table is non-empty: forward to first hop
     """
 
-    MAX_ROUTING_RETRY = 20
+    ROUTING_DEADLINE_SEC = 100
     RETRY_DELAY_SEC = 5
 
     def __init__(self):
@@ -54,9 +59,13 @@ class RequestHandler:
         # Try to resolve routing; retry if table is an empty list (capacity full)
         attempts = 0
         routing_table = None
-        while attempts < self.MAX_ROUTING_RETRY:
+        retry_after_s = None
+        deadline = received_ts + self.ROUTING_DEADLINE_SEC
+        while True:
             try:
-                routing_table = self.scheduler_manage.get_routing_table(request_id, received_ts)
+                request = await self.scheduler_manage.route_request_async(request_id, received_ts)
+                routing_table = request.routing_table
+                retry_after_s = request.retry_after_s
                 logger.debug(
                     f"get_routing_table for request {request_id} return: {routing_table} (attempt {attempts+1})"
                 )
@@ -78,19 +87,27 @@ class RequestHandler:
             if len(routing_table) > 0:
                 break
 
-            # Empty list -> capacity full now, retry after short delay
-            attempts += 1
-            if attempts < self.MAX_ROUTING_RETRY:
-                # small async delay before re-forwarding
-                import asyncio
+            # Rejected by admission control -> don't queue up more load, tell when to retry
+            if request.rejected:
+                break
 
-                await asyncio.sleep(self.RETRY_DELAY_SEC)
+            # Empty list -> capacity full now, retry once a node frees some up
+            attempts += 1
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            fallback = self.RETRY_DELAY_SEC if retry_after_s is None else retry_after_s
+            await self.scheduler_manage.pending_requests.wait(
+                received_ts, timeout=min(remaining, fallback)
+            )
 
         # If still empty after retries, return 429 Too Many Requests
         if routing_table is not None and len(routing_table) == 0:
+            retry_after = self.RETRY_DELAY_SEC if retry_after_s is None else retry_after_s
             return JSONResponse(
                 content={"error": "All pipelines are busy or not ready. Please retry later."},
                 status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
             )
 
         # Add request_id and routing_table to request_data
@@ -70,18 +70,22 @@ class RPCConnectionHandler(ConnectionHandler):
 
     @rpc_method
     def node_update(self, message):
+        # Either a full heartbeat or a metrics delta carrying only the changed fields;
+        # absent fields are left unchanged on the scheduler's existing Node
         logger.debug(f"receive node_update request: {message}")
         try:
-            node = self.build_node(message)
+            node_id = message.get("node_id")
             self.scheduler.enqueue_node_update(
-                node.node_id,
-                current_requests=node.current_requests,
-                layer_latency_ms=node.layer_latency_ms,
-                new_rtt_to_nodes=node.rtt_to_nodes,
-                is_active=node.is_active,
+                node_id,
+                current_requests=message.get("current_requests"),
+                layer_latency_ms=message.get("layer_latency_ms"),
+                new_rtt_to_nodes=message.get("rtt_to_nodes"),
+                is_active=message.get("is_active"),
+                start_layer=message.get("start_layer"),
+                end_layer=message.get("end_layer"),
             )
             # Return current layer allocation to node
-            layer_allocation = self.get_layer_allocation(node.node_id)
+            layer_allocation = self.get_layer_allocation(node_id)
             return layer_allocation
         except Exception as e:
             logger.exception(f"node_update error: {e}")
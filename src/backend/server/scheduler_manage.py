@@ -1,10 +1,13 @@
+import asyncio
+import concurrent.futures
 import threading
 import time
-from typing import List
+from typing import List, Optional
 
 from lattica import Lattica
 
 from backend.server.constants import NODE_STATUS_AVAILABLE, NODE_STATUS_WAITING
+from backend.server.pending_requests import PendingRequestQueue
 from backend.server.rpc_connection_handler import RPCConnectionHandler
 from backend.server.static_config import get_model_info, get_node_join_command
 from parallax.cli import PUBLIC_INITIAL_PEERS, PUBLIC_RELAY_SERVERS
@@ -15,6 +18,9 @@ from scheduling.scheduler import Scheduler
 
 logger = get_logger(__name__)
 
+# Max time a request waits for the scheduler to assign a routing table
+ROUTING_TIMEOUT_SEC = 5.0
+
 
 class SchedulerManage:
     """
@@ -33,6 +39,7 @@ class SchedulerManage:
         announce_maddrs: List[str] = [],
         http_port: int = 3001,
         use_hfcache: bool = False,
+        allocation_time_budget_s: Optional[float] = 1.0,
     ):
         """Initialize the manager with networking bootstrap parameters."""
         self.initial_peers = initial_peers
@@ -42,6 +49,7 @@ class SchedulerManage:
         self.announce_maddrs = announce_maddrs
         self.http_port = http_port
         self.use_hfcache = use_hfcache
+        self.allocation_time_budget_s = allocation_time_budget_s
         self.model_name = None
         self.init_nodes_num = None
         self.scheduler = None
@@ -49,6 +57,8 @@ class SchedulerManage:
         self.lattica = None
         self.stubs = {}
         self.is_local_network = False
+        # Requests waiting for capacity, woken by the scheduler as nodes free it up
+        self.pending_requests = PendingRequestQueue()
 
     def run(self, model_name, init_nodes_num, is_local_network=True):
         """
@@ -138,7 +148,13 @@ class SchedulerManage:
         self.init_nodes_num = init_nodes_num
 
         model_info = get_model_info(model_name, self.use_hfcache)
-        self.scheduler = Scheduler(model_info, [], min_nodes_bootstrapping=init_nodes_num)
+        self.scheduler = Scheduler(
+            model_info,
+            [],
+            min_nodes_bootstrapping=init_nodes_num,
+            allocation_time_budget_s=self.allocation_time_budget_s,
+            on_capacity_freed=self.pending_requests.notify,
+        )
 
         # Run the scheduler's event/dispatch loops in background so the process
         # can continue to serve RPCs and HTTP traffic.
@@ -215,33 +231,65 @@ class SchedulerManage:
         )
         logger.debug("RPCConnectionHandler initialized")
 
-    def get_routing_table(self, request_id, received_ts):
-        """Block briefly until the scheduler assigns a routing path for the request.
+    def get_routing_table(self, request_id, received_ts, timeout=ROUTING_TIMEOUT_SEC):
+        """Block until the scheduler assigns a routing path for the request.
 
         Distinguish three states via `RequestSignal.routing_table`:
-        - None: not yet decided, keep waiting up to timeout
+        - None: not decided within `timeout`; the request is withdrawn
         - []: decided but no capacity (pipelines full), return immediately
         - [..]: valid routing path, return immediately
+
+        Prefer `get_routing_table_async` from the event loop; this variant holds
+        the calling thread while waiting.
         """
         logger.debug(f"Routing table requested for request_id={request_id}")
         request = RequestSignal(request_id, received_ts)
         self.scheduler.receive_request(request)
+        try:
+            routing_table = request.routing_future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            routing_table = None
+        return self._finish_routing(request, routing_table, timeout)
+
+    async def get_routing_table_async(self, request_id, received_ts, timeout=ROUTING_TIMEOUT_SEC):
+        """Awaitable `get_routing_table`; resolved directly by the scheduler dispatcher.
+
+        No thread is held while waiting: the scheduler completes the request's
+        future and the event loop is woken through `asyncio.wrap_future`.
+        """
+        request = await self.route_request_async(request_id, received_ts, timeout)
+        return request.routing_table
 
-        # Wait up to 5 seconds, but return immediately if the routing table is set (including an empty list)
-        start_time = time.time()
-        while request.routing_table is None and (time.time() - start_time) < 5.0:
-            time.sleep(0.05)
+    async def route_request_async(self, request_id, received_ts, timeout=ROUTING_TIMEOUT_SEC):
+        """Like `get_routing_table_async`, but returns the resolved `RequestSignal`.
 
-        # Return the routing_table
-        if request.routing_table is None:
+        Besides `routing_table`, the signal carries the admission outcome of a request
+        that was held back (`retry_after_s`, `rejected`).
+        """
+        logger.debug(f"Routing table requested for request_id={request_id}")
+        request = RequestSignal(request_id, received_ts)
+        self.scheduler.receive_request(request)
+        try:
+            routing_table = await asyncio.wait_for(
+                asyncio.wrap_future(request.routing_future), timeout
+            )
+        except asyncio.TimeoutError:
+            routing_table = None
+        request.routing_table = self._finish_routing(request, routing_table, timeout)
+        return request
+
+    def _finish_routing(self, request, routing_table, timeout):
+        if routing_table is None:
+            # Withdraw the request so the dispatcher does not route it later
+            request.routing_future.cancel()
             logger.debug(
-                f"Routing table not ready after {(time.time() - start_time):.2f}s for request_id={request_id}"
+                f"Routing table not ready after {timeout:.2f}s for request_id={request.request_id}"
             )
         else:
             logger.debug(
-                f"Routing table resolved for request_id={request_id}: {request.routing_table}"
+                f"Routing table resolved for request_id={request.request_id}: {routing_table}"
             )
-        return request.routing_table
+        return routing_table
 
     def get_schedule_status(self):
         """
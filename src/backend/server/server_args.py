@@ -35,6 +35,13 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--is-local-network", type=bool, default=True, help="Whether to use local network"
     )
+    parser.add_argument(
+        "--allocation-time-budget-s",
+        type=float,
+        default=1.0,
+        help="Time limit in seconds of each layer allocation search; the best allocation "
+        "found so far is used once it runs out",
+    )
     parser.add_argument(
         "--use-hfcache",
         action="store_true",
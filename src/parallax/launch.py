@@ -93,6 +93,8 @@ if __name__ == "__main__":
                 max_sequence_length=args.max_sequence_length,
                 param_mem_ratio=args.param_mem_ratio,
                 kvcache_mem_ratio=args.kvcache_mem_ratio,
+                metrics_publish_interval=args.metrics_publish_interval,
+                enable_delta_hops=args.enable_delta_hops,
             )
             if gradient_server is not None:
                 gradient_server.status = ServerState.READY
@@ -133,6 +135,8 @@ if __name__ == "__main__":
                 max_sequence_length=args.max_sequence_length,
                 param_mem_ratio=args.param_mem_ratio,
                 kvcache_mem_ratio=args.kvcache_mem_ratio,
+                metrics_publish_interval=args.metrics_publish_interval,
+                enable_delta_hops=args.enable_delta_hops,
             )
             args.start_layer = gradient_server.block_start_index
             args.end_layer = gradient_server.block_end_index
@@ -157,19 +161,20 @@ if __name__ == "__main__":
             # Main execution loop with layer reallocation support
             while True:
                 try:
-                    # For each tp_rank > 0, create a subprocess and run executor
-                    for tp_rank in range(1, args.tp_size):
-                        args_copy = argparse.Namespace(**vars(args))
-                        args_copy.tp_rank = tp_rank
-                        proc = multiprocessing.Process(
-                            target=run_executor_process,
-                            args=(args_copy,),
-                        )
-                        proc.start()
-                        executor_subprocs.append(proc)
-                    # Launch executor with tp_rank=0 in the main process
-                    args.tp_rank = 0
-                    executor = Executor.create_from_args(args, gradient_server=gradient_server)
+                    if executor is None:
+                        # For each tp_rank > 0, create a subprocess and run executor
+                        for tp_rank in range(1, args.tp_size):
+                            args_copy = argparse.Namespace(**vars(args))
+                            args_copy.tp_rank = tp_rank
+                            proc = multiprocessing.Process(
+                                target=run_executor_process,
+                                args=(args_copy,),
+                            )
+                            proc.start()
+                            executor_subprocs.append(proc)
+                        # Launch executor with tp_rank=0 in the main process
+                        args.tp_rank = 0
+                        executor = Executor.create_from_args(args, gradient_server=gradient_server)
                     if gradient_server is not None:
                         gradient_server.status = ServerState.READY
 
@@ -177,6 +182,26 @@ if __name__ == "__main__":
 
                     # Check if layer allocation changed (executor exited due to reallocation)
                     if gradient_server is not None and gradient_server._layer_allocation_changed:
+                        new_start_layer = gradient_server.block_start_index
+                        new_end_layer = gradient_server.block_end_index
+                        new_model_path = gradient_server.model_name or args.model_path
+                        # Same model: move the running executor to its new layers in place
+                        if new_model_path == args.model_path and executor.reallocate_layers(
+                            new_start_layer, new_end_layer
+                        ):
+                            logger.warning(
+                                f"Layer allocation changed! Moved executor to layers "
+                                f"[{new_start_layer}, {new_end_layer})"
+                            )
+                            if args.start_layer == 0 and new_start_layer != 0:
+                                http_server_process = stop_http_server(http_server_process)
+                            args.start_layer = new_start_layer
+                            args.end_layer = new_end_layer
+                            if args.start_layer == 0 and http_server_process is None:
+                                http_server_process = launch_http_server(args)
+                            gradient_server._layer_allocation_changed = False
+                            continue
+
                         logger.warning(
                             "Layer allocation changed! Reloading executor with new layers..."
                         )
@@ -190,8 +215,10 @@ if __name__ == "__main__":
                             t.start()
                             thread_pool.append(t)
                         executor.shutdown()
+                        executor = None
                         for t in thread_pool:
                             t.join()
+                        executor_subprocs = []
 
                         if args.start_layer == 0:
                             http_server_process = stop_http_server(http_server_process)
@@ -199,10 +226,9 @@ if __name__ == "__main__":
                             http_server_process = launch_http_server(args)
 
                         # Update args with new layer allocation
-                        args.start_layer = gradient_server.block_start_index
-                        args.end_layer = gradient_server.block_end_index
-                        if gradient_server.model_name:
-                            args.model_path = gradient_server.model_name
+                        args.start_layer = new_start_layer
+                        args.end_layer = new_end_layer
+                        args.model_path = new_model_path
 
                         logger.info(
                             f"Creating new executor with layers [{args.start_layer}, {args.end_layer})"
@@ -222,6 +248,7 @@ if __name__ == "__main__":
                         logger.info("Attempting to reload executor after error...")
                         if executor is not None:
                             executor.shutdown()
+                            executor = None
                         continue
                     else:
                         raise
@@ -3,37 +3,167 @@ Utility functions for message serialization and deserialization.
 
 This module contains utility functions for serializing and deserializing messages
 between the P2P server and the executor.
+
+Hidden states travel either as safetensors blobs or as raw tensor frames:
+
+    magic (4 bytes) | dtype code (uint8) | ndim (uint8) | shape (ndim x uint32 LE) | data
+
+where data is the C-contiguous buffer of the tensor. A safetensors blob starts with its
+little-endian header length, which never matches the magic, so receivers accept both
+formats and senders pick one with `tensor_format`. Senders default to safetensors, which
+peers without raw frame support still decode; raw frames are opt-in until every peer of
+a pipeline has been upgraded.
+
+Between peers, requests a peer has already received in full can travel as delta hops that
+leave out input_ids and sampling_params (see DeltaHopEncoder and DeltaHopDecoder). Peers
+without delta support ignore Req.delta, so senders only use them when enabled.
+
+Floating-point hidden states can also be compressed by an activation codec, recorded in
+ForwardRequest.activation_codec: "passthrough" (lossless), "bf16"/"fp16" downcasts, or
+"int8" with one scale per token. Integer hidden states (sampled token ids) are always
+sent as they are.
 """
 
 import io
-from typing import Any, List, Optional
+import struct
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Set, Tuple
 
 import mlx.core as mx
+import numpy as np
 
 from parallax.p2p.proto import forward_pb2
 from parallax.server.request import IntermediateRequest, Request, RequestStatus
 from parallax.server.sampling.sampling_params import SamplingParams
 
+RAW_TENSOR_MAGIC = b"PXT1"
+
+# Dtype codes of raw tensor frames, with the numpy dtype used to view the buffer
+# (numpy has no bfloat16, so its bits are carried as uint16).
+_RAW_DTYPES = [
+    ("float32", np.float32),
+    ("float16", np.float16),
+    ("bfloat16", np.uint16),
+    ("int64", np.int64),
+    ("int32", np.int32),
+    ("int16", np.int16),
+    ("int8", np.int8),
+    ("uint8", np.uint8),
+    ("bool", np.bool_),
+    ("uint32", np.uint32),
+]
+_RAW_DTYPE_CODES = {name: code for code, (name, _) in enumerate(_RAW_DTYPES)}
+
+
+class ActivationCodec:
+    """
+    Lossless passthrough codec, and the interface of the other activation codecs.
+
+    `encode` returns the tensor to put on the wire together with optional per-token
+    scales; `decode` is only called for hidden states that carry scales.
+    """
+
+    proto_value = forward_pb2.ActivationCodec.PASSTHROUGH
+
+    def encode(self, tensor: Any, device: Optional[str] = "mlx") -> Tuple[Any, Optional[Any]]:
+        return tensor, None
+
+    def decode(self, tensor: Any, scales: Any, device: Optional[str] = "mlx") -> Any:
+        return tensor
+
+
+class CastActivationCodec(ActivationCodec):
+    """Downcasts hidden states; the receiving executor casts them back to its dtype."""
+
+    def __init__(self, proto_value: int, dtype_name: str):
+        self.proto_value = proto_value
+        self.dtype_name = dtype_name
+
+    def encode(self, tensor: Any, device: Optional[str] = "mlx") -> Tuple[Any, Optional[Any]]:
+        if device == "cuda":
+            import torch
+
+            return tensor.to(getattr(torch, self.dtype_name)), None
+        return tensor.astype(getattr(mx, self.dtype_name)), None
+
+
+class Int8ActivationCodec(ActivationCodec):
+    """
+    Symmetric int8 quantization with one float32 scale per token (last axis), which
+    follows the per-token outliers of transformer activations.
+    """
+
+    proto_value = forward_pb2.ActivationCodec.INT8
+
+    def encode(self, tensor: Any, device: Optional[str] = "mlx") -> Tuple[Any, Optional[Any]]:
+        if device == "cuda":
+            import torch
+
+            tensor = tensor.float()
+            scales = tensor.abs().amax(dim=-1, keepdim=True) / 127.0
+            scales = torch.where(scales > 0, scales, torch.ones_like(scales))
+            quantized = torch.round(tensor / scales).clamp(-127, 127).to(torch.int8)
+            return quantized, scales
+        tensor = tensor.astype(mx.float32)
+        scales = mx.max(mx.abs(tensor), axis=-1, keepdims=True) / 127.0
+        scales = mx.where(scales > 0, scales, 1.0)
+        quantized = mx.clip(mx.round(tensor / scales), -127, 127).astype(mx.int8)
+        return quantized, scales
+
+    def decode(self, tensor: Any, scales: Any, device: Optional[str] = "mlx") -> Any:
+        if device == "cuda":
+            return tensor.float() * scales
+        return tensor.astype(mx.float32) * scales
+
+
+ACTIVATION_CODECS = {
+    "passthrough": ActivationCodec(),
+    "bf16": CastActivationCodec(forward_pb2.ActivationCodec.BF16, "bfloat16"),
+    "fp16": CastActivationCodec(forward_pb2.ActivationCodec.FP16, "float16"),
+    "int8": Int8ActivationCodec(),
+}
+_CODECS_BY_PROTO_VALUE = {codec.proto_value: codec for codec in ACTIVATION_CODECS.values()}
+
+
+def _is_floating(tensor: Any, device: Optional[str] = "mlx") -> bool:
+    if device == "cuda":
+        return tensor.is_floating_point()
+    return mx.issubdtype(tensor.dtype, mx.floating)
+
 
 def request_to_proto(
     requests: List[IntermediateRequest],
     device: Optional[str] = "mlx",
+    tensor_format: str = "safetensors",
+    activation_codec: str = "passthrough",
 ) -> forward_pb2.ForwardRequest:
     """
     Convert a list of IntermediateRequest objects to a ForwardRequest protobuf message.
     IntermediateRequest contains request_id, current_position, status, and hidden_states.
+    Hidden states are compressed with `activation_codec` (see ACTIVATION_CODECS) and
+    encoded as `tensor_format` ("raw" or "safetensors").
+
+    Requests that mix PREFILLING and DECODING statuses are sent as a single MIXED
+    ForwardRequest; the status of each request is then recovered from its output_length.
     """
+    if activation_codec not in ACTIVATION_CODECS:
+        raise ValueError(f"Unsupported activation codec: {activation_codec}")
+    codec = ACTIVATION_CODECS[activation_codec]
     forward_request = forward_pb2.ForwardRequest()
+    forward_request.activation_codec = codec.proto_value
     assert len(requests) > 0, "No requests to convert"
-    assert all(
-        request.status == requests[0].status for request in requests
-    ), "All requests must have the same status"
-    if requests[0].status == RequestStatus.PREFILLING:
+    statuses = {request.status for request in requests}
+    for status in statuses:
+        if status not in (RequestStatus.PREFILLING, RequestStatus.DECODING):
+            raise ValueError(f"Invalid status: {status}")
+    if len(statuses) > 1:
+        forward_request.forward_mode = forward_pb2.ForwardMode.MIXED
+    elif requests[0].status == RequestStatus.PREFILLING:
         forward_request.forward_mode = forward_pb2.ForwardMode.EXTEND
-    elif requests[0].status == RequestStatus.DECODING:
-        forward_request.forward_mode = forward_pb2.ForwardMode.DECODE
     else:
-        raise ValueError(f"Invalid status: {requests[0].status}")
+        forward_request.forward_mode = forward_pb2.ForwardMode.DECODE
 
     for request in requests:
         proto_req = forward_pb2.Req()
@@ -44,7 +174,16 @@ def request_to_proto(
         proto_req.sampling_params.CopyFrom(sampling_params_to_proto(request.sampling_params))
 
         if request.hidden_states is not None:
-            proto_req.hidden_states = tensor_to_bytes(request.hidden_states, device=device)
+            hidden_states, scales = request.hidden_states, None
+            if _is_floating(hidden_states, device):
+                hidden_states, scales = codec.encode(hidden_states, device)
+            proto_req.hidden_states = tensor_to_bytes(
+                hidden_states, device=device, tensor_format=tensor_format
+            )
+            if scales is not None:
+                proto_req.hidden_states_scales = tensor_to_bytes(
+                    scales, device=device, tensor_format=tensor_format
+                )
 
         if request.next_token_id is not None:
             proto_req.next_token_id = request.next_token_id
@@ -63,6 +202,9 @@ def proto_to_request(
     """
 
     requests = []
+    codec = _CODECS_BY_PROTO_VALUE.get(proto_request.activation_codec)
+    if codec is None:
+        raise ValueError(f"Unsupported activation codec: {proto_request.activation_codec}")
 
     for proto_req in proto_request.reqs:
         current_position = len(proto_req.input_ids) + proto_req.output_length
@@ -72,6 +214,9 @@ def proto_to_request(
         hidden_states = None
         if proto_req.hidden_states:
             hidden_states = bytes_to_tensor(proto_req.hidden_states, device)
+            if proto_req.hidden_states_scales:
+                scales = bytes_to_tensor(proto_req.hidden_states_scales, device)
+                hidden_states = codec.decode(hidden_states, scales, device)
 
         status = None
         if hidden_states is None:
@@ -80,6 +225,13 @@ def proto_to_request(
             status = RequestStatus.PREFILLING
         elif proto_request.forward_mode == forward_pb2.ForwardMode.DECODE:
             status = RequestStatus.DECODING
+        elif proto_request.forward_mode == forward_pb2.ForwardMode.MIXED:
+            # Prefill hops (including partial chunks) have not produced any output yet,
+            # while every decode hop carries at least one generated token.
+            if proto_req.output_length > 0:
+                status = RequestStatus.DECODING
+            else:
+                status = RequestStatus.PREFILLING
         else:
             raise ValueError(f"Invalid forward mode: {proto_request.forward_mode}")
 
@@ -133,6 +285,128 @@ def proto_to_abort_request(proto_request: forward_pb2.AbortRequest) -> List[Inte
     return requests
 
 
+class DeltaHopEncoder:
+    """
+    Sender side of delta hops.
+
+    Remembers which peers already hold the static fields (input_ids and sampling_params)
+    of each request, and strips those fields from later hops of the request to the same
+    peer. The number of tracked requests is capped; the least recently sent ones are
+    dropped first, which only costs a full resend.
+    """
+
+    def __init__(self, max_requests: int = 8192):
+        self.max_requests = max_requests
+        self._peers_of: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, peer_id: str, reqs: Iterable[forward_pb2.Req]) -> List[forward_pb2.Req]:
+        """Returns the Reqs to send to `peer_id`, as delta hops where possible."""
+        encoded = []
+        with self._lock:
+            for req in reqs:
+                peers = self._peers_of.get(req.rid)
+                if peers is not None and peer_id in peers:
+                    self._peers_of.move_to_end(req.rid)
+                    encoded.append(_delta_req(req))
+                    continue
+                self._mark_locked(peer_id, req.rid)
+                encoded.append(req)
+        return encoded
+
+    def mark_sent(self, peer_id: str, rids: Iterable[str]):
+        """Records that the full Reqs of `rids` were sent to `peer_id`."""
+        with self._lock:
+            for rid in rids:
+                self._mark_locked(peer_id, rid)
+
+    def forget(self, rids: Iterable[str]):
+        """Drops finished or aborted requests."""
+        with self._lock:
+            for rid in rids:
+                self._peers_of.pop(rid, None)
+
+    def _mark_locked(self, peer_id: str, rid: str):
+        if rid not in self._peers_of:
+            self._peers_of[rid] = set()
+        self._peers_of[rid].add(peer_id)
+        self._peers_of.move_to_end(rid)
+        while len(self._peers_of) > self.max_requests:
+            self._peers_of.popitem(last=False)
+
+
+class DeltaHopDecoder:
+    """
+    Receiver side of delta hops.
+
+    Keeps the static fields of every request received in full and restores them into
+    delta hops, so the executor always sees complete Reqs. The cache is capped like the
+    encoder's.
+    """
+
+    def __init__(self, max_requests: int = 8192):
+        self.max_requests = max_requests
+        self._static_fields: "OrderedDict[str, Tuple[List[int], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, forward_request: forward_pb2.ForwardRequest) -> List[str]:
+        """
+        Restores delta hops in `forward_request` in place.
+
+        Delta hops of unknown requests are removed from the request; their rids are
+        returned so the sender can resend them in full.
+        """
+        missing_rids = []
+        reqs = []
+        with self._lock:
+            for req in forward_request.reqs:
+                if not req.delta:
+                    self._static_fields[req.rid] = (
+                        list(req.input_ids),
+                        req.sampling_params.SerializeToString(),
+                    )
+                    self._static_fields.move_to_end(req.rid)
+                    while len(self._static_fields) > self.max_requests:
+                        self._static_fields.popitem(last=False)
+                    reqs.append(req)
+                    continue
+
+                static_fields = self._static_fields.get(req.rid)
+                if static_fields is None:
+                    missing_rids.append(req.rid)
+                    continue
+                self._static_fields.move_to_end(req.rid)
+                input_ids, sampling_params = static_fields
+                req.input_ids.extend(input_ids)
+                req.sampling_params.ParseFromString(sampling_params)
+                req.delta = False
+                reqs.append(req)
+
+        if missing_rids:
+            del forward_request.reqs[:]
+            forward_request.reqs.extend(reqs)
+        return missing_rids
+
+    def forget(self, rids: Iterable[str]):
+        """Drops finished or aborted requests."""
+        with self._lock:
+            for rid in rids:
+                self._static_fields.pop(rid, None)
+
+
+def _delta_req(req: forward_pb2.Req) -> forward_pb2.Req:
+    """Copies `req` without its static fields."""
+    return forward_pb2.Req(
+        rid=req.rid,
+        output_length=req.output_length,
+        routing_table=req.routing_table,
+        next_token_id=req.next_token_id,
+        hidden_states=req.hidden_states,
+        hidden_states_scales=req.hidden_states_scales,
+        delta=True,
+    )
+
+
 def proto_to_sampling_params(proto: forward_pb2.SamplingParams) -> SamplingParams:
     """Convert protobuf message to SamplingParams."""
     if proto is None:
@@ -178,8 +452,14 @@ def sampling_params_to_proto(params: SamplingParams) -> forward_pb2.SamplingPara
     return proto
 
 
-def tensor_to_bytes(tensor: Any, device: Optional[str] = "mlx") -> bytes:
-    """Convert tensor to protobuf Tensor using safetensor serialization."""
+def tensor_to_bytes(
+    tensor: Any, device: Optional[str] = "mlx", tensor_format: str = "safetensors"
+) -> bytes:
+    """Convert tensor to bytes, as a raw tensor frame or with safetensor serialization."""
+    if tensor_format == "raw":
+        return _tensor_to_raw_frame(tensor, device)
+    if tensor_format != "safetensors":
+        raise ValueError(f"Unsupported tensor format: {tensor_format}")
     if device == "cuda":
         from safetensors.torch import save
 
@@ -202,7 +482,9 @@ def bytes_to_tensor(
     tensor: bytes,
     device: Optional[str] = "mlx",
 ) -> Any:
-    """Convert bytes (safetensor format) to tensor."""
+    """Convert bytes (raw tensor frame or safetensor format) to tensor."""
+    if tensor[: len(RAW_TENSOR_MAGIC)] == RAW_TENSOR_MAGIC:
+        return _raw_frame_to_tensor(tensor, device)
     if device == "cuda":
         from safetensors.torch import load
 
@@ -213,3 +495,60 @@ def bytes_to_tensor(
         tensors_dict = mx.load(buffer, format="safetensors")
         tensor = tensors_dict["tensor"]
     return tensor
+
+
+def _tensor_to_raw_frame(tensor: Any, device: Optional[str] = "mlx") -> bytes:
+    """Encodes a tensor as a raw tensor frame; the buffer is copied once, into the frame."""
+    if device == "cuda":
+        import torch
+
+        tensor = tensor.detach().cpu().contiguous()
+        dtype_name = str(tensor.dtype).split(".")[-1]
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.view(torch.int16)
+        data = memoryview(tensor.numpy())
+    else:
+        assert tensor.size > 0, "Tensor must have size > 0"
+        dtype_name = str(tensor.dtype).split(".")[-1]
+        # MLX exports any dtype (bfloat16 included) as a raw byte buffer
+        data = memoryview(tensor)
+        if not data.c_contiguous:
+            data = memoryview(mx.contiguous(tensor))
+
+    if dtype_name not in _RAW_DTYPE_CODES:
+        raise ValueError(f"Unsupported dtype for raw tensor frame: {dtype_name}")
+    shape = tuple(tensor.shape)
+    header = RAW_TENSOR_MAGIC + struct.pack(
+        f"<BB{len(shape)}I", _RAW_DTYPE_CODES[dtype_name], len(shape), *shape
+    )
+    return b"".join((header, data))
+
+
+def _raw_frame_to_tensor(frame: bytes, device: Optional[str] = "mlx") -> Any:
+    """Decodes a raw tensor frame, viewing its buffer in place until the device copy."""
+    offset = len(RAW_TENSOR_MAGIC)
+    code, ndim = struct.unpack_from("<BB", frame, offset)
+    offset += 2
+    shape = struct.unpack_from(f"<{ndim}I", frame, offset)
+    offset += 4 * ndim
+    dtype_name, np_dtype = _RAW_DTYPES[code]
+    array = np.frombuffer(frame, dtype=np_dtype, count=int(np.prod(shape)), offset=offset)
+    array = array.reshape(shape)
+
+    if device == "cuda":
+        import torch
+
+        if dtype_name == "bfloat16":
+            array = array.view(np.int16)
+        # The frame is read-only; torch warns about that but only reads it before .to()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            tensor = torch.from_numpy(array)
+        if dtype_name == "bfloat16":
+            tensor = tensor.view(torch.bfloat16)
+        return tensor.to(device)
+
+    tensor = mx.array(array)
+    if dtype_name == "bfloat16":
+        tensor = tensor.view(mx.bfloat16)
+    return tensor
@@ -9,6 +9,7 @@ It is used to handle the communication between the peers, and communicate with t
 
 import dataclasses
 import enum
+import functools
 import json
 import logging
 import threading
@@ -21,9 +22,10 @@ import zmq
 from lattica import ConnectionHandler, Lattica, rpc_method, rpc_stream, rpc_stream_iter
 
 from backend.server.rpc_connection_handler import RPCConnectionHandler
+from parallax.p2p.message_util import DeltaHopDecoder, DeltaHopEncoder
 from parallax.p2p.proto import forward_pb2
-from parallax.p2p.utils import AsyncWorker
-from parallax.server.metrics import get_metrics, set_metrics_publisher
+from parallax.p2p.utils import AsyncWorker, PeerSendQueues
+from parallax.server.metrics import MetricsPublisher, get_metrics, set_metrics_publisher
 from parallax.server.server_info import detect_node_hardware
 from parallax.utils.utils import get_zmq_socket
 
@@ -119,6 +121,7 @@ class TransformerConnectionHandler(ConnectionHandler):
         self.notify_url = notify_url
         self._recv_from_peer = None
         self._recv_from_peer_lock = threading.Lock()
+        self.delta_decoder = DeltaHopDecoder()
 
     @property
     def recv_from_peer(self):
@@ -134,7 +137,14 @@ class TransformerConnectionHandler(ConnectionHandler):
         request: forward_pb2.ForwardRequest,
     ) -> forward_pb2.ForwardResponse:
         """Handle forward pass request with explicit proxy tensors support"""
+        response = forward_pb2.ForwardResponse()
         try:
+            missing_rids = self.delta_decoder.decode(request)
+            if missing_rids:
+                logger.warning(f"Delta hops of unknown requests {missing_rids}, asking for resend")
+                response.missing_rids.extend(missing_rids)
+            if len(request.reqs) == 0:
+                return response
             send_notify(
                 self.notify_url, self.block_start_index, self.block_end_index, request, "started"
             )
@@ -142,7 +152,7 @@ class TransformerConnectionHandler(ConnectionHandler):
                 self.recv_from_peer.send_multipart([b"forward", request.SerializeToString()])
         except Exception as e:
             logger.exception(f"Error in rpc_pp_forward: {e}")
-        return forward_pb2.ForwardResponse()
+        return response
 
     @rpc_method
     def rpc_abort(
@@ -150,6 +160,7 @@ class TransformerConnectionHandler(ConnectionHandler):
         request: forward_pb2.AbortRequest,
     ) -> forward_pb2.AbortResponse:
         try:
+            self.delta_decoder.forget(req.rid for req in request.reqs)
             with self._recv_from_peer_lock:
                 self.recv_from_peer.send_multipart([b"abort", request.SerializeToString()])
         except Exception as e:
@@ -212,6 +223,8 @@ class GradientServer:
         max_sequence_length: Optional[int] = None,
         param_mem_ratio: float = 0.65,
         kvcache_mem_ratio: float = 0.25,
+        metrics_publish_interval: float = 1.0,
+        enable_delta_hops: bool = False,
     ):
         self.recv_from_peer_addr = recv_from_peer_addr
         self.send_to_peer_addr = send_to_peer_addr
@@ -232,10 +245,18 @@ class GradientServer:
         self.max_sequence_length = max_sequence_length
         self.param_mem_ratio = param_mem_ratio
         self.kvcache_mem_ratio = kvcache_mem_ratio
+        self.metrics_publish_interval = metrics_publish_interval
+        # Peers that predate delta hops ignore Req.delta, so they are opt-in until every
+        # peer of the pipeline restores them.
+        self.enable_delta_hops = enable_delta_hops
+        self.metrics_publisher = None
         self.prefix_id = f"{dht_prefix}_announce"
         self.lattica = None
         self.routing_table = None
         self.routing_table_update_interval = 10
+        # Sends queued or in flight across all next-hop peers before the sender stops
+        # reading executor output.
+        self.max_pending_sends = 64
         self.server_info = ServerInfo(state=ServerState.JOINING)
         self.stubs = {}
         self.rtts = {}
@@ -350,14 +371,12 @@ class GradientServer:
                 self.model_name = response.get("model_name")
                 self.tp_size = response.get("tp_size")
 
-                # Publish executor metrics to backend on each update
-                def _publish_metrics(_snapshot):
-                    try:
-                        self.scheduler_stub.node_update(self.get_node_info(is_update=True))
-                    except Exception:
-                        pass
-
-                set_metrics_publisher(_publish_metrics)
+                # Publish significant executor metric changes to the scheduler, coalesced
+                # and off the executor loop; the announcer still sends full node info
+                self.metrics_publisher = MetricsPublisher(
+                    self._send_metrics_update, interval_sec=self.metrics_publish_interval
+                )
+                set_metrics_publisher(self.metrics_publisher)
 
             except Exception as e:
                 logger.exception(f"Error in join scheduler: {e}")
@@ -378,6 +397,10 @@ class GradientServer:
         self.start_node_announcer()  # thread
         self.start_node_sender()  # main loop
 
+    def _send_metrics_update(self, delta):
+        """Sends only the changed metrics; the scheduler updates the node in place."""
+        self.scheduler_stub.node_update({"node_id": self.lattica.peer_id(), **delta})
+
     def find_servers(self):
         """Find available servers in the DHT network"""
         # Find all announced blocks
@@ -439,6 +462,61 @@ class GradientServer:
 
     def start_node_sender(self):
         send_to_peer = get_zmq_socket(zmq.Context(2), zmq.PULL, self.send_to_peer_addr, True)
+        # Peers that already received a request in full only get delta hops for it.
+        delta_encoder = DeltaHopEncoder() if self.enable_delta_hops else None
+        # Sends to each next peer run in order on their own worker, so a slow peer does
+        # not hold up the others and this loop never waits on an RPC round trip.
+        send_queues = PeerSendQueues(max_pending=self.max_pending_sends)
+
+        def forward_to_peer(
+            next_peer_id: str,
+            forward_mode: int,
+            activation_codec: int,
+            requests: List[forward_pb2.Req],
+            message_size: int,
+        ):
+            stub = self.get_stub(next_peer_id)
+            start = time.time()
+            logger.info(f"Start forwarding data to {next_peer_id}")
+            new_forward_request = forward_pb2.ForwardRequest()
+            new_forward_request.forward_mode = forward_mode
+            new_forward_request.activation_codec = activation_codec
+            if delta_encoder is not None:
+                new_forward_request.reqs.extend(delta_encoder.encode(next_peer_id, requests))
+            else:
+                new_forward_request.reqs.extend(requests)
+            response = stub.rpc_pp_forward(new_forward_request).result()
+            if delta_encoder is not None and response.missing_rids:
+                # The peer lost the static fields (e.g. it restarted); resend in full.
+                missing_rids = set(response.missing_rids)
+                logger.warning(f"Resending {missing_rids} to {next_peer_id} in full")
+                resend_request = forward_pb2.ForwardRequest()
+                resend_request.forward_mode = forward_mode
+                resend_request.activation_codec = activation_codec
+                resend_request.reqs.extend(req for req in requests if req.rid in missing_rids)
+                stub.rpc_pp_forward(resend_request).result()
+                delta_encoder.mark_sent(next_peer_id, missing_rids)
+            send_notify(
+                self.notify_url,
+                self.block_start_index,
+                self.block_end_index,
+                new_forward_request,
+                "completed",
+            )
+
+            logger.info(
+                f"Forwarding data to {next_peer_id}, "
+                f"total size: {message_size / (1024 * 1024):.3f} MB, "
+                f"cost time: {(time.time() - start) * 1000:.3f} ms, "
+                f"speed: {message_size / (time.time() - start) / (1024 * 1024):.3f} MB/s"
+            )
+
+        def abort_to_peer(peer_id: str, requests: List[forward_pb2.Req]):
+            stub = self.get_stub(peer_id)
+            logger.info(f"Send abort request: {[r.rid for r in requests]} to: {peer_id}")
+            new_abort_request = forward_pb2.AbortRequest()
+            new_abort_request.reqs.extend(requests)
+            stub.rpc_abort(new_abort_request)
 
         def group_requests_by_next_peer(requests: List[forward_pb2.Req]):
             grouped_requests = {}
@@ -499,27 +577,16 @@ class GradientServer:
                     grouped_requests = group_requests_by_next_peer(requests)
 
                     for next_peer_id, requests in grouped_requests.items():
-                        stub = self.get_stub(next_peer_id)
-                        start = time.time()
-                        logger.info(f"Start forwarding data to {next_peer_id}")
-                        new_forward_request = forward_pb2.ForwardRequest()
-                        new_forward_request.forward_mode = forward_request.forward_mode
-                        new_forward_request.reqs.extend(requests)
-                        response = stub.rpc_pp_forward(new_forward_request)
-                        response.result()
-                        send_notify(
-                            self.notify_url,
-                            self.block_start_index,
-                            self.block_end_index,
-                            new_forward_request,
-                            "completed",
-                        )
-
-                        logger.info(
-                            f"Forwarding data to {next_peer_id}, "
-                            f"total size: {len(message_body) / (1024 * 1024):.3f} MB, "
-                            f"cost time: {(time.time() - start) * 1000:.3f} ms, "
-                            f"speed: {len(message_body) / (time.time() - start) / (1024 * 1024):.3f} MB/s"
+                        send_queues.submit(
+                            next_peer_id,
+                            functools.partial(
+                                forward_to_peer,
+                                next_peer_id,
+                                forward_request.forward_mode,
+                                forward_request.activation_codec,
+                                requests,
+                                len(message_body),
+                            ),
                         )
 
                 elif message_type == b"abort":
@@ -527,6 +594,11 @@ class GradientServer:
                     abort_request.ParseFromString(message_body)
                     if len(abort_request.reqs) == 0:
                         raise RuntimeError("No requests in the abort request")
+                    if delta_encoder is not None:
+                        delta_encoder.forget(req.rid for req in abort_request.reqs)
+                    self.connection_handler.delta_decoder.forget(
+                        req.rid for req in abort_request.reqs
+                    )
 
                     grouped_requests = {}
                     for req in abort_request.reqs:
@@ -552,13 +624,10 @@ class GradientServer:
 
                     for peer_id, requests in grouped_requests.items():
                         if peer_id != self.lattica.peer_id():
-                            stub = self.get_stub(peer_id)
-                            logger.info(
-                                f"Send abort request: {[r.rid for r in requests]} to: {peer_id}"
+                            # Queued behind the forwards to the same peer.
+                            send_queues.submit(
+                                peer_id, functools.partial(abort_to_peer, peer_id, requests)
                             )
-                            new_abort_request = forward_pb2.AbortRequest()
-                            new_abort_request.reqs.extend(requests)
-                            stub.rpc_abort(new_abort_request)
                 else:
                     logger.error(f"Unknown message type: {message_type}")
 
@@ -566,6 +635,8 @@ class GradientServer:
                 logger.exception(f"Error in handle_request: {e}")
                 time.sleep(1)
 
+        send_queues.close()
+
     def start_node_announcer(self):
         """Start a thread that regularly announces this module's presence on DHT"""
 
@@ -722,6 +793,9 @@ class GradientServer:
         self.stop_event.set()
 
         self.status = ServerState.OFFLINE
+        if self.metrics_publisher is not None:
+            set_metrics_publisher(None)
+            self.metrics_publisher.close(timeout=1)
         if self.scheduler_addr is not None:
             logger.info(f"Leave scheduler: {self.lattica.peer_id()}")
             self.scheduler_stub.node_leave(self.get_node_info(is_update=True))
@@ -755,6 +829,8 @@ def launch_p2p_server(
     max_sequence_length: Optional[int] = None,
     param_mem_ratio: float = 0.65,
     kvcache_mem_ratio: float = 0.25,
+    metrics_publish_interval: float = 1.0,
+    enable_delta_hops: bool = False,
 ):
     server = GradientServer(
         recv_from_peer_addr=recv_from_peer_addr,
@@ -776,6 +852,8 @@ def launch_p2p_server(
         max_sequence_length=max_sequence_length,
         param_mem_ratio=param_mem_ratio,
         kvcache_mem_ratio=kvcache_mem_ratio,
+        metrics_publish_interval=metrics_publish_interval,
+        enable_delta_hops=enable_delta_hops,
     )
     # Start the server
     thread = threading.Thread(target=server.run, daemon=True)
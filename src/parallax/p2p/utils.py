@@ -5,13 +5,17 @@ This module contains utility functions for the P2P server.
 """
 
 import asyncio
+import logging
 import os
+import queue
 from concurrent.futures import Future
-from threading import Thread
-from typing import Awaitable
+from threading import BoundedSemaphore, Lock, Thread
+from typing import Awaitable, Callable, Dict
 
 import uvloop
 
+logger = logging.getLogger(__name__)
+
 
 def switch_to_uvloop() -> asyncio.AbstractEventLoop:
     """stop any running event loops; install uvloop; then create, set and return a new event loop"""
@@ -57,3 +61,63 @@ class AsyncWorker:
         loop = self._event_loop_fut.result()
         future = asyncio.run_coroutine_threadsafe(coro, loop)
         return future if return_future else future.result()
+
+
+class PeerSendQueues:
+    """
+    Per-peer FIFO send queues for the P2P sender.
+
+    Each peer gets a worker thread that runs the submitted sends one after another, so
+    sends to the same peer keep their order while sends to different peers overlap.
+    At most `max_pending` sends are queued or running at once; `submit` blocks beyond
+    that, which stops the caller from reading more output from the executor.
+    """
+
+    def __init__(self, max_pending: int = 64) -> None:
+        self.max_pending = max_pending
+        self._slots = BoundedSemaphore(max_pending)
+        self._queues: Dict[str, queue.Queue] = {}
+        self._workers: Dict[str, Thread] = {}
+        self._lock = Lock()
+
+    def submit(self, peer_id: str, send: Callable[[], None]):
+        """Queue `send` for `peer_id`, waiting while the pipeline is full."""
+        self._slots.acquire()
+        with self._lock:
+            send_queue = self._queues.get(peer_id)
+            if send_queue is None:
+                send_queue = self._queues[peer_id] = queue.Queue()
+                self._workers[peer_id] = Thread(
+                    target=self._run_worker, args=(peer_id, send_queue), daemon=True
+                )
+                self._workers[peer_id].start()
+        send_queue.put(send)
+
+    def join(self):
+        """Wait until every queued send has run."""
+        with self._lock:
+            queues = list(self._queues.values())
+        for send_queue in queues:
+            send_queue.join()
+
+    def close(self):
+        """Stop the workers once their queues are drained."""
+        with self._lock:
+            for send_queue in self._queues.values():
+                send_queue.put(None)
+            self._queues.clear()
+            self._workers.clear()
+
+    def _run_worker(self, peer_id: str, send_queue: queue.Queue):
+        while True:
+            send = send_queue.get()
+            if send is None:
+                send_queue.task_done()
+                break
+            try:
+                send()
+            except Exception as e:
+                logger.exception(f"Error sending to {peer_id}: {e}")
+            finally:
+                self._slots.release()
+                send_queue.task_done()
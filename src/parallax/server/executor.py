@@ -49,14 +49,11 @@ Executor 是 Parallax 分布式推理系统的核心组件，处理模型的实
 
 import argparse
 import time
-from http import HTTPStatus
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import mlx.core as mx
 import torch
 import zmq
-from jinja2 import TemplateError
-from mlx_lm.server import convert_chat, process_message_content
 
 from parallax.p2p.message_util import (
     abort_request_to_proto,
@@ -67,6 +64,7 @@ from parallax.p2p.message_util import (
 from parallax.p2p.proto import forward_pb2
 from parallax.server.kv_cache import KVCacheManager
 from parallax.server.metrics import update_metrics
+from parallax.server.prompt_processor import render_prompt, request_error_payload
 from parallax.server.radix_cache import RadixCache
 from parallax.server.request import (
     InitialRequest,
@@ -78,6 +76,7 @@ from parallax.server.sampling.sampler import SamplingBatchInfo
 from parallax.server.sampling.sampling_params import SamplingParams
 from parallax.server.scheduler import Scheduler
 from parallax.server.shard_loader import MLXModelLoader
+from parallax.server.token_stream import TokenBatchBuilder, error_to_frames
 from parallax.utils.utils import (
     combine_padding_and_causal_masks,
     create_causal_mask,
@@ -92,6 +91,18 @@ from parallax_utils.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Upper bound on how long an idle run loop blocks on its sockets, so that stop,
+# layer reallocation and request timeouts are still noticed without traffic.
+IDLE_POLL_TIMEOUT_MS = 50
+# How long an idle run loop keeps polling without blocking before it sleeps on its
+# sockets. Waking from a blocking poll costs about 0.1-0.2 ms, which back-to-back
+# arrivals within this window don't pay.
+IDLE_SPIN_SEC = 0.002
+# A mixed prefill + decode pass pads every request to the longest prefill chunk. It is
+# only used while the padded positions stay within this factor of the real tokens;
+# otherwise prefills and decodes run as separate passes.
+MIXED_BATCH_MAX_PADDING = 2.0
+
 
 class Executor:
     """High-level executor for managing model shards, scheduler, and cache pool on each Peer."""
@@ -126,6 +137,11 @@ class Executor:
         # P2P Communication Configs
         send_to_peer_addr: Optional[str] = None,
         recv_from_peer_addr: Optional[str] = None,
+        # Encoding of hidden states sent to the next peer: "raw" or "safetensors"
+        wire_tensor_format: str = "safetensors",
+        # Compression of floating-point hidden states sent to the next peer,
+        # see parallax.p2p.message_util.ACTIVATION_CODECS
+        activation_codec: str = "passthrough",
         # IPC Communication Configs
         executor_input_ipc_addr: Optional[str] = None,
         executor_output_ipc_addr: Optional[str] = None,
@@ -219,6 +235,8 @@ class Executor:
 
         # for window attention need to calculate causal mask size
         self.finished_batch = []
+        self.wire_tensor_format = wire_tensor_format
+        self.activation_codec = activation_codec
         self.start_layer = start_layer
         self.end_layer = end_layer
         self._should_stop = False  # Flag to gracefully stop the executor
@@ -262,6 +280,10 @@ class Executor:
         self.using_state_cache = (
             self.linear_conv_kernel_dim is not None and self.conv_dim is not None
         )
+        # Mixed prefill + decode passes read every request's past from the KV cache manager
+        self.enable_mixed_batch = (
+            self.device == "mlx" and not self.enable_prefix_cache and not self.using_state_cache
+        )
         # logger.debug(
         #     f"Model config: n_kv_heads={self.num_key_value_heads}, head_dim={self.head_dim}, tokenizer_pad={self.tokenizer.pad_token_id}"
         # )
@@ -280,24 +302,14 @@ class Executor:
                 kv_block_size,
                 self.num_shard_layers,
             )
-            self.kv_cache_manager = KVCacheManager(
-                block_size=kv_block_size,
-                num_kv_heads=self.num_key_value_heads,
-                head_dim=self.head_dim,
-                num_layers=self.num_shard_layers,
-                dtype=self.dtype,
-                cache_memory_fraction=kv_cache_memory_fraction,
-                conv_dim=self.conv_dim if self.conv_dim and self.conv_dim > 0 else None,
-                conv_kernel_size=self.linear_conv_kernel_dim,
-                linear_k_dim=self.linear_key_head_dim,
-                linear_v_dim=self.linear_value_head_dim,
-                linear_num_k_heads=self.linear_num_key_heads,
-                linear_num_v_heads=self.linear_num_value_heads,
-                qk_nope_head_dim=self.qk_nope_head_dim,
-                qk_rope_head_dim=self.qk_rope_head_dim,
-                v_head_dim=self.v_head_dim,
-                max_num_tokens=max_tokens_in_kv_pool,
-            )
+            self._kv_cache_config = {
+                "block_size": kv_block_size,
+                "cache_memory_fraction": kv_cache_memory_fraction,
+                "max_num_tokens": max_tokens_in_kv_pool,
+                "max_batch_size": max_batch_size,
+                "max_sequence_length": max_sequence_length,
+            }
+            self.kv_cache_manager = self._create_kv_cache_manager()
             mx.set_wired_limit(mx.metal.device_info()["max_recommended_working_set_size"])
             logger.debug(
                 f"KVCacheManager ready; wired_limit set; prefix_cache={'on' if self.enable_prefix_cache else 'off'}"
@@ -317,38 +329,36 @@ class Executor:
         #     dtype=self.dtype,
         # )
 
-        self.scheduler = Scheduler(
-            max_batch_size=max_batch_size,
-            max_num_tokens_per_batch=max_num_tokens_per_batch,
-            prefill_priority=prefill_priority,
-            scheduler_wait_ms=scheduler_wait_ms,
-            micro_batch_ratio=micro_batch_ratio,
-            is_first_peer=self.is_first_peer,
-            tokenizer=self.tokenizer,
-            eos_token_id=self.eos_token_id,
-            kv_cache_manager=self.kv_cache_manager if self.device == "mlx" else None,
-            request_timeout_s=request_timeout_s,
-        )
+        self._scheduler_config = {
+            "max_batch_size": max_batch_size,
+            "max_num_tokens_per_batch": max_num_tokens_per_batch,
+            "prefill_priority": prefill_priority,
+            "scheduler_wait_ms": scheduler_wait_ms,
+            "micro_batch_ratio": micro_batch_ratio,
+            "request_timeout_s": request_timeout_s,
+            # Chunks resume from the per-request KV cache, which prefix matching
+            # and linear-attention state caches do not support yet.
+            "enable_chunked_prefill": not (self.enable_prefix_cache or self.using_state_cache),
+        }
+        self.scheduler = self._create_scheduler()
         logger.debug(
             f"Scheduler initialized (max_batch_size={max_batch_size}, max_tokens={max_num_tokens_per_batch}, wait_ms={scheduler_wait_ms})"
         )
 
         # Prefix Cache Manager
-        self.prefix_cache = RadixCache(
-            num_kv_heads=self.num_key_value_heads,
-            head_dim=self.head_dim,
-            num_layers=self.num_shard_layers,
-            dtype=self.dtype,
-            page_size=1,
-        )
+        self.prefix_cache = self._create_prefix_cache()
 
         # Communication Related
+        # Readiness of the receiving sockets, used by run_loop to sleep while idle
+        self.poller = None
         if self.tp_rank == 0:
             self.zmq_context = zmq.Context()
+            self.poller = zmq.Poller()
             if recv_from_peer_addr:
                 self.recv_from_peer_socket = get_zmq_socket(
                     self.zmq_context, zmq.PULL, recv_from_peer_addr, bind=False
                 )
+                self.poller.register(self.recv_from_peer_socket, zmq.POLLIN)
             if send_to_peer_addr:
                 self.send_to_peer_socket = get_zmq_socket(
                     self.zmq_context, zmq.PUSH, send_to_peer_addr, bind=False
@@ -357,6 +367,7 @@ class Executor:
                 self.recv_from_ipc_socket = get_zmq_socket(
                     self.zmq_context, zmq.PULL, executor_input_ipc_addr, bind=False
                 )
+                self.poller.register(self.recv_from_ipc_socket, zmq.POLLIN)
             if executor_output_ipc_addr:
                 self.send_to_ipc_socket = get_zmq_socket(
                     self.zmq_context, zmq.PUSH, executor_output_ipc_addr, bind=False
@@ -367,6 +378,42 @@ class Executor:
         """Create executor from command line arguments."""
         return cls(**create_executor_config(args, gradient_server))
 
+    def _create_kv_cache_manager(self) -> KVCacheManager:
+        return KVCacheManager(
+            num_kv_heads=self.num_key_value_heads,
+            head_dim=self.head_dim,
+            num_layers=self.num_shard_layers,
+            dtype=self.dtype,
+            conv_dim=self.conv_dim if self.conv_dim and self.conv_dim > 0 else None,
+            conv_kernel_size=self.linear_conv_kernel_dim,
+            linear_k_dim=self.linear_key_head_dim,
+            linear_v_dim=self.linear_value_head_dim,
+            linear_num_k_heads=self.linear_num_key_heads,
+            linear_num_v_heads=self.linear_num_value_heads,
+            qk_nope_head_dim=self.qk_nope_head_dim,
+            qk_rope_head_dim=self.qk_rope_head_dim,
+            v_head_dim=self.v_head_dim,
+            **self._kv_cache_config,
+        )
+
+    def _create_scheduler(self) -> Scheduler:
+        return Scheduler(
+            is_first_peer=self.is_first_peer,
+            tokenizer=self.tokenizer,
+            eos_token_id=self.eos_token_id,
+            kv_cache_manager=self.kv_cache_manager if self.device == "mlx" else None,
+            **self._scheduler_config,
+        )
+
+    def _create_prefix_cache(self) -> RadixCache:
+        return RadixCache(
+            num_kv_heads=self.num_key_value_heads,
+            head_dim=self.head_dim,
+            num_layers=self.num_shard_layers,
+            dtype=self.dtype,
+            page_size=1,
+        )
+
     def _tensor_parallel_broadcast_byobj(self, broadcast_obj):
         """Wrapper for broadcast pyobject in TP group"""
         from sglang.srt.utils import broadcast_pyobj
@@ -379,6 +426,12 @@ class Executor:
         )
         return broadcast_result
 
+    def wait_for_requests(self, timeout_ms: int):
+        """Blocks until a receiving socket has a message or timeout_ms elapses."""
+        if self.poller is None or not self.poller.sockets:
+            return
+        self.poller.poll(timeout_ms)
+
     def recv_requests_from_http(self) -> List[Request]:
         """Receives requests from http frontend"""
         if self.tp_rank != 0:
@@ -668,25 +721,29 @@ class Executor:
 
         h = []
         lengths = []
+        chunk_lengths = []
         actual_lengths = []
         k_caches = []
         v_caches = []
         matched_prefix = False
-        for req in batched_requests:
+        # Tokens written to the KV cache by earlier chunks of each prompt
+        past_lengths = [
+            (
+                self.kv_cache_manager.request_length(req.request_id)
+                if self.kv_cache_manager.has_request(req.request_id)
+                else 0
+            )
+            for req in batched_requests
+        ]
+        continues_chunk = any(past_lengths)
+        for req, past_len in zip(batched_requests, past_lengths):
             assert req.is_prefill, f"Request {req.request_id} is not a prefill request."
-            if self.is_first_peer:
-                assert hasattr(
-                    req, "input_ids"
-                ), f"Request {req.request_id} should has attribute input_ids in FirstPeer."
-                h.append(req.input_ids)
-            else:
-                assert isinstance(
-                    req, IntermediateRequest
-                ), f"Request {req.request_id} should not be in FirstPeer."
-                h.append(req.hidden_states)
-            lengths.append(req.total_length)
+            inputs, chunk_len = self._prefill_chunk_inputs(req, past_len)
+            h.append(inputs)
+            lengths.append(past_len + chunk_len)
+            chunk_lengths.append(chunk_len)
 
-            if self.enable_prefix_cache:
+            if self.enable_prefix_cache and not continues_chunk:
                 self.prefix_cache.update_req_to_token(req.request_id, req.input_ids)
                 value, node = self.prefix_cache.match_prefix(req.input_ids[:-1])
                 if value:
@@ -724,6 +781,9 @@ class Executor:
                     )
                     actual_lengths.append(req.total_length)
 
+        if continues_chunk:
+            return self._prepare_mlx_ragged_batch(batched_requests, h, past_lengths, chunk_lengths)
+
         if self.is_first_peer:
             padded_inputs, padding_mask = pad_inputs(self.pad_token_id, h, self.dtype)
         else:
@@ -756,6 +816,135 @@ class Executor:
         )
         return ret
 
+    def _prefill_chunk_inputs(self, req: Request, past_len: int) -> Tuple[Any, int]:
+        """Returns the prompt tokens or hidden states of a prefill step and their count."""
+        if self.is_first_peer:
+            assert hasattr(
+                req, "input_ids"
+            ), f"Request {req.request_id} should has attribute input_ids in FirstPeer."
+            inputs = req.input_ids[past_len : req.prefill_end]
+            return inputs, len(inputs)
+
+        assert isinstance(
+            req, IntermediateRequest
+        ), f"Request {req.request_id} should not be in FirstPeer."
+        chunk_len = req.hidden_states.shape[0]
+        if past_len + chunk_len != req.current_position:
+            raise ValueError(
+                f"Prefill chunk of request {req.request_id} ends at "
+                f"{req.current_position} but {past_len} + {chunk_len} tokens are known."
+            )
+        return req.hidden_states, chunk_len
+
+    def _prepare_mlx_mixed_batch(
+        self, prefill_reqs: List[Request], decode_reqs: List[Request]
+    ) -> Optional[Dict[str, Any]]:
+        """Prepares one forward pass shared by prefill chunks and decode tokens.
+
+        Returns None if padding the decodes to the longest prefill chunk would exceed
+        the scheduler's token budget or MIXED_BATCH_MAX_PADDING times the real tokens;
+        the caller then runs them as separate passes.
+        """
+        # Decodes go last, in decode buffer order, so their past is one slice of it
+        decode_reqs = sorted(
+            decode_reqs, key=lambda req: self.kv_cache_manager.decode_slot(req.request_id)
+        )
+        batched_requests = prefill_reqs + decode_reqs
+        h = []
+        past_lengths = []
+        new_lengths = []
+        for req in batched_requests:
+            past_len = 0
+            if self.kv_cache_manager.has_request(req.request_id):
+                past_len = self.kv_cache_manager.request_length(req.request_id)
+            if req.is_prefill:
+                inputs, new_len = self._prefill_chunk_inputs(req, past_len)
+            elif self.is_first_peer:
+                assert isinstance(req, InitialRequest)
+                inputs, new_len = [req.output_ids[-1]], 1
+            else:
+                assert isinstance(req, IntermediateRequest)
+                assert req.hidden_states is not None and req.hidden_states.shape[0] == 1
+                inputs, new_len = req.hidden_states, 1
+            h.append(inputs)
+            past_lengths.append(past_len)
+            new_lengths.append(new_len)
+
+        padded_tokens = len(batched_requests) * max(new_lengths)
+        if padded_tokens > self.scheduler.max_num_tokens_per_batch:
+            return None
+        if padded_tokens > MIXED_BATCH_MAX_PADDING * sum(new_lengths):
+            return None
+        return self._prepare_mlx_ragged_batch(batched_requests, h, past_lengths, new_lengths)
+
+    def _prepare_mlx_ragged_batch(
+        self,
+        batched_requests: List[Request],
+        h: List[Any],
+        past_lengths: List[int],
+        new_lengths: List[int],
+    ) -> Dict[str, Any]:
+        """Prepares a batch in which every request continues from its cached KV.
+
+        Each request attends to the KV cache that earlier steps left in the
+        KVCacheManager (empty for prompts starting in this step) followed by its
+        new tokens, which may be a prefill chunk or a single decode token. Decode
+        requests must come last; their past is read from the decode buffer.
+        """
+        batch_size = len(batched_requests)
+        num_decodes = sum(1 for req in batched_requests if req.is_decoding)
+        assert all(
+            req.is_decoding for req in batched_requests[batch_size - num_decodes :]
+        ), "decode requests must come last in a ragged batch"
+
+        max_past = max(past_lengths)
+        cache_shape = (
+            batch_size,
+            self.num_shard_layers,
+            self.kv_cache_manager.num_kv_heads,
+            max_past,
+        )
+        k_batched = mx.zeros(cache_shape + (self.kv_cache_manager.head_dim_k,), dtype=self.dtype)
+        v_batched = mx.zeros(cache_shape + (self.kv_cache_manager.head_dim_v,), dtype=self.dtype)
+        for i, (req, past_len) in enumerate(
+            zip(batched_requests[: batch_size - num_decodes], past_lengths)
+        ):
+            if past_len > 0:
+                keys, values, _, _ = self.kv_cache_manager.gather_kv_cache(req.request_id)
+                k_batched[i, :, :, :past_len, :] = keys
+                v_batched[i, :, :, :past_len, :] = values
+        if num_decodes:
+            keys, values, _ = self.kv_cache_manager.gather_decode_batch(
+                [req.request_id for req in batched_requests[batch_size - num_decodes :]]
+            )
+            k_batched[batch_size - num_decodes :, :, :, : keys.shape[3], :] = keys
+            v_batched[batch_size - num_decodes :, :, :, : values.shape[3], :] = values
+            # Copy the decode rows out before the decode buffer is appended to again
+            mx.eval(k_batched, v_batched)
+
+        pad_value = self.pad_token_id if self.is_first_peer else 0
+        padded_inputs, input_padding_mask = pad_inputs(pad_value, h, self.dtype)
+        past_padding_mask = (mx.arange(max_past)[None, :] < mx.array(past_lengths)[:, None]).astype(
+            self.dtype
+        )[:, None, None, :]
+
+        # Keys are laid out as [padded past | padded new tokens]
+        padding_mask = mx.concatenate([past_padding_mask, input_padding_mask], axis=3)
+        causal_mask = create_causal_mask(padded_inputs.shape[1], padding_mask.shape[3], self.dtype)
+        mask = combine_padding_and_causal_masks(padding_mask, causal_mask, self.dtype)
+
+        ret = {
+            "h_or_tokens": padded_inputs,
+            "cache": (k_batched, v_batched),
+            "lengths": mx.array(new_lengths),
+            "cache_lengths": mx.array(past_lengths),
+            "mask": mask,
+            "requests": batched_requests,
+            "state_cache": None,
+        }
+        logger.debug(f"Prepared MLX ragged batch (size={len(batched_requests)})")
+        return ret
+
     def _prepare_mlx_decode_batch(
         self, batched_requests: List[Request]
     ) -> Optional[Dict[str, Any]]:
@@ -765,9 +954,14 @@ class Executor:
             return None
 
         h_list = []
-        cache_lengths = []
-        kv_cache_list = []
+        states0 = []
+        states1 = []
 
+        # Keep the order the decode buffer holds the requests in, so their past KV is a
+        # slice of it and only newcomers move
+        batched_requests = sorted(
+            batched_requests, key=lambda req: self.kv_cache_manager.decode_slot(req.request_id)
+        )
         for req in batched_requests:
             assert req.is_decoding, f"Request {req.request_id} is not a decode request."
 
@@ -782,23 +976,21 @@ class Executor:
             if self.enable_prefix_cache:
                 self.prefix_cache.update_req_to_token(req.request_id, list([req.next_token_id]))
 
-            num_tokens_in_cache = self.kv_cache_manager.request_length(req.request_id)
-            cache_lengths.append(num_tokens_in_cache)
-            kv_cache = self.kv_cache_manager.gather_kv_cache(req.request_id)
-            kv_cache_list.append(kv_cache)
+            state0, state1 = self.kv_cache_manager.request_states(req.request_id)
+            states0.append(state0)
+            states1.append(state1)
 
         padded_inputs, _ = pad_inputs(0, h_list, self.dtype)
 
-        if not kv_cache_list:
-            raise ValueError("No KV cache found for request.")
-
-        k_caches = [kv[0] for kv in kv_cache_list]
-        v_caches = [kv[1] for kv in kv_cache_list]
-        states0 = [kv[2] for kv in kv_cache_list]
-        states1 = [kv[3] for kv in kv_cache_list]
-
-        k_batched, k_padding_mask = pad_inputs(0, k_caches, self.dtype)
-        v_batched, _ = pad_inputs(0, v_caches, self.dtype)
+        # Past KV comes from the persistent decode buffer, already right-padded
+        k_batched, v_batched, cache_lengths = self.kv_cache_manager.gather_decode_batch(
+            [req.request_id for req in batched_requests]
+        )
+        model_lengths = mx.array(cache_lengths)
+        source_len = k_batched.shape[3]
+        k_padding_mask = (mx.arange(source_len)[None, :] < model_lengths[:, None]).astype(
+            self.dtype
+        )[:, None, None, :]
 
         # The mask from padding K is for the PAST tokens. It has shape (B, 1, 1, source_len_padded).
         # We need to add a '1' for the CURRENT token so the final mask can be broadcast
@@ -808,8 +1000,6 @@ class Executor:
         inf_value = get_infinite_value_by_dtype(self.dtype)
         attention_mask = (1.0 - final_padding_mask) * -inf_value
 
-        model_lengths = mx.array([kv[0].shape[2] for kv in kv_cache_list])
-
         if self.using_state_cache:
             states0 = mx.stack(states0, 0)
             states1 = mx.stack(states1, 0)
@@ -832,12 +1022,11 @@ class Executor:
 
         Returns:
             A dictionary containing the prepared inputs for the ShardedModel.
-            The dictionary contains "prefill_batch" and "decode_batch",
+            The dictionary contains "mixed_batch", "prefill_batch" and "decode_batch",
             with the prepared inputs for the corresponding request type.
 
-            For now we process prefill and decode requests separately.
-            Later when we have Ragged Paged Flash Attention kernel,
-            we can process both in one batch.
+            On MLX, prefill chunks and decodes share a single "mixed_batch" forward
+            pass when padding allows; otherwise they are processed separately.
         """
         if len(batched_requests) == 0:
             return None
@@ -849,6 +1038,15 @@ class Executor:
                 prefill_reqs.append(req)
             elif req.is_decoding:
                 decode_reqs.append(req)
+        if self.enable_mixed_batch and prefill_reqs and decode_reqs:
+            mixed_batch = self._prepare_mlx_mixed_batch(prefill_reqs, decode_reqs)
+            if mixed_batch is not None:
+                logger.debug(f"Prepared mixed batch with {len(mixed_batch['requests'])} requests.")
+                return {
+                    "mixed_batch": mixed_batch,
+                    "prefill_batch": None,
+                    "decode_batch": None,
+                }
         if self.device == "cuda":
             prefill_batch = self._prepare_cuda_prefill_batch(prefill_reqs)
             decode_batch = self._prepare_cuda_decode_batch(decode_reqs)
@@ -862,6 +1060,7 @@ class Executor:
         if decode_batch is not None:
             logger.debug(f"Prepared decode batch with {len(decode_batch['requests'])} requests.")
         return {
+            "mixed_batch": None,
             "prefill_batch": prefill_batch,
             "decode_batch": decode_batch,
         }
@@ -870,24 +1069,11 @@ class Executor:
         assert "messages" in raw_request, "Request did not contain messages"
 
         rid = raw_request["rid"]
-        if self.tokenizer.chat_template:
-            messages = raw_request["messages"]
-            process_message_content(messages)
-            chat_template_kwargs = raw_request.get("chat_template_kwargs", {})
-            # check extra_body for backward compatibility
-            if "extra_body" in raw_request and "chat_template_kwargs" in raw_request["extra_body"]:
-                chat_template_kwargs.update(raw_request["extra_body"]["chat_template_kwargs"])
-
-            prompt = self.tokenizer.apply_chat_template(
-                messages,
-                raw_request.get("tools") or None,
-                tokenize=True,
-                add_generation_prompt=True,
-                **chat_template_kwargs,
-            )
+        if "input_ids" in raw_request:
+            # Already rendered and tokenized by the HTTP server's prompt workers
+            prompt = list(raw_request["input_ids"])
         else:
-            prompt = convert_chat(raw_request["messages"], raw_request.get("role_mapping"))
-            prompt = self.tokenizer.encode(prompt)
+            prompt = render_prompt(self.tokenizer, raw_request)
 
         max_new_tokens = raw_request.get("max_tokens")
         if max_new_tokens is None:
@@ -929,24 +1115,18 @@ class Executor:
         if rid is None:
             return
 
-        is_template_error = isinstance(error, TemplateError)
-        status = (
-            HTTPStatus.BAD_REQUEST
-            if isinstance(error, ValueError) or is_template_error
-            else HTTPStatus.INTERNAL_SERVER_ERROR
-        )
-        payload = {
-            "type": "error",
-            "rid": rid,
-            "error": str(error),
-            "error_type": error.__class__.__name__,
-            "status_code": status.value,
-        }
+        payload = request_error_payload(rid, error)
         try:
-            self.send_to_ipc_socket.send_pyobj(payload)
+            self.send_to_ipc_socket.send_multipart(error_to_frames(payload))
         except Exception:  # pragma: no cover - best effort notification
             logger.debug("Failed to send error notification to HTTP handler", exc_info=True)
 
+    def _send_token_batch(self, token_batch: TokenBatchBuilder):
+        """Sends the tokens committed in one step to the HTTP server."""
+        if len(token_batch) == 0 or getattr(self, "send_to_ipc_socket", None) is None:
+            return
+        self.send_to_ipc_socket.send_multipart(token_batch.to_frames())
+
     def _handle_cuda_input_requests(self, requests: List[Request]):
         """
         Cuda specialized handle function.
@@ -957,6 +1137,8 @@ class Executor:
         if self.is_first_peer:
             # First peer can receive InitialRequests from the client RPC,
             # or IntermediateRequests from the last peer.
+            # Tokens committed in this call reach the HTTP server as one message.
+            token_batch = TokenBatchBuilder()
             for req in requests:
                 if isinstance(req, InitialRequest):
                     self.scheduler.enque_request(req)
@@ -995,19 +1177,17 @@ class Executor:
 
                     # detokenize and send to http server
                     if self.tp_rank == 0:
-                        req_dict = {
-                            "prompt_tokens": len(req.input_ids),
-                            "next_token_id": req.next_token_id,
-                            "rid": req.request_id,
-                        }
-                        if original_req.status == RequestStatus.FINISHED_EOS:
-                            req_dict["eos"] = True
+                        finish_reason = None
                         if original_req.status == RequestStatus.FINISHED_MAX_LENGTH:
-                            req_dict["length"] = True
-                        if hasattr(self, "send_to_ipc_socket"):
-                            self.send_to_ipc_socket.send_pyobj(req_dict)
+                            finish_reason = "length"
+                        elif original_req.status == RequestStatus.FINISHED_EOS:
+                            finish_reason = "eos"
+                        token_batch.add(
+                            req.request_id, req.next_token_id, finish_reason, len(req.input_ids)
+                        )
                 else:
                     raise TypeError(f"First peer received unexpected request type: {type(req)}")
+            self._send_token_batch(token_batch)
         else:
             # Intermediate and Last peers receive IntermediateRequests from the previous peer.
             for req in requests:
@@ -1038,6 +1218,8 @@ class Executor:
         if self.is_first_peer:
             # First peer can receive InitialRequests from the client RPC,
             # or IntermediateRequests from the last peer.
+            # Tokens committed in this call reach the HTTP server as one message.
+            token_batch = TokenBatchBuilder()
             for req in requests:
                 if isinstance(req, InitialRequest):
                     self.scheduler.enque_request(req)
@@ -1078,19 +1260,17 @@ class Executor:
 
                     # detokenize and send to http server
                     if self.tp_rank == 0:
-                        req_dict = {
-                            "prompt_tokens": len(req.input_ids),
-                            "next_token_id": req.next_token_id,
-                            "rid": req.request_id,
-                        }
-                        if req.next_token_id == self.tokenizer.eos_token_id:
-                            req_dict["eos"] = True
+                        finish_reason = None
                         if original_req.status == RequestStatus.FINISHED_MAX_LENGTH:
-                            req_dict["length"] = True
-                        if hasattr(self, "send_to_ipc_socket"):
-                            self.send_to_ipc_socket.send_pyobj(req_dict)
+                            finish_reason = "length"
+                        elif req.next_token_id == self.tokenizer.eos_token_id:
+                            finish_reason = "eos"
+                        token_batch.add(
+                            req.request_id, req.next_token_id, finish_reason, len(req.input_ids)
+                        )
                 else:
                     raise TypeError(f"First peer received unexpected request type: {type(req)}")
+            self._send_token_batch(token_batch)
 
         else:
             # Intermediate and Last peers receive IntermediateRequests from the previous peer.
@@ -1200,6 +1380,9 @@ class Executor:
             pre_length = 0
             for i, src_request in enumerate(requests):
                 if self.is_last_peer:
+                    if src_request.is_partial_prefill:
+                        # No token until the final chunk of the prompt is processed
+                        continue
                     # Last peer gets a 1D array of token IDs
                     hidden_state_for_req = hidden_states[i : i + 1]
                 else:
@@ -1215,7 +1398,8 @@ class Executor:
                         pre_length += true_length
                     else:
                         if hidden_states.ndim == 3:
-                            hidden_state_for_req = hidden_states[i, :, :]
+                            # Row 0 holds the decode token; mixed batches pad after it
+                            hidden_state_for_req = hidden_states[i, :1, :]
                         else:
                             hidden_state_for_req = hidden_states[pre_length : pre_length + 1, :]
                         pre_length += 1
@@ -1325,12 +1509,18 @@ class Executor:
         """
         Process a batch of requests in MLX.
         """
+        # Chunked prefill passes the cached lengths as RoPE offsets
+        model_lengths = prepared_inputs.get("cache_lengths", prepared_inputs["lengths"])
+        # Drop the batch's reference to the past KV: a decode batch's cache is a view of
+        # the persistent decode buffer, which can only be appended to in place once no
+        # array still reads it.
+        cache = prepared_inputs.pop("cache")
         # Run model and get updated cache
         if self.using_state_cache:
             hidden_states, (k_caches, v_caches, states0, states1) = self.model_shard(
                 h_or_tokens=prepared_inputs["h_or_tokens"],
-                cache=prepared_inputs["cache"],
-                lengths=prepared_inputs["lengths"],
+                cache=cache,
+                lengths=model_lengths,
                 mask=prepared_inputs["mask"],
                 state_cache=prepared_inputs["state_cache"],
                 using_state_cache=self.using_state_cache,
@@ -1338,8 +1528,8 @@ class Executor:
         else:
             hidden_states, (k_caches, v_caches) = self.model_shard(
                 h_or_tokens=prepared_inputs["h_or_tokens"],
-                cache=prepared_inputs["cache"],
-                lengths=prepared_inputs["lengths"],
+                cache=cache,
+                lengths=model_lengths,
                 mask=prepared_inputs["mask"],
                 using_state_cache=self.using_state_cache,
             )
@@ -1435,13 +1625,80 @@ class Executor:
         except Exception:
             pass
 
+    def reallocate_layers(self, start_layer: int, end_layer: int) -> bool:
+        """
+        Moves the executor to layers [start_layer, end_layer) without restarting it.
+
+        The model shard keeps the layers it still serves and loads only the newly
+        assigned ones; the process and its sockets stay up. Requests in flight are
+        cancelled, since the rest of the pipeline is reassigned along with this peer.
+        The KV cache pool is reused when the number of layers does not change, the
+        prefix cache only when the layer range does not change.
+
+        Returns:
+            False if the executor can't be resharded in place (CUDA backends and tensor
+            parallelism); it then has to be recreated for the new layers.
+        """
+        if self.device != "mlx" or self.tp_size > 1:
+            return False
+
+        self._cancel_all_requests(RuntimeError("Layer allocation changed, request cancelled"))
+        if (start_layer, end_layer) != (self.start_layer, self.end_layer):
+            t0 = time.time()
+            self.model_shard = self.shard_loader.reshard(self.model_shard, start_layer, end_layer)
+            self.shard_loader.start_layer = start_layer
+            self.shard_loader.end_layer = end_layer
+            logger.info(
+                f"Resharded layers [{self.start_layer}, {self.end_layer}) -> "
+                f"[{start_layer}, {end_layer}) in {(time.time() - t0) * 1000:.1f} ms"
+            )
+
+            num_shard_layers = end_layer - start_layer
+            self.start_layer = start_layer
+            self.end_layer = end_layer
+            self.is_first_peer = start_layer == 0
+            self.is_last_peer = end_layer == self.config.get("num_hidden_layers")
+            if num_shard_layers != self.num_shard_layers:
+                self.num_shard_layers = num_shard_layers
+                # Free the old pool before sizing the new one against the remaining memory
+                self.kv_cache_manager = None
+                mx.clear_cache()
+                self.kv_cache_manager = self._create_kv_cache_manager()
+            self.prefix_cache = self._create_prefix_cache()
+
+        self.scheduler = self._create_scheduler()
+        self.finished_batch = []
+        self._decode_steps_since_metric = self.layer_latency_update_every
+        return True
+
+    def _cancel_all_requests(self, error: Exception):
+        """Drops every queued and running request, releasing its KV cache."""
+        requests = list(self.scheduler._wait_queue) + list(
+            self.scheduler._running_requests.values()
+        )
+        for req in requests:
+            if self.kv_cache_manager is not None and self.kv_cache_manager.has_request(
+                req.request_id
+            ):
+                self.kv_cache_manager.release_request(req.request_id)
+            if self.is_first_peer:
+                self._notify_http_request_error({"rid": req.request_id}, error)
+        if requests:
+            logger.info(f"Cancelled {len(requests)} requests")
+
     def run_loop(self):
         """The main loop of the executor."""
         logger.debug(
             f"Executor for layers [{self.start_layer}, {self.end_layer}) starting run loop..."
         )
         self._should_stop = False
+        # When the loop last found nothing to run. After IDLE_SPIN_SEC of that it
+        # sleeps on its sockets instead of spinning, and wakes as soon as a message
+        # arrives.
+        idle_since = None
         while not self._should_stop:
+            if idle_since is not None and time.monotonic() - idle_since >= IDLE_SPIN_SEC:
+                self.wait_for_requests(IDLE_POLL_TIMEOUT_MS)
             received_requests = []
 
             # Receive requests from http frontend
@@ -1488,6 +1745,10 @@ class Executor:
                 # Non-fatal; continue serving
                 pass
             batch_to_process = self.scheduler.form_batch()
+            if batch_to_process or self.finished_batch:
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
             if not batch_to_process:
                 continue
             logger.debug(f"Formed batch with {len(batch_to_process)} requests.")
@@ -1496,8 +1757,10 @@ class Executor:
             try:
                 prepared_inputs_dict = self._prepare_batch_inputs(batch_to_process)
 
-                # We will process prefill and decode batches separately for now
-                for batch_type in ["prefill_batch", "decode_batch"]:
+                # Requests leaving this peer are sent as a single ForwardRequest
+                outgoing_requests: List[Request] = []
+                batch_start_time = time.time()
+                for batch_type in ["mixed_batch", "prefill_batch", "decode_batch"]:
                     if prepared_inputs_dict and prepared_inputs_dict.get(batch_type):
                         prepared_inputs = prepared_inputs_dict[batch_type]
 
@@ -1526,26 +1789,37 @@ class Executor:
                             hidden_states=output,
                             lengths=prepared_inputs["lengths"],
                         )
-
-                        # 8. Dispatch to the appropriate destination
-                        if self.tp_rank == 0:
-                            if self.is_last_peer and self.is_first_peer:
-                                # Single node: handle locally
-                                self._handle_input_requests(next_batch)
-                            else:
-                                # Send output to next peer
-                                self.send_to_peer_socket.send_multipart(
-                                    [
-                                        b"forward",
-                                        request_to_proto(
-                                            next_batch, self.device
-                                        ).SerializeToString(),
-                                    ]
-                                )
-                                logger.debug(
-                                    f"Processed batch of type {batch_type} with {len(next_batch)} requests "
-                                    f"in {(time.time() - start_time) * 1000:.3f} ms"
-                                )
+                        if next_batch:
+                            outgoing_requests.extend(next_batch)
+
+                        # Partially prefilled prompts on the first peer queue their next chunk
+                        if self.is_first_peer and batch_type != "decode_batch":
+                            for req in prepared_inputs["requests"]:
+                                if req.is_partial_prefill:
+                                    self.scheduler.enque_request(req)
+
+                # 8. Dispatch to the appropriate destination
+                if self.tp_rank == 0 and outgoing_requests:
+                    if self.is_last_peer and self.is_first_peer:
+                        # Single node: handle locally
+                        self._handle_input_requests(outgoing_requests)
+                    else:
+                        # Send output to next peer; mixed statuses travel as one MIXED hop
+                        self.send_to_peer_socket.send_multipart(
+                            [
+                                b"forward",
+                                request_to_proto(
+                                    outgoing_requests,
+                                    self.device,
+                                    self.wire_tensor_format,
+                                    self.activation_codec,
+                                ).SerializeToString(),
+                            ]
+                        )
+                        logger.debug(
+                            f"Processed batch with {len(outgoing_requests)} requests "
+                            f"in {(time.time() - batch_start_time) * 1000:.3f} ms"
+                        )
 
             except Exception as e:
                 logger.exception(f"Error processing batch: {e}")
@@ -1634,6 +1908,12 @@ def create_executor_config(args: argparse.Namespace, gradient_server=None):
         "scheduler_wait_ms": args.scheduler_wait_ms,
         "send_to_peer_addr": args.send_to_peer_addr if "send_to_peer_addr" in args else None,
         "recv_from_peer_addr": args.recv_from_peer_addr if "recv_from_peer_addr" in args else None,
+        "wire_tensor_format": (
+            args.wire_tensor_format if "wire_tensor_format" in args else "safetensors"
+        ),
+        "activation_codec": (
+            args.activation_codec if "activation_codec" in args else "passthrough"
+        ),
         "executor_input_ipc_addr": args.executor_input_ipc,
         "executor_output_ipc_addr": args.executor_output_ipc,
         "attention_backend": args.attention_backend,
@@ -53,6 +53,7 @@ import sys
 import time
 import traceback
 import uuid
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
 from http import HTTPStatus
 from typing import Dict, Optional
@@ -67,6 +68,14 @@ from mlx_lm.utils import load_config
 from pydantic import BaseModel
 from starlette.datastructures import State
 
+from parallax.server.prompt_processor import PromptProcessorPool, request_error_payload
+from parallax.server.sse_encoder import ChatCompletionChunkEncoder
+from parallax.server.token_stream import (
+    ERROR,
+    StreamedToken,
+    decode_error,
+    decode_token_batch,
+)
 from parallax.utils.selective_download import download_metadata_only
 from parallax.utils.tokenizer_utils import load_detokenizer, load_tokenizer
 from parallax.utils.utils import get_zmq_socket
@@ -74,6 +83,9 @@ from parallax_utils.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Seconds to wait for the HTTP server to shut down gracefully before killing it
+STOP_TIMEOUT_SEC = 5.0
+
 
 def get_exception_traceback():
     """Traceback function to handle asyncio function errors"""
@@ -116,6 +128,8 @@ class HTTPRequestInfo:
     is_finish: bool = False
     # Queue for streaming tokens one by one
     token_queue: Optional[asyncio.Queue] = field(default=None, repr=False)
+    # Renders the SSE chunks of a streaming request
+    chunk_encoder: Optional[ChatCompletionChunkEncoder] = field(default=None, repr=False)
     detokenizer: StreamingDetokenizer = None
     error_message: Optional[str] = None
     error_type: Optional[str] = None
@@ -134,6 +148,7 @@ class HTTPHandler:
         executor_input_ipc_name,
         executor_output_ipc_name,
         model_path_str,
+        tokenizer_workers: Optional[int] = None,
     ):
         self.asyncio_tasks = set()
         # Init inter-process communication
@@ -156,6 +171,20 @@ class HTTPHandler:
         self.tokenizer = load_tokenizer(model_path, eos_token_ids=config.get("eos_token_id", None))
         self.detokenizer_class, self.tokenmap = load_detokenizer(model_path, self.tokenizer)
 
+        # Chat templates and tokenization run in worker processes instead of the executor.
+        # With 0 workers, the executor tokenizes the prompts itself.
+        self.prompt_processor = None
+        if tokenizer_workers != 0:
+            self.prompt_processor = PromptProcessorPool(
+                model_path, config.get("eos_token_id", None), tokenizer_workers
+            )
+
+    def shutdown(self):
+        """Stops the prompt processing workers."""
+        if self.prompt_processor is not None:
+            self.prompt_processor.shutdown()
+            self.prompt_processor = None
+
     def create_request(self, request: Dict):
         """Creates a new request information"""
         rid = request["rid"]
@@ -176,14 +205,24 @@ class HTTPHandler:
         )
         if stream:
             request_info.token_queue = asyncio.Queue()
+            request_info.chunk_encoder = ChatCompletionChunkEncoder(rid, model, create_time)
         self.processing_requests[rid] = request_info
 
     def release_request(self, rid: str):
         """Releases the request resources"""
         del self.processing_requests[rid]
 
-    def send_request(self, request: Dict):
-        """Sends the request to model executor using IPC."""
+    async def send_request(self, request: Dict):
+        """Tokenizes the prompt of the request and sends it to model executor using IPC."""
+        if self.prompt_processor is not None:
+            try:
+                request["input_ids"] = await self.prompt_processor.process(request)
+            except Exception as e:
+                logger.exception(f"Error processing prompt of request {request['rid']}: {e}")
+                await self._handle_executor_error(
+                    request["rid"], request_error_payload(request["rid"], e)
+                )
+                return
         self.send_to_executor.send_pyobj(request)
 
     def abort_request(self, request_id: str):
@@ -225,29 +264,19 @@ class HTTPHandler:
             role = None
             content = token
 
-        response = {
-            "id": rid,
-            "object": "chat.completion.chunk",
-            "model": request_info.model,
-            "created": request_info.create_time,
-            "choices": [
-                {
-                    "index": 0,
-                    "logprobs": request_info.logprobs,
-                    "finish_reason": request_info.finish_reason if is_last else None,
-                    "matched_stop": request_info.matched_stop,
-                },
-            ],
-            "usage": {
-                "prompt_tokens": request_info.prompt_tokens,
-                "total_tokens": request_info.prompt_tokens + request_info.completion_tokens,
-                "completion_tokens": request_info.completion_tokens,
-            },
-        }
-        choice = response["choices"][0]
-        choice["delta"] = {"role": role, "content": content}
-        response_json = json.dumps(response, separators=(",", ":"))
-        return f"data: {response_json}\n\n".encode()
+        if request_info.chunk_encoder is None:
+            request_info.chunk_encoder = ChatCompletionChunkEncoder(
+                rid, request_info.model, request_info.create_time
+            )
+        return request_info.chunk_encoder.encode(
+            role=role,
+            content=content,
+            finish_reason=request_info.finish_reason if is_last else None,
+            logprobs=request_info.logprobs,
+            matched_stop=request_info.matched_stop,
+            prompt_tokens=request_info.prompt_tokens,
+            completion_tokens=request_info.completion_tokens,
+        )
 
     def _generate_error_stream_chunk(self, rid, error_payload: Dict[str, str]):
         """Generates a SSE chunk representing an error."""
@@ -347,50 +376,49 @@ class HTTPHandler:
     async def _handle_loop(self):
         """The event loop that handles returned requests"""
         while True:
-            recv_dict = await self.recv_from_executor.recv_pyobj()
-            rid = recv_dict["rid"]
-            if rid not in self.processing_requests:
+            message_type, payload = await self.recv_from_executor.recv_multipart()
+            if message_type == ERROR:
+                recv_dict = decode_error(payload)
+                if recv_dict["rid"] in self.processing_requests:
+                    await self._handle_executor_error(recv_dict["rid"], recv_dict)
                 continue
 
-            if recv_dict.get("type") == "error":
-                await self._handle_executor_error(rid, recv_dict)
-                continue
+            # One message carries the tokens of every request committed in an executor step
+            for token in decode_token_batch(payload):
+                if token.rid in self.processing_requests:
+                    await self._handle_token(token)
 
-            request_info = self.processing_requests[rid]
-            request_info.update_time = time.time()
-            request_info.prompt_tokens = recv_dict["prompt_tokens"]
-            next_token_id = recv_dict["next_token_id"]
-            request_info.detokenizer.add_token(next_token_id)
-            output = request_info.detokenizer.last_segment
-
-            is_finished = recv_dict.get("eos", False) or recv_dict.get("length", False)
-
-            # Only process and send non-EOS tokens
-            if not is_finished and len(output) > 0:
-                # Accumulate full text for non-streaming and potentially for logging
-                request_info.text += output
-                request_info.completion_tokens += 1
-
-                # For streaming, put the individual token into the queue.
-                if request_info.stream:
-                    await request_info.token_queue.put(output)
-
-            # If it is the end of the stream, update status and send sentinel
-            if is_finished:
-                if recv_dict.get("length", False):
-                    logger.debug(f"Request {rid} finished with length")
-                    request_info.finish_reason = "length"
-                elif recv_dict.get("eos", False):
-                    logger.debug(f"Request {rid} finished with eos")
-                    request_info.finish_reason = "eos"
-                    request_info.matched_stop = 0
-                else:
-                    logger.debug(f"Request {rid} finished with unknown reason")
-                    request_info.finish_reason = "unknown"
-
-                request_info.is_finish = True
-                if request_info.stream:
-                    await request_info.token_queue.put(None)  # Sentinel for stream end
+    async def _handle_token(self, token: StreamedToken):
+        """Appends one generated token to its request and feeds its stream queue."""
+        rid = token.rid
+        request_info = self.processing_requests[rid]
+        request_info.update_time = time.time()
+        request_info.prompt_tokens = token.prompt_tokens
+        request_info.detokenizer.add_token(token.token_id)
+        output = request_info.detokenizer.last_segment
+
+        is_finished = token.finish_reason is not None
+
+        # Only process and send non-EOS tokens
+        if not is_finished and len(output) > 0:
+            # Accumulate full text for non-streaming and potentially for logging
+            request_info.text += output
+            request_info.completion_tokens += 1
+
+            # For streaming, put the individual token into the queue.
+            if request_info.stream:
+                await request_info.token_queue.put(output)
+
+        # If it is the end of the stream, update status and send sentinel
+        if is_finished:
+            logger.debug(f"Request {rid} finished with {token.finish_reason}")
+            request_info.finish_reason = token.finish_reason
+            if token.finish_reason == "eos":
+                request_info.matched_stop = 0
+
+            request_info.is_finish = True
+            if request_info.stream:
+                await request_info.token_queue.put(None)  # Sentinel for stream end
 
     async def create_handle_loop(self):
         """Create asyncio event loop task function"""
@@ -418,20 +446,35 @@ def create_error_response(
     return ORJSONResponse(content=error.model_dump(), status_code=error.code)
 
 
+@asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    """Shuts down the handler's worker processes when the server stops or restarts."""
+    yield
+    http_handler = getattr(app.state, "http_handler", None)
+    if http_handler is not None:
+        http_handler.shutdown()
+
+
 # Fast API
 app = fastapi.FastAPI(
     openapi_url="/openapi.json",
+    lifespan=lifespan,
 )
 
 
 async def init_app_states(
-    state: State, executor_input_ipc: str, executor_output_ipc: str, model_path: str
+    state: State,
+    executor_input_ipc: str,
+    executor_output_ipc: str,
+    model_path: str,
+    tokenizer_workers: Optional[int] = None,
 ):
     """Init FastAPI app states, including http handler, etc."""
     state.http_handler = HTTPHandler(
         executor_input_ipc,
         executor_output_ipc,
         model_path,
+        tokenizer_workers,
     )
 
 
@@ -452,7 +495,7 @@ async def v1_chat_completions(raw_request: fastapi.Request):
         request_json["rid"] = request_id
 
     app.state.http_handler.create_request(request_json)
-    app.state.http_handler.send_request(request_json)
+    await app.state.http_handler.send_request(request_json)
     req = app.state.http_handler.processing_requests.get(request_id)
     if req is None:
         return create_error_response("Request not found", "RequestNotFoundError")
@@ -529,6 +572,7 @@ class ParallaxHttpServer:
         self.executor_input_ipc_name = args.executor_input_ipc
         self.executor_output_ipc_name = args.executor_output_ipc
         self.model_path = args.model_path
+        self.tokenizer_workers = getattr(args, "tokenizer_workers", None)
 
     async def run_uvicorn(self):
         """
@@ -563,6 +607,7 @@ class ParallaxHttpServer:
                 self.executor_input_ipc_name,
                 self.executor_output_ipc_name,
                 self.model_path,
+                self.tokenizer_workers,
             )
         )
         asyncio.run(self.run_tasks())
@@ -586,8 +631,12 @@ def stop_http_server(http_server_process):
     if http_server_process is not None:
         logger.info("Stopping HTTP server process...")
         try:
-            http_server_process.kill()
-            http_server_process.join()
+            # SIGTERM lets uvicorn run the shutdown hook, which stops the prompt workers
+            http_server_process.terminate()
+            http_server_process.join(timeout=STOP_TIMEOUT_SEC)
+            if http_server_process.is_alive():
+                http_server_process.kill()
+                http_server_process.join()
         except Exception as e:
             logger.error(f"Failed to terminate HTTP server process: {e}")
         return None
@@ -1,9 +1,9 @@
 """
-Simplified KV Cache Manager for Parallax Server
+Paged KV Cache Manager for Parallax Server
 
-This module implements a simplified key-value (KV) cache system to
-avoid materializing the entier KV cache pool.
-This is a dictionary-based approach where each request has its own growing KV cache.
+This module implements the key-value (KV) cache system of the MLX executor.
+All running requests share one preallocated arena split into fixed-size pages;
+each request keeps a page table into it.
 
 Core Components:
 
@@ -11,16 +11,27 @@ KVCache:
     - MLX-LM style growing cache that dynamically allocates memory as needed
     - Supports efficient update and fetch operations
     - Automatically handles memory expansion in chunks
+    - Used by the prefix cache (RadixCache) for its tree nodes
+
+PageTable:
+    - Pages of the arena owned by one request, in token order
+    - Tracks the filled length and the request's linear-attention states
+
+DecodeBatchCache:
+    - Preallocated (slots, layers, heads, tokens, dim) buffer for the decode batch,
+      charged against the KV cache budget
+    - Requests are copied in once when they join; each step appends one token column
 
 KVCacheManager:
-    - Uses a dictionary mapping request_id to KVCache instances
-    - Supports adding, updating, releasing requests' KV Cache
-    - Performs necessary memory checks to avoid exceeding limits
+    - Owns the arena and a free list of pages, mapping request_id to PageTable
+    - Writes new keys/values in place, so growing a request never copies its history
+    - Capacity checks count free pages, so admission is exact
 """
 
 from typing import Dict, List, Optional, Tuple
 
 import mlx.core as mx
+import numpy as np
 
 from parallax.server.request import Request, RequestStatus
 from parallax_utils.logging_config import get_logger
@@ -159,8 +170,220 @@ class KVCache:
         return self.num_tokens - prev_tokens
 
 
+class PageTable:
+    """Pages of the KV arena owned by a single request, in token order."""
+
+    def __init__(self, state0: Optional[mx.array] = None, state1: Optional[mx.array] = None):
+        self.pages: List[int] = []
+        # Number of token slots already holding keys/values
+        self.offset = 0
+        self.state0 = state0
+        self.state1 = state1
+
+
+class DecodeBatchCache:
+    """Preallocated KV buffer of the decode batch.
+
+    Holds a (num_slots, num_layers, num_kv_heads, capacity, head_dim) buffer in which
+    every decoding request owns one slot. KVCacheManager sizes it once and charges it
+    against the KV cache budget, so it never grows. A request's history is copied in
+    once when it joins; afterwards each step only appends one token column, so
+    preparing a decode batch no longer gathers and pads every request's full KV.
+
+    A batch is served as a slice of the buffer: `arrange` keeps its requests in a
+    contiguous run of slots, in batch order. Rows only move when the batch changes,
+    e.g. when a request joins or a slot is taken by another batch.
+
+    Appends are queued and applied at the start of the next gather. By then the previous
+    forward pass has been evaluated, so nothing still reads the buffer and MLX can write
+    it in place instead of copying it.
+    """
+
+    def __init__(
+        self,
+        num_slots: int,
+        capacity: int,
+        num_layers: int,
+        num_kv_heads: int,
+        head_dim_k: int,
+        head_dim_v: int,
+        dtype: mx.Dtype,
+    ):
+        """
+        Args:
+            num_slots: The number of requests the buffer holds, i.e. the max batch size.
+            capacity: The number of tokens of each slot.
+        """
+        if num_slots * capacity > 0:
+            self.keys = mx.zeros((num_slots, num_layers, num_kv_heads, capacity, head_dim_k), dtype)
+            self.values = mx.zeros(
+                (num_slots, num_layers, num_kv_heads, capacity, head_dim_v), dtype
+            )
+            mx.eval(self.keys, self.values)
+        else:
+            num_slots = capacity = 0
+            self.keys = self.values = None
+        self.capacity = capacity
+
+        self.slot_of: Dict[str, int] = {}
+        self.owner: List[Optional[str]] = [None] * num_slots
+        # Tokens held by each slot, counting queued appends; -1 marks a stale slot
+        self.lengths: List[int] = [-1] * num_slots
+        self.pending: List[Tuple[int, int, mx.array, mx.array]] = []
+
+    @property
+    def num_slots(self) -> int:
+        """Number of slots in the buffer."""
+        return len(self.owner)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the buffer in bytes."""
+        return 0 if self.keys is None else self.keys.nbytes + self.values.nbytes
+
+    def length(self, request_id: str) -> int:
+        """Returns the number of tokens of the request in its slot, -1 if it has none."""
+        slot = self.slot_of.get(request_id)
+        return -1 if slot is None else self.lengths[slot]
+
+    def can_hold(self, request_ids: List[str], lengths: List[int]) -> bool:
+        """Whether the requests, with the given lengths, fit in the buffer at once."""
+        newcomers = sum(1 for rid in request_ids if rid not in self.slot_of)
+        return (
+            len(request_ids) <= self.num_slots
+            and newcomers <= self.num_slots - len(self.slot_of)
+            and max(lengths) <= self.capacity
+        )
+
+    def release(self, request_id: str):
+        """Frees the request's slot."""
+        slot = self.slot_of.pop(request_id, None)
+        if slot is None:
+            return
+        self.owner[slot] = None
+        self.lengths[slot] = -1
+        self.pending = [p for p in self.pending if p[0] != slot]
+
+    def invalidate(self, request_id: str):
+        """Marks the request's slot as stale so it is refilled on the next gather."""
+        slot = self.slot_of.get(request_id)
+        if slot is not None:
+            self.lengths[slot] = -1
+            self.pending = [p for p in self.pending if p[0] != slot]
+
+    def append(self, request_id: str, key: mx.array, value: mx.array):
+        """Queues one token of keys (num_layers, num_kv_heads, head_dim) for the slot."""
+        slot = self.slot_of[request_id]
+        if self.lengths[slot] >= self.capacity:
+            # The request outgrew its slot; it is served from the pool from now on
+            self.release(request_id)
+            return
+        self.pending.append((slot, self.lengths[slot], key, value))
+        self.lengths[slot] += 1
+
+    def fill(self, request_id: str, keys: mx.array, values: mx.array):
+        """Replaces the slot content with the request's full history."""
+        self.invalidate(request_id)
+        num_tokens = keys.shape[2]
+        slot = self.slot_of[request_id]
+        self.keys[slot, :, :, :num_tokens, :] = keys
+        self.values[slot, :, :, :num_tokens, :] = values
+        self.lengths[slot] = num_tokens
+
+    def flush(self):
+        """Writes the queued token appends into the buffer."""
+        if not self.pending:
+            return
+        for slot, pos, key, value in self.pending:
+            self.keys[slot, :, :, pos, :] = key
+            self.values[slot, :, :, pos, :] = value
+        self.pending = []
+
+    def arrange(self, request_ids: List[str]) -> int:
+        """Moves the requests into a contiguous run of slots, in order; returns its start.
+
+        Must be called after `flush` and only if `can_hold` the requests. Newcomers get a
+        slot in the run; other requests sitting in it are moved out to free slots.
+        """
+        size = len(request_ids)
+        last_start = self.num_slots - size
+        # Start the run where most of the requests already sit, so few rows move
+        starts = {
+            min(max(self.slot_of[rid] - i, 0), last_start)
+            for i, rid in enumerate(request_ids)
+            if rid in self.slot_of
+        }
+        start = max(
+            sorted(starts or {0}),
+            key=lambda s: sum(self.slot_of.get(rid) == s + i for i, rid in enumerate(request_ids)),
+        )
+
+        owner: List[Optional[str]] = [None] * self.num_slots
+        owner[start : start + size] = request_ids
+        batch = set(request_ids)
+        displaced = []
+        for slot, rid in enumerate(self.owner):
+            if rid is None or rid in batch:
+                continue
+            if start <= slot < start + size:
+                displaced.append(rid)
+            else:
+                owner[slot] = rid
+        free = [slot for slot, rid in enumerate(owner) if rid is None]
+        for rid, slot in zip(displaced, free):
+            owner[slot] = rid
+
+        # (source, target, length) of every row with content that changes slot
+        moves = []
+        lengths = [-1] * self.num_slots
+        for slot, rid in enumerate(owner):
+            if rid is None:
+                continue
+            old_slot = self.slot_of.get(rid)
+            if old_slot is not None:
+                lengths[slot] = self.lengths[old_slot]
+                if old_slot != slot and lengths[slot] > 0:
+                    moves.append((old_slot, slot, lengths[slot]))
+            self.slot_of[rid] = slot
+        if moves:
+            # Read every moved row before writing any, so a swap doesn't read its own write
+            rows = [
+                (self.keys[src, :, :, :n, :], self.values[src, :, :, :n, :]) for src, _, n in moves
+            ]
+            mx.eval(rows)
+            for (_, dst, n), (keys, values) in zip(moves, rows):
+                self.keys[dst, :, :, :n, :] = keys
+                self.values[dst, :, :, :n, :] = values
+        self.owner = owner
+        self.lengths = lengths
+        return start
+
+    def batch(self, request_ids: List[str]) -> Tuple[mx.array, mx.array, List[int]]:
+        """Returns (keys, values, lengths) of arranged requests, padded to the longest one.
+
+        keys/values are a slice of the buffer of shape
+        (batch, num_layers, num_kv_heads, max_len, head_dim).
+        """
+        mx.eval(self.keys, self.values)
+        start = self.slot_of[request_ids[0]]
+        lengths = [self.lengths[self.slot_of[rid]] for rid in request_ids]
+        max_len = max(lengths)
+        end = start + len(request_ids)
+        return (
+            self.keys[start:end, :, :, :max_len, :],
+            self.values[start:end, :, :, :max_len, :],
+            lengths,
+        )
+
+
 class KVCacheManager:
-    """Manager for KVCache instances."""
+    """Manager for a paged KV cache pool.
+
+    Keys and values of every running request live in one preallocated arena of shape
+    (num_layers, num_kv_heads, num_pages * block_size, head_dim). Each request owns a
+    PageTable of block_size-token pages taken from a free list, so growing a request
+    writes new tokens in place instead of copying its whole history.
+    """
 
     def __init__(
         self,
@@ -180,6 +403,8 @@ class KVCacheManager:
         qk_nope_head_dim: Optional[int] = None,
         qk_rope_head_dim: Optional[int] = None,
         v_head_dim: Optional[int] = None,
+        max_batch_size: Optional[int] = None,
+        max_sequence_length: Optional[int] = None,
     ):
         """
         Args:
@@ -187,9 +412,11 @@ class KVCacheManager:
             head_dim: The dimension of each head.
             num_layers: The number of layers.
             dtype: The data type of the cache.
-            block_size: Source length dim growth step size.
+            block_size: The number of tokens in a page.
             max_num_tokens: The maximum number of tokens in the cache.
             cache_memory_fraction: The fraction of memory to use for the cache.
+            max_batch_size: The number of slots of the decode buffer; None disables it.
+            max_sequence_length: Caps the number of tokens of a decode buffer slot.
         """
         self.num_kv_heads = num_kv_heads
         self.num_layers = num_layers
@@ -210,10 +437,7 @@ class KVCacheManager:
             self.head_dim_k = head_dim
         self.head_dim_v = v_head_dim if v_head_dim is not None else head_dim
 
-        self.request_caches: Dict[str, KVCache] = {}
-        self.tokens_in_cache = 0
-
-        self.max_num_tokens = compute_max_tokens_in_cache(
+        max_tokens = compute_max_tokens_in_cache(
             device="mlx",
             kv_cache_memory_fraction=cache_memory_fraction,
             num_shard_layers=num_layers,
@@ -223,7 +447,62 @@ class KVCacheManager:
             elem_bytes=dtype.size,
         )
         if max_num_tokens is not None:
-            self.max_num_tokens = min(self.max_num_tokens, max_num_tokens)
+            max_tokens = min(max_tokens, max_num_tokens)
+
+        # The decode buffer is carved out of the same budget and takes at most half of
+        # it; requests longer than a slot are served straight from the pool.
+        decode_slots = max_batch_size or 0
+        decode_capacity = 0
+        if decode_slots > 0:
+            decode_capacity = max_tokens // 2 // decode_slots // block_size * block_size
+            if max_sequence_length is not None:
+                decode_capacity = min(decode_capacity, self.round_up_to_step(max_sequence_length))
+        max_tokens -= decode_slots * decode_capacity
+
+        self.num_pages = max_tokens // block_size
+        self.max_num_tokens = self.num_pages * block_size
+        if self.num_pages == 0:
+            raise ValueError(
+                f"KV cache too small: {max_tokens} tokens can't hold a page of {block_size} tokens"
+            )
+
+        # (num_layers, num_kv_heads, num_pages * block_size, head_dim)
+        self.keys = mx.zeros(
+            (num_layers, num_kv_heads, self.max_num_tokens, self.head_dim_k), dtype
+        )
+        self.values = mx.zeros(
+            (num_layers, num_kv_heads, self.max_num_tokens, self.head_dim_v), dtype
+        )
+        mx.eval(self.keys, self.values)
+
+        # Pop from the end so low page ids are handed out first
+        self.free_pages: List[int] = list(range(self.num_pages - 1, -1, -1))
+        self.page_tables: Dict[str, PageTable] = {}
+        self.decode_cache = DecodeBatchCache(
+            num_slots=decode_slots,
+            capacity=decode_capacity,
+            num_layers=num_layers,
+            num_kv_heads=num_kv_heads,
+            head_dim_k=self.head_dim_k,
+            head_dim_v=self.head_dim_v,
+            dtype=dtype,
+        )
+        logger.debug(
+            f"KV cache pool: {self.num_pages} pages x {block_size} tokens, "
+            f"{(self.keys.nbytes + self.values.nbytes) / 1024**3:.3f} GB; decode buffer: "
+            f"{self.decode_cache.num_slots} slots x {self.decode_cache.capacity} tokens, "
+            f"{self.decode_cache.nbytes / 1024**3:.3f} GB"
+        )
+
+    @property
+    def num_free_pages(self) -> int:
+        """Number of pages not owned by any request."""
+        return len(self.free_pages)
+
+    @property
+    def tokens_in_cache(self) -> int:
+        """Number of token slots (filled or reserved) owned by requests."""
+        return (self.num_pages - self.num_free_pages) * self.block_size
 
     def round_up_to_step(self, seq_len: int) -> int:
         """
@@ -235,30 +514,116 @@ class KVCacheManager:
         """
         Checks if the request is in the cache.
         """
-        return request_id in self.request_caches
+        return request_id in self.page_tables
 
     def request_length(self, request_id: str) -> int:
         """
         Returns the length of key/value in the request.
         """
-        return self.request_caches[request_id].offset
+        return self.page_tables[request_id].offset
 
     def request_num_tokens(self, request_id: str) -> int:
         """
         Returns the number of tokens (including slots not yet filled) in the request.
         """
         assert self.has_request(request_id), "request not in cache"
-        return self.request_caches[request_id].num_tokens
+        return len(self.page_tables[request_id].pages) * self.block_size
+
+    def _pages_needed(self, table: PageTable, num_new_tokens: int) -> int:
+        """Number of extra pages the request needs to append num_new_tokens."""
+        total_pages = self.round_up_to_step(table.offset + num_new_tokens) // self.block_size
+        return max(0, total_pages - len(table.pages))
+
+    def _allocate_pages(self, table: PageTable, num_pages: int):
+        """Moves num_pages pages from the free list to the request's page table."""
+        for _ in range(num_pages):
+            table.pages.append(self.free_pages.pop())
+
+    def _slots(self, table: PageTable, start: int, end: int) -> np.ndarray:
+        """Arena token slots holding positions [start, end) of the request."""
+        first_page = start // self.block_size
+        last_page = (end + self.block_size - 1) // self.block_size
+        pages = np.asarray(table.pages[first_page:last_page], dtype=np.int32)
+        slots = (pages[:, None] * self.block_size + np.arange(self.block_size)).reshape(-1)
+        base = first_page * self.block_size
+        return slots[start - base : end - base]
 
     def gather_kv_cache(self, request_id: str) -> Tuple[mx.array, mx.array]:
         """
         Gathers the KV cache for the request.
         """
         assert self.has_request(request_id), "request not in cache"
-        return self.request_caches[request_id].fetch()
+        table = self.page_tables[request_id]
+        slots = mx.array(self._slots(table, 0, table.offset))
+        keys = self.keys[:, :, slots, :]
+        values = self.values[:, :, slots, :]
+        # Materialize now: a pending reader of the arena would force the next
+        # in-place write to copy the whole pool.
+        mx.eval(keys, values)
+        return keys, values, table.state0, table.state1
+
+    def request_states(self, request_id: str) -> Tuple[Optional[mx.array], Optional[mx.array]]:
+        """
+        Returns the linear-attention states (state0, state1) of the request.
+        """
+        assert self.has_request(request_id), "request not in cache"
+        table = self.page_tables[request_id]
+        return table.state0, table.state1
+
+    def decode_slot(self, request_id: str) -> int:
+        """
+        Returns the request's slot in the decode buffer, or the number of slots if it has
+        none. Ordering a decode batch by it keeps the batch's rows from moving.
+        """
+        return self.decode_cache.slot_of.get(request_id, self.decode_cache.num_slots)
+
+    def gather_decode_batch(self, request_ids: List[str]) -> Tuple[mx.array, mx.array, List[int]]:
+        """
+        Gathers the KV cache of a decode batch from the decode buffer.
+
+        Requests joining the batch (or whose slot went stale) are copied in from the
+        pool; the others only had their last token appended. If the batch doesn't fit
+        in the buffer, it is gathered and padded from the pool instead.
+
+        Returns:
+            keys, values: (batch, num_layers, num_kv_heads, max_len, head_dim), right-padded.
+            lengths: The number of cached tokens of each request.
+        """
+        lengths = []
+        for request_id in request_ids:
+            assert self.has_request(request_id), "request not in cache"
+            lengths.append(self.request_length(request_id))
+
+        cache = self.decode_cache
+        if not cache.can_hold(request_ids, lengths):
+            for request_id, length in zip(request_ids, lengths):
+                if length > cache.capacity:
+                    cache.release(request_id)
+            return self._gather_padded(request_ids, lengths)
+
+        cache.flush()
+        cache.arrange(request_ids)
+        for request_id, length in zip(request_ids, lengths):
+            if cache.length(request_id) != length:
+                keys, values, _, _ = self.gather_kv_cache(request_id)
+                cache.fill(request_id, keys, values)
+        return cache.batch(request_ids)
+
+    def _gather_padded(
+        self, request_ids: List[str], lengths: List[int]
+    ) -> Tuple[mx.array, mx.array, List[int]]:
+        """Gathers the requests' KV from the pool, right-padded to the longest one."""
+        shape = (len(request_ids), self.num_layers, self.num_kv_heads, max(lengths))
+        keys = mx.zeros(shape + (self.head_dim_k,), self.dtype)
+        values = mx.zeros(shape + (self.head_dim_v,), self.dtype)
+        for i, (request_id, length) in enumerate(zip(request_ids, lengths)):
+            request_keys, request_values, _, _ = self.gather_kv_cache(request_id)
+            keys[i, :, :, :length, :] = request_keys
+            values[i, :, :, :length, :] = request_values
+        return keys, values, lengths
 
     def add_request(self, request: Request, num_tokens: int = 128) -> bool:
-        """Adds a request to the cache.
+        """Adds a request to the cache and reserves pages for its first tokens.
 
         Args:
             request: The request to add.
@@ -271,45 +636,55 @@ class KVCacheManager:
             request.status == RequestStatus.PREFILLING
         ), "add_request can only be called for prefilling requests"
 
-        if request.request_id in self.request_caches:
+        if request.request_id in self.page_tables:
             logger.warning(f"Request {request.request_id} already in cache")
             return True
 
-        num_tokens = self.round_up_to_step(num_tokens)
-        if self.tokens_in_cache + num_tokens > self.max_num_tokens:
+        num_pages = self.round_up_to_step(num_tokens) // self.block_size
+        if num_pages > self.num_free_pages:
             logger.warning(
-                f"can't add request {request.request_id} to cache: {self.tokens_in_cache} + "
-                f"{num_tokens} > {self.max_num_tokens}"
+                f"can't add request {request.request_id} to cache: needs {num_pages} pages, "
+                f"{self.num_free_pages} of {self.num_pages} free"
             )
             return False
 
-        self.request_caches[request.request_id] = KVCache(
-            num_kv_heads=self.num_kv_heads,
-            head_dim_k=self.head_dim_k,
-            head_dim_v=self.head_dim_v,
-            num_layers=self.num_layers,
-            dtype=self.dtype,
-            block_size=self.block_size,
-            num_initial_tokens=num_tokens,
-            conv_dim=self.conv_dim,
-            conv_kernel_size=self.conv_kernel_size,
-            linear_k_dim=self.linear_k_dim,
-            linear_v_dim=self.linear_v_dim,
-            linear_num_k_heads=self.linear_num_k_heads,
-            linear_num_v_heads=self.linear_num_v_heads,
+        table = PageTable(
+            state0=(
+                mx.zeros((self.num_layers, self.conv_kernel_size - 1, self.conv_dim), self.dtype)
+                if self.conv_dim
+                else None
+            ),
+            state1=(
+                mx.zeros(
+                    (
+                        self.num_layers,
+                        self.linear_num_v_heads,
+                        self.linear_k_dim,
+                        self.linear_v_dim,
+                    ),
+                    self.dtype,
+                )
+                if (
+                    self.linear_k_dim
+                    and self.linear_v_dim
+                    and self.linear_num_k_heads
+                    and self.linear_num_v_heads
+                )
+                else None
+            ),
         )
-        self.tokens_in_cache += self.request_num_tokens(request.request_id)
+        self._allocate_pages(table, num_pages)
+        self.page_tables[request.request_id] = table
         return True
 
-    # def add_request_with_prefix_cache():
-
     def release_request(self, request_id: str) -> bool:
         """
-        Releases the request from the cache.
+        Releases the request from the cache and returns its pages to the free list.
         """
         assert self.has_request(request_id), "request not in cache"
-        self.tokens_in_cache -= self.request_num_tokens(request_id)
-        del self.request_caches[request_id]
+        table = self.page_tables.pop(request_id)
+        self.free_pages.extend(reversed(table.pages))
+        self.decode_cache.release(request_id)
         return True
 
     def update_requests(
@@ -324,6 +699,9 @@ class KVCacheManager:
         """
         Updates the requests in the cache.
 
+        All new keys/values are written into the arena with a single scatter. Nothing is
+        written if the pool doesn't have enough free pages for the whole batch.
+
         Args:
             requests: The requests to update.
             keys: The keys to update.
@@ -336,7 +714,6 @@ class KVCacheManager:
         batch_size, num_layers, n_kv_heads, _, head_dim_k = keys.shape
         _, _, _, _, head_dim_v = values.shape
         # Validate
-        # assert keys.shape == values.shape, "key and value must have the same shape"
         assert num_layers == self.num_layers, "key and value must have the same number of layers"
         assert batch_size == len(requests), "key and value must have the same batch size"
         assert len(lengths) == batch_size, "lengths must have the same batch size as requests"
@@ -345,24 +722,44 @@ class KVCacheManager:
         ), "key and value must have the same number of key-value heads"
         assert head_dim_k == self.head_dim_k, "key and value must have the same head dimension"
         assert head_dim_v == self.head_dim_v, "key and value must have the same head dimension"
-        # TODO: Use vmap for better performance
-        for request, key, value, length, state0, state1 in zip(
-            requests, keys, values, lengths, states0, states1
-        ):
-            length = length.item()
+
+        lengths = [int(length) for length in lengths]
+        pages_needed = 0
+        for request, length in zip(requests, lengths):
             assert self.has_request(request.request_id), "request not in cache"
-            # TODO: fix this
-            # actual length? double-counted prefill len
-            # decode length 1, why rounding up?
-            if self.tokens_in_cache + self.round_up_to_step(length) > self.max_num_tokens:
-                logger.warning(
-                    f"can't add request {request.request_id} to cache: "
-                    f"{self.tokens_in_cache} + {length} > {self.max_num_tokens}"
-                )
-                return False
-            self.tokens_in_cache += self.request_caches[request.request_id].update(
-                key[..., :length, :], value[..., :length, :], state0, state1
+            pages_needed += self._pages_needed(self.page_tables[request.request_id], length)
+        if pages_needed > self.num_free_pages:
+            logger.warning(
+                f"can't update requests in cache: needs {pages_needed} pages, "
+                f"{self.num_free_pages} of {self.num_pages} free"
             )
+            return False
+
+        slots, new_keys, new_values = [], [], []
+        for i, (request, length) in enumerate(zip(requests, lengths)):
+            table = self.page_tables[request.request_id]
+            state0 = states0[i] if states0 is not None else None
+            state1 = states1[i] if states1 is not None else None
+            if state0 is not None and table.state0 is not None:
+                table.state0 = state0
+            if state1 is not None and table.state1 is not None:
+                table.state1 = state1
+            if length == 0:
+                continue
+            if length == 1 and self.decode_cache.length(request.request_id) == table.offset:
+                self.decode_cache.append(
+                    request.request_id, keys[i, :, :, 0, :], values[i, :, :, 0, :]
+                )
+            else:
+                self.decode_cache.invalidate(request.request_id)
+            self._allocate_pages(table, self._pages_needed(table, length))
+            slots.append(self._slots(table, table.offset, table.offset + length))
+            new_keys.append(keys[i, ..., :length, :])
+            new_values.append(values[i, ..., :length, :])
+            table.offset += length
+
+        if slots:
+            self._write(np.concatenate(slots), new_keys, new_values)
         return True
 
     def add_matched_prefix_request(
@@ -370,13 +767,26 @@ class KVCacheManager:
     ):
         """If a request matches prefix, add it back to the running kv-cache manager"""
         assert self.has_request(request.request_id), "request not in cache"
-        if self.tokens_in_cache + self.round_up_to_step(length) > self.max_num_tokens:
+        table = self.page_tables[request.request_id]
+        num_pages = self._pages_needed(table, length)
+        if num_pages > self.num_free_pages:
             logger.warning(
-                f"can't add request {request.request_id} to cache: "
-                f"{self.tokens_in_cache} + {length} > {self.max_num_tokens}"
+                f"can't add request {request.request_id} to cache: needs {num_pages} pages, "
+                f"{self.num_free_pages} of {self.num_pages} free"
             )
             return False
-        self.tokens_in_cache += self.request_caches[request.request_id].update(
-            key[..., :length, :], value[..., :length, :]
-        )
+        self._allocate_pages(table, num_pages)
+        self.decode_cache.invalidate(request.request_id)
+        slots = self._slots(table, table.offset, table.offset + length)
+        table.offset += length
+        self._write(slots, [key[..., :length, :]], [value[..., :length, :]])
         return True
+
+    def _write(self, slots: np.ndarray, new_keys: List[mx.array], new_values: List[mx.array]):
+        """Scatters new keys/values (in token order) into the given arena slots."""
+        slots = mx.array(slots)
+        self.keys[:, :, slots, :] = mx.concatenate(new_keys, axis=2).astype(self.dtype)
+        self.values[:, :, slots, :] = mx.concatenate(new_values, axis=2).astype(self.dtype)
+        # Evaluate so the arena buffer is updated in place rather than kept as a
+        # growing chain of lazy scatters.
+        mx.eval(self.keys, self.values)
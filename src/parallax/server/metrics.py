@@ -3,6 +3,10 @@ Thread-safe, in-process metrics registry for executor-node telemetry.
 
 Exposes functions to update and retrieve per-node metrics that are consumed by
 the P2P server announcements (e.g., current_requests, layer_latency_ms).
+
+`update_metrics` is called from the executor loop, so the registered publisher must
+return quickly. `MetricsPublisher` is such a publisher: it hands snapshots to a
+background thread that coalesces them and forwards only significant changes.
 """
 
 from __future__ import annotations
@@ -11,6 +15,10 @@ import threading
 import time
 from typing import Any, Callable, Dict, Optional
 
+from parallax_utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
 _lock = threading.Lock()
 _metrics: Dict[str, Any] = {
     "current_requests": 0,
@@ -72,3 +80,114 @@ def set_metrics_publisher(publisher: Optional[Callable[[Dict[str, Any]], None]])
     """
     global _publisher
     _publisher = publisher
+
+
+class MetricsPublisher:
+    """Coalescing, rate-limited publisher of metric deltas.
+
+    Calling the publisher only stores the latest snapshot and wakes a daemon thread.
+    That thread forwards at most one message per `interval_sec` to `send`, holding only
+    the fields that changed significantly since the last message:
+    - current_requests: moved by at least `min_requests_delta`, or dropped to zero
+    - layer_latency_ms: moved by at least `min_latency_rel_delta` relative to the last
+      value sent
+    Snapshots arriving within the interval replace each other, so a busy executor
+    causes one message per interval instead of one per iteration. A message that fails
+    to send isn't counted as sent; its snapshot is retried the next interval.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[str, Any]], None],
+        *,
+        interval_sec: float = 1.0,
+        min_requests_delta: int = 1,
+        min_latency_rel_delta: float = 0.1,
+    ) -> None:
+        """
+        Args:
+            send: Called from the publisher thread with the changed fields.
+            interval_sec: Minimum time between two messages.
+            min_requests_delta: Smallest change of current_requests worth sending.
+            min_latency_rel_delta: Smallest relative change of layer_latency_ms worth sending.
+        """
+        self.send = send
+        self.interval_sec = interval_sec
+        self.min_requests_delta = min_requests_delta
+        self.min_latency_rel_delta = min_latency_rel_delta
+        self._cv = threading.Condition()
+        self._pending: Optional[Dict[str, Any]] = None
+        self._sent: Dict[str, Any] = {}
+        self._last_send_ts = float("-inf")
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __call__(self, snapshot: Dict[str, Any]) -> None:
+        with self._cv:
+            if self._closed:
+                return
+            self._pending = snapshot
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="metrics-publisher", daemon=True
+                )
+                self._thread.start()
+            self._cv.notify()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stops the publisher thread; pending snapshots are dropped."""
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def changes(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Fields of `snapshot` that differ significantly from what was last sent."""
+        delta: Dict[str, Any] = {}
+        requests = snapshot.get("current_requests")
+        if requests is not None:
+            sent = self._sent.get("current_requests")
+            if (
+                sent is None
+                or abs(requests - sent) >= self.min_requests_delta
+                or (requests == 0 and sent != 0)
+            ):
+                delta["current_requests"] = requests
+        latency = snapshot.get("layer_latency_ms")
+        if latency is not None:
+            sent = self._sent.get("layer_latency_ms")
+            if sent is None or abs(latency - sent) > self.min_latency_rel_delta * abs(sent):
+                delta["layer_latency_ms"] = latency
+        return delta
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while self._pending is None and not self._closed:
+                    self._cv.wait()
+                if self._closed:
+                    return
+                wait_s = self._last_send_ts + self.interval_sec - time.monotonic()
+                if wait_s > 0:
+                    # Later snapshots replace the pending one meanwhile
+                    self._cv.wait(wait_s)
+                    continue
+                snapshot, self._pending = self._pending, None
+
+            delta = self.changes(snapshot)
+            if not delta:
+                continue
+            try:
+                self.send(delta)
+            except Exception as e:
+                logger.debug(f"Failed to publish metrics, retrying next interval: {e}")
+                with self._cv:
+                    # A newer snapshot, if any, still differs from what was last sent
+                    if self._pending is None:
+                        self._pending = snapshot
+                    self._last_send_ts = time.monotonic()
+                continue
+            self._sent.update(delta)
+            self._last_send_ts = time.monotonic()
@@ -0,0 +1,123 @@
+"""
+Prompt processing for incoming chat requests.
+
+Applying the chat template and tokenizing a long prompt takes milliseconds of Python
+time. PromptProcessorPool does it in worker processes on the HTTP server side, so
+requests reach the executor with `input_ids` already set and its loop keeps serving
+forward passes during a burst of arrivals. The executor falls back to render_prompt
+for requests that arrive without input_ids.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+from jinja2 import TemplateError
+from mlx_lm.server import convert_chat, process_message_content
+
+from parallax_utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Tokenizer of the current worker process, loaded once by _init_worker
+_worker_tokenizer = None
+
+
+def render_prompt(tokenizer: Any, raw_request: Dict) -> List[int]:
+    """Applies the chat template (or the plain chat format) and tokenizes the prompt."""
+    assert "messages" in raw_request, "Request did not contain messages"
+
+    if tokenizer.chat_template:
+        messages = raw_request["messages"]
+        process_message_content(messages)
+        chat_template_kwargs = raw_request.get("chat_template_kwargs", {})
+        # check extra_body for backward compatibility
+        if "extra_body" in raw_request and "chat_template_kwargs" in raw_request["extra_body"]:
+            chat_template_kwargs.update(raw_request["extra_body"]["chat_template_kwargs"])
+
+        prompt = tokenizer.apply_chat_template(
+            messages,
+            raw_request.get("tools") or None,
+            tokenize=True,
+            add_generation_prompt=True,
+            **chat_template_kwargs,
+        )
+        # transformers 5 returns a BatchEncoding instead of the token ids
+        if isinstance(prompt, Mapping):
+            prompt = prompt["input_ids"]
+        return prompt
+    prompt = convert_chat(raw_request["messages"], raw_request.get("role_mapping"))
+    return tokenizer.encode(prompt)
+
+
+def request_error_payload(rid: str, error: Exception) -> Dict:
+    """Error notification for a request whose prompt could not be processed."""
+    status = (
+        HTTPStatus.BAD_REQUEST
+        if isinstance(error, (ValueError, TemplateError))
+        else HTTPStatus.INTERNAL_SERVER_ERROR
+    )
+    return {
+        "type": "error",
+        "rid": rid,
+        "error": str(error),
+        "error_type": error.__class__.__name__,
+        "status_code": status.value,
+    }
+
+
+def default_num_workers() -> int:
+    return max(1, min(8, (os.cpu_count() or 2) // 2))
+
+
+def _exit_with_parent(parent_pid: int):
+    # Workers are not daemonic; don't outlive an HTTP server that was killed.
+    while os.getppid() == parent_pid:
+        time.sleep(1.0)
+    os._exit(0)
+
+
+def _init_worker(model_path: str, eos_token_ids: Any, parent_pid: int):
+    global _worker_tokenizer
+    from parallax.utils.tokenizer_utils import load_tokenizer
+
+    threading.Thread(target=_exit_with_parent, args=(parent_pid,), daemon=True).start()
+    _worker_tokenizer = load_tokenizer(Path(model_path), eos_token_ids=eos_token_ids)
+
+
+def _render_in_worker(raw_request: Dict) -> List[int]:
+    return list(render_prompt(_worker_tokenizer, raw_request))
+
+
+class PromptProcessorPool:
+    """
+    Worker processes that each hold a copy of the model's tokenizer.
+
+    Every request is its own task and tasks are picked up in arrival order, so a burst
+    of long prompts spreads over the workers instead of queueing behind one another,
+    and requests that arrive first are handed out first.
+    """
+
+    def __init__(
+        self, model_path: str, eos_token_ids: Any = None, num_workers: Optional[int] = None
+    ):
+        self.num_workers = num_workers or default_num_workers()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=_init_worker,
+            initargs=(str(model_path), eos_token_ids, os.getpid()),
+        )
+        logger.info(f"Started {self.num_workers} prompt processing workers")
+
+    async def process(self, raw_request: Dict) -> List[int]:
+        """Returns the prompt token ids of `raw_request`."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, _render_in_worker, raw_request)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -19,6 +19,9 @@ In our current design, the Last Peer won't hold `InitialRequest` for several rea
 
 Forming requests to batches (see scheduler.py for details):
     Our scheduler can manage both `InitialRequest` and `IntermediateRequest`.
+    Long prompts may be prefilled in chunks: each chunk travels the pipeline as a
+    PREFILLING `IntermediateRequest` whose `current_position` is the end of the chunk,
+    and only the final chunk makes the Last Peer sample a token.
 
 A complete workflow:
 Prefill:
@@ -105,6 +108,11 @@ class Request:
         self.abort = False
         self.ready_for_next_step = False
         self.last_updated_time: Optional[float] = None
+        # Chunked prefill: the scheduler processes prompt tokens
+        # [prefill_offset, prefill_offset + prefill_chunk_len) in the current step.
+        # `None` means the whole remaining prompt.
+        self.prefill_offset = 0
+        self.prefill_chunk_len: Optional[int] = None
 
     @property
     def is_finished(self) -> bool:
@@ -126,6 +134,18 @@ class Request:
         """Checks if the request is in the decoding stage."""
         return self.status == RequestStatus.DECODING
 
+    @property
+    def prefill_end(self) -> int:
+        """Prompt position reached once the current prefill step completes."""
+        if self.prefill_chunk_len is None:
+            return len(self.input_ids)
+        return self.prefill_offset + self.prefill_chunk_len
+
+    @property
+    def is_partial_prefill(self) -> bool:
+        """Checks if the current prefill step leaves part of the prompt unprocessed."""
+        return self.is_prefill and 0 < self.prefill_end < len(self.input_ids)
+
     def update_status(self, new_status: RequestStatus = RequestStatus.DECODING):
         """
         Update the status of the request.
@@ -283,6 +303,11 @@ class IntermediateRequest(Request):
         assert self.is_prefill
         return self.current_position
 
+    @property
+    def prefill_end(self) -> int:
+        """Prompt position reached once this hop's prefill chunk is processed."""
+        return self.current_position
+
     @property
     def total_length(self) -> int:
         """Total length of the sequence (input + output)."""
@@ -313,12 +338,18 @@ class IntermediateRequest(Request):
         else:
             next_token_id = initial_request.output_ids[-1]
 
+        if initial_request.is_partial_prefill:
+            # Downstream peers infer the chunk from current_position and hidden_states.
+            current_position = initial_request.prefill_end
+        else:
+            current_position = initial_request.total_length
+
         return IntermediateRequest(
             request_id=initial_request.request_id,
             status=initial_request.status,
             input_ids=initial_request.input_ids,
             next_token_id=next_token_id,
-            current_position=initial_request.total_length,
+            current_position=current_position,
             hidden_states=hidden_states,
             sampling_params=initial_request.sampling_params,
             routing_table=initial_request.routing_table,
@@ -15,13 +15,16 @@ We use an explicit 2-Phase approach:
         Implemented by `form_batch`. We prioritize PREFILL requests
         first within `max_num_tokens_per_batch` and `micro_batch_size`,
         then include DECODE requests that are marked ready for the next decode step.
+        With chunked prefill, prompts that exceed the remaining token budget are split
+        into chunks; the KV cache manager records how much of each prompt is done, and
+        a token per ready decode is reserved so long prompts cannot stall decoding.
 
 Our scheduler also handles tokenization and pre-processing for the First Peer's requests.
 """
 
 import time
-from collections import OrderedDict
-from typing import Dict, List, Optional
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
 
 from parallax.server.kv_cache import KVCacheManager
 from parallax.server.metrics import update_metrics
@@ -47,6 +50,8 @@ class Scheduler:
         is_first_peer: bool = False,
         kv_cache_manager: Optional[KVCacheManager] = None,
         request_timeout_s: Optional[int] = 600,
+        enable_chunked_prefill: bool = True,
+        chunked_prefill_size: Optional[int] = None,
         **kwargs,
     ):
         """
@@ -58,6 +63,10 @@ class Scheduler:
             tokenizer: The tokenizer to use for the model;
             kv_cache_manager: The KV cache manager to use for the scheduler.
             request_timeout_s: timeout for each inflight request (default 10mins).
+            enable_chunked_prefill: Split prompts that do not fit the token budget into chunks.
+                Requires a KV cache manager to track per-request prefill progress.
+            chunked_prefill_size: Maximum number of prompt tokens per chunk
+                (default: max_num_tokens_per_batch).
         """
         self.max_batch_size = max_batch_size
         self.max_num_tokens_per_batch = max_num_tokens_per_batch
@@ -75,8 +84,12 @@ class Scheduler:
         self._wait_queue: List[Request] = []
         # Keeps track of all in-flight requests
         self._running_requests: Dict[str, Request] = OrderedDict()
+        # Prefill chunks that arrived before the previous chunk of the same prompt ran
+        self._pending_prefill_chunks: Dict[str, Deque[Request]] = {}
 
         self.kv_cache_manager = kv_cache_manager
+        self.enable_chunked_prefill = enable_chunked_prefill and kv_cache_manager is not None
+        self.chunked_prefill_size = chunked_prefill_size or max_num_tokens_per_batch
         # Default timeout for requests if not set on request object
         self.request_timeout_s = request_timeout_s
 
@@ -124,7 +137,9 @@ class Scheduler:
 
         request.ready_for_next_step = True
         request.last_updated_time = time.time()
-        # TODO: Handle chunked prefill.
+        if request.is_prefill and request.request_id in self._running_requests:
+            self._enque_prefill_chunk(request)
+            return
         if request.is_decoding:
             rid = request.request_id
             if rid not in self._running_requests:
@@ -143,10 +158,34 @@ class Scheduler:
             f"Prefill request {request.request_id} added to the prefill wait queue (size={len(self._wait_queue)})."
         )
 
+    def _enque_prefill_chunk(self, request: Request):
+        """Queues the next chunk of a prompt that is already being prefilled."""
+        rid = request.request_id
+        running = self._running_requests[rid]
+        if running is not request and running.ready_for_next_step:
+            # The previous chunk has not been batched yet; run this one after it.
+            self._pending_prefill_chunks.setdefault(rid, deque()).append(request)
+            logger.debug(f"Prefill chunk of request {rid} deferred behind an unprocessed chunk.")
+            return
+        # Keep admission order for prefills
+        self._running_requests[rid] = request
+        logger.debug(f"Prefill request {rid} ready for its next chunk.")
+
+    def _promote_pending_prefill_chunks(self):
+        """Moves deferred chunks into the running set once their predecessor has run."""
+        for rid in list(self._pending_prefill_chunks):
+            if self._running_requests[rid].ready_for_next_step:
+                continue
+            chunks = self._pending_prefill_chunks[rid]
+            self._running_requests[rid] = chunks.popleft()
+            if not chunks:
+                del self._pending_prefill_chunks[rid]
+
     def evict_request(self, request_id: str):
         """Removes a request from the scheduler's running queue."""
         if request_id in self._running_requests:
             self._running_requests.pop(request_id)
+            self._pending_prefill_chunks.pop(request_id, None)
             logger.debug(f"Evicted request {request_id} from scheduler.")
             # Update metrics only if running count changed since last report
             try:
@@ -212,7 +251,8 @@ class Scheduler:
             req = self._wait_queue.pop(0)
             rid = req.request_id
             if rid in self._running_requests:
-                # Already inflight; chunked-prefill, skip
+                # Already inflight; a later prefill chunk of the same prompt
+                self._enque_prefill_chunk(req)
                 continue
             # Check kv cache pool
             if self.kv_cache_manager is not None:
@@ -258,6 +298,43 @@ class Scheduler:
                 continue
         return timed_out
 
+    def _prefill_progress(self, request: Request) -> int:
+        """Number of prompt tokens already written to the KV cache for a request."""
+        if self.kv_cache_manager is None or not self.kv_cache_manager.has_request(
+            request.request_id
+        ):
+            return 0
+        return self.kv_cache_manager.request_length(request.request_id)
+
+    def _schedule_prefill(self, request: Request, token_budget: int, batch_empty: bool) -> int:
+        """Picks the prompt tokens of a prefill request to run in this batch.
+
+        Returns:
+            The number of tokens scheduled, or 0 if the request has to wait.
+        """
+        if not isinstance(request, InitialRequest):
+            # Non-first peers run the chunk their upstream peer produced; an oversized
+            # chunk is run on its own rather than never.
+            if request.hidden_states is not None:
+                cost = request.hidden_states.shape[0]
+            else:
+                cost = request.prompt_len
+            return cost if cost <= token_budget or batch_empty else 0
+
+        done = self._prefill_progress(request)
+        remaining = request.prompt_len - done
+        if self.enable_chunked_prefill:
+            chunk = min(remaining, token_budget, self.chunked_prefill_size)
+        elif remaining <= token_budget:
+            chunk = remaining
+        else:
+            return 0
+        if chunk <= 0:
+            return 0
+        request.prefill_offset = done
+        request.prefill_chunk_len = chunk
+        return chunk
+
     def form_batch(self) -> List[Request]:
         """Form the active batch for the next forward pass.
 
@@ -265,10 +342,13 @@ class Scheduler:
           following the OrderedDict iteration order where ready decodes are
           moved-to-end upon readiness, while respecting micro_batch_size and
           max_num_tokens_per_batch.
+        - With chunked prefill, prompts only get the budget left after reserving one
+          token per ready decode, and are split into chunks when they do not fit.
         """
         self.admit_requests()
         if not self._running_requests:
             return []
+        self._promote_pending_prefill_chunks()
 
         inflight_tokens = 0
         batch: List[Request] = []
@@ -283,12 +363,18 @@ class Scheduler:
                 elif req.is_decoding:
                     decode_candidates.append(req)
 
+        # Keep room for ready decodes so a long prompt cannot stall them
+        reserved_tokens = 0
+        if self.enable_chunked_prefill:
+            reserved_tokens = min(len(decode_candidates), self.micro_batch_size)
+
         # 1) Fill with prefills first
         for req in prefill_candidates:
             if len(batch) >= self.micro_batch_size:
                 break
-            cost = req.prompt_len
-            if cost + inflight_tokens > self.max_num_tokens_per_batch:
+            token_budget = self.max_num_tokens_per_batch - reserved_tokens - inflight_tokens
+            cost = self._schedule_prefill(req, token_budget, batch_empty=not batch)
+            if cost == 0:
                 continue
             batch.append(req)
             inflight_tokens += cost
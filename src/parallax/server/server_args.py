@@ -56,6 +56,15 @@ def parse_args() -> argparse.Namespace:
         "--node-chat-port", type=int, default=3002, help="节点聊天HTTP服务器的端口号"
     )
 
+    # HTTP服务器中负责套用聊天模板和分词的工作进程数，默认按CPU核数自动选择
+    # 设为0时由执行器自行分词
+    parser.add_argument(
+        "--tokenizer-workers",
+        type=int,
+        default=None,
+        help="HTTP服务器中提示词分词工作进程的数量",
+    )
+
     # ===== Lattica P2P 网络配置 =====
     # DHT（分布式哈希表）的初始节点列表，用于加入P2P网络
     parser.add_argument("--initial-peers", nargs="+", default=[], help="DHT初始节点地址列表")
@@ -85,6 +94,43 @@ def parse_args() -> argparse.Namespace:
         "--notify-url", type=str, default=None, help="请求完成时的回调通知URL"
     )
 
+    # 发送给下一节点的隐藏状态张量编码格式
+    # safetensors: 所有节点都能解码（默认）
+    # raw: 紧凑的原始二进制帧，仅当流水线中所有节点都已升级时使用
+    parser.add_argument(
+        "--wire-tensor-format",
+        type=str,
+        default="safetensors",
+        choices=["raw", "safetensors"],
+        help="节点间隐藏状态的传输编码格式",
+    )
+
+    # 发送给下一节点的浮点隐藏状态的压缩方式，接收方按请求中记录的方式解码
+    # passthrough: 无损（默认）；bf16/fp16: 降精度；int8: 按token缩放的int8量化
+    parser.add_argument(
+        "--activation-codec",
+        type=str,
+        default="passthrough",
+        choices=["passthrough", "bf16", "fp16", "int8"],
+        help="节点间隐藏状态的压缩编码方式",
+    )
+
+    # 对下一节点已完整收到的请求，后续解码只发送增量（省略input_ids和sampling_params）
+    # 旧版本节点会忽略增量标记，因此仅当流水线中所有节点都已升级时启用
+    parser.add_argument(
+        "--enable-delta-hops",
+        action="store_true",
+        help="节点间解码请求只发送增量字段",
+    )
+
+    # 向调度器上报执行器指标的最小间隔（秒），间隔内的更新会被合并，只发送变化明显的指标
+    parser.add_argument(
+        "--metrics-publish-interval",
+        type=float,
+        default=1.0,
+        help="向调度器上报指标的最小间隔（秒）",
+    )
+
     # ===== 模型配置 =====
     # 模型仓库路径或模型名称，支持HuggingFace模型ID
     # 例如：'mlx-community/Qwen3-0.6B-bf16' 或 '/path/to/local/model'
@@ -323,6 +369,13 @@ def validate_args(args: argparse.Namespace) -> None:
     if getattr(args, "request_timeout_s", None) is not None and args.request_timeout_s <= 0:
         raise ValueError("request_timeout_s must be positive")
 
+    if getattr(args, "tokenizer_workers", None) is not None and args.tokenizer_workers < 0:
+        raise ValueError("tokenizer_workers must be non-negative")
+
+    interval = getattr(args, "metrics_publish_interval", None)
+    if interval is not None and interval < 0:
+        raise ValueError("metrics_publish_interval must be non-negative")
+
     # Validate supported dtypes
     dtype_list = [
         "float16",
@@ -5,15 +5,21 @@ Loads sharded MLX models from Hugging Face Hub or local paths.
 import glob
 import importlib
 import pathlib
-from typing import Any, Dict, Optional, Tuple
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import mlx.core as mx
-import safetensors
 from mlx import nn
+from mlx.utils import tree_flatten
 from mlx_lm.utils import get_model_path, load_config
 
 from parallax.server.model import ShardedModel
 from parallax.utils.tokenizer_utils import load_tokenizer
+from parallax.utils.weight_filter_utils import (
+    filter_weight_files_by_layer_range_for_load,
+    should_include_weight_key,
+)
 from parallax_utils.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -87,43 +93,103 @@ class MLXModelLoader:
             except Exception as e:
                 logger.warning(f"Failed to load model from {model_file}: {e}")
 
-    def load(
-        self, lazy: bool = False, strict: bool = True, use_selective_download: bool = True
-    ) -> Tuple[nn.Module, Dict[str, Any], Any]:
-        """
-        Loads the specified model shard by loading only the necessary weights
-        from the safetensor files, saving significant memory.
-
-        Args:
-            lazy (bool): If False, evaluates model parameters to ensure they are loaded
-                         into memory. Defaults to False.
-            strict (bool): If True, raises an exception if weights do not match.
-                           Defaults to True.
-            use_selective_download (bool): If True, only download necessary weight files
-                                          from Hugging Face. Defaults to True.
-        Returns:
-            A tuple containing the loaded sharded MLX model and its configuration dictionary.
-        """
-        if use_selective_download and self.start_layer is not None and self.end_layer is not None:
+    @staticmethod
+    def _remap_weight_key(
+        key: str, model_shard: ShardedModel, start_layer: int, tie_word_embeddings: bool
+    ) -> List[str]:
+        """Maps a checkpoint key to the parameter names it fills in the shard."""
+        remapped_keys = []
+        if model_shard.is_first_shard and "embed_tokens" in key and key.startswith("model."):
+            remapped_keys.append(key.replace("model.", "", 1))
+            if model_shard.is_last_shard and tie_word_embeddings:
+                remapped_keys.append("lm_head.weight")
+        elif model_shard.is_last_shard:
+            if "model.norm" in key:
+                remapped_keys.append(key.replace("model.", "", 1))
+            if "lm_head" in key:
+                remapped_keys.append(key)
+            elif tie_word_embeddings and key.startswith("model.embed_tokens"):
+                # TODO: we don't need load lm_head in this case
+                # as we will pass hidden_states to FirstPeer
+                # see request.py for details
+                remapped_keys.append("lm_head.weight")
+        if key.startswith("model.layers."):
+            parts = key.split(".")
+            local_layer_idx = int(parts[2]) - start_layer
+            remapped_keys = [f"layers.{local_layer_idx}.{'.'.join(parts[3:])}"]
+        return remapped_keys
+
+    def _resolve_model_path(
+        self,
+        start_layer: Optional[int],
+        end_layer: Optional[int],
+        use_selective_download: bool,
+        on_weight_file_ready: Optional[Callable[[pathlib.Path], None]] = None,
+    ) -> pathlib.Path:
+        if use_selective_download and start_layer is not None and end_layer is not None:
             from parallax.utils.selective_download import (
                 get_model_path_with_selective_download,
             )
 
-            logger.info(
-                f"Using selective download for layers [{self.start_layer}, {self.end_layer})"
-            )
-            model_path = get_model_path_with_selective_download(
+            logger.info(f"Using selective download for layers [{start_layer}, {end_layer})")
+            return get_model_path_with_selective_download(
                 self.model_path_str,
-                start_layer=self.start_layer,
-                end_layer=self.end_layer,
+                start_layer=start_layer,
+                end_layer=end_layer,
                 local_files_only=self.use_hfcache,
+                on_weight_file_ready=on_weight_file_ready,
             )
-        else:
-            model_path = get_model_path(self.model_path_str)[0]
+        return get_model_path(self.model_path_str)[0]
 
-        config = load_config(model_path)
-        tokenizer = load_tokenizer(model_path, eos_token_ids=config.get("eos_token_id", None))
+    def _download_and_prefetch(
+        self, start_layer: int, end_layer: int
+    ) -> Tuple[pathlib.Path, Optional[ShardedModel], Dict[str, Dict[str, mx.array]]]:
+        """
+        Runs the selective download of layers [start_layer, end_layer) on a background
+        thread and reads the shard's tensors of each weight file as soon as the file is
+        downloaded and verified, while later files are still arriving.
 
+        Returns the model path, the shard built for reading (None if no file was
+        reported, e.g. for local or cache-only models) and the evaluated weights of
+        every prefetched file, keyed by file name.
+        """
+        ready: "queue.Queue[Optional[pathlib.Path]]" = queue.Queue()
+        outcome: Dict[str, Any] = {}
+
+        def download():
+            try:
+                outcome["model_path"] = self._resolve_model_path(
+                    start_layer, end_layer, True, on_weight_file_ready=ready.put
+                )
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                ready.put(None)
+
+        thread = threading.Thread(target=download, name="weight-download", daemon=True)
+        thread.start()
+
+        model_shard = None
+        prefetched = {}
+        while (weight_file := ready.get()) is not None:
+            if model_shard is None:
+                # Metadata, config.json included, is downloaded before any weight file
+                config = load_config(weight_file.parent)
+                model_shard = self._build_model_shard(config, start_layer, end_layer)
+            weights = self._read_weight_file(weight_file, config, model_shard)
+            mx.eval(list(weights.values()))
+            prefetched[weight_file.name] = weights
+            logger.debug(f"Prefetched {len(weights)} tensors from {weight_file.name}")
+        thread.join()
+
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["model_path"], model_shard, prefetched
+
+    def _build_model_shard(
+        self, config: Dict[str, Any], start_layer: int, end_layer: int
+    ) -> ShardedModel:
+        """Creates an (unloaded) ShardedModel for layers [start_layer, end_layer)."""
         architectures = config.get("architectures", None)
         if architectures is None:
             raise ValueError("architectures not found in config.json")
@@ -134,10 +200,6 @@ class MLXModelLoader:
         if block_class is None:
             raise ValueError(f"block_class not found for architecture: {architecture}")
 
-        num_hidden_layers = config.get("num_hidden_layers", 0)
-        current_start_layer = self.start_layer if self.start_layer is not None else 0
-        current_end_layer = self.end_layer if self.end_layer is not None else num_hidden_layers
-
         # We need the model object to know its structure and which layers it owns.
         # This part mirrors the logic from the provided utils.py to get model_args.
         model_type = config.get("model_type")
@@ -165,15 +227,29 @@ class MLXModelLoader:
             model_id = model_id.split("/")[-1]
         else:  # If it's already a clean name or a local path (take basename)
             model_id = pathlib.Path(model_id).name
-        model_shard = ShardedModel(
+        return ShardedModel(
             config=model_args,
             model_id=model_id,
-            start_layer=current_start_layer,
-            end_layer=current_end_layer,
+            start_layer=start_layer,
+            end_layer=end_layer,
             block_class=block_class,
             dtype=dtype,
         )
 
+    def _read_shard_weights(
+        self,
+        model_path: pathlib.Path,
+        config: Dict[str, Any],
+        model_shard: ShardedModel,
+        strict: bool = True,
+        prefetched: Optional[Dict[str, Dict[str, mx.array]]] = None,
+    ) -> Dict[str, mx.array]:
+        """
+        Returns the checkpoint weights of `model_shard`, keyed by its parameter names.
+
+        Files found in `prefetched` (see `_download_and_prefetch`) are not scanned again.
+        """
+        start_layer, end_layer = model_shard.start_layer, model_shard.end_layer
         weight_files = glob.glob(str(model_path / "model*.safetensors"))
         if not weight_files:
             weight_files = glob.glob(str(model_path / "weight*.safetensors"))
@@ -182,15 +258,11 @@ class MLXModelLoader:
         weight_files = sorted(weight_files)
 
         # Use shared utility to filter weight files
-        from parallax.utils.weight_filter_utils import (
-            filter_weight_files_by_layer_range_for_load,
-        )
-
         weight_files = filter_weight_files_by_layer_range_for_load(
             model_path=model_path,
             weight_files=weight_files,
-            start_layer=current_start_layer,
-            end_layer=current_end_layer,
+            start_layer=start_layer,
+            end_layer=end_layer,
             is_first_shard=model_shard.is_first_shard,
             is_last_shard=model_shard.is_last_shard,
             config=config,
@@ -199,95 +271,133 @@ class MLXModelLoader:
         if not weight_files and strict:
             raise FileNotFoundError(f"No safetensors found in {model_path}")
 
-        # Instead of loading all weights, we iterate through files and keys,
-        # loading only what we need.
         shard_weights = {}
-        layer_key_prefix = "model.layers"  # Common prefix
-
+        prefetched = prefetched or {}
         for file_idx, wf in enumerate(weight_files):
+            weight_file = pathlib.Path(wf)
+            if weight_file.name in prefetched:
+                shard_weights.update(prefetched[weight_file.name])
+                continue
             logger.debug(
-                f"Scanning weight file {file_idx + 1}/{len(weight_files)}: {pathlib.Path(wf).name}"
+                f"Scanning weight file {file_idx + 1}/{len(weight_files)}: {weight_file.name}"
             )
+            shard_weights.update(self._read_weight_file(weight_file, config, model_shard))
+        return shard_weights
+
+    def _read_weight_file(
+        self, weight_file: pathlib.Path, config: Dict[str, Any], model_shard: ShardedModel
+    ) -> Dict[str, mx.array]:
+        """Returns the weights of `model_shard` in one safetensors file."""
+        # mx.load only parses the safetensors header; a tensor's bytes are read straight
+        # into MLX memory when it is first evaluated, so weights outside this shard are
+        # never read from disk.
+        start_layer, end_layer = model_shard.start_layer, model_shard.end_layer
+        tie_word_embeddings = config.get("tie_word_embeddings", False)
+        weights = {}
+        for key, weight in mx.load(str(weight_file)).items():
+            try:
+                if not should_include_weight_key(
+                    key,
+                    start_layer=start_layer,
+                    end_layer=end_layer,
+                    is_first_shard=model_shard.is_first_shard,
+                    is_last_shard=model_shard.is_last_shard,
+                    tie_word_embeddings=tie_word_embeddings,
+                ):
+                    continue
+            except (ValueError, IndexError):
+                continue
+            for remapped_key in self._remap_weight_key(
+                key, model_shard, start_layer, tie_word_embeddings
+            ):
+                weights[remapped_key] = weight
+        return weights
+
+    @staticmethod
+    def _quantize(
+        model_shard: ShardedModel, config: Dict[str, Any], shard_weights: Dict[str, mx.array]
+    ):
+        if (quantization := config.get("quantization", None)) is None:
+            return
+        logger.debug("Model is quantized. Applying quantization parameters...")
+
+        def class_predicate(p, m):
+            # Handle custom per-layer quantizations from the config
+            qcfg = config.get("quantization", {})
+            # Direct key (Parallax remapped keys usually drop the 'model.' prefix)
+            if p in qcfg:
+                override = qcfg[p]
+                if isinstance(override, dict):
+                    logger.debug(
+                        f"[quantize] Using override for '{p}': bits={override.get('bits')} group_size={override.get('group_size')}"
+                    )
+                return override
+            # Allow config keys that still include the original 'model.' prefix (as in mlx-lm)
+            prefixed = f"model.{p}"
+            if prefixed in qcfg:
+                override = qcfg[prefixed]
+                return override
+            if not hasattr(m, "to_quantized"):
+                return False
+            # Handle legacy models by checking if quantized weights exist
+            return f"{p}.scales" in shard_weights
+
+        nn.quantize(
+            model_shard,
+            group_size=quantization["group_size"],
+            bits=quantization["bits"],
+            mode=quantization.get("mode", "affine"),
+            class_predicate=class_predicate,
+        )
+
+    def load(
+        self, lazy: bool = False, strict: bool = True, use_selective_download: bool = True
+    ) -> Tuple[nn.Module, Dict[str, Any], Any]:
+        """
+        Loads the specified model shard by loading only the necessary weights
+        from the safetensor files, saving significant memory.
 
-            with safetensors.safe_open(wf, framework="pt") as f:
-                for key in f.keys():
-                    is_needed = False
-                    remapped_key = None
-
-                    # Check if the key belongs to the shard and remap it
-                    if (
-                        model_shard.is_first_shard
-                        and "embed_tokens" in key
-                        and key.startswith("model.")
-                    ):
-                        is_needed = True
-                        remapped_key = key.replace("model.", "", 1)
-                        if model_shard.is_last_shard and config.get("tie_word_embeddings", False):
-                            shard_weights["lm_head.weight"] = mx.array(f.get_tensor(key))
-                    elif model_shard.is_last_shard:
-                        if "model.norm" in key:
-                            is_needed = True
-                            remapped_key = key.replace("model.", "", 1)
-                        if "lm_head" in key:
-                            is_needed = True
-                            remapped_key = key
-                        elif (
-                            config.get("tie_word_embeddings", False)
-                            and "embed" in key
-                            and key.startswith("model.embed_tokens")
-                        ):
-                            # TODO: we don't need load lm_head in this case
-                            # as we will pass hidden_states to FirstPeer
-                            # see request.py for details
-                            is_needed = True
-                            remapped_key = "lm_head.weight"
-                    if layer_key_prefix in key:
-                        try:
-                            parts = key.split(".")
-                            layer_idx = int(parts[2])
-                            if current_start_layer <= layer_idx < current_end_layer:
-                                is_needed = True
-                                local_layer_idx = layer_idx - current_start_layer
-                                remapped_key = f"layers.{local_layer_idx}.{'.'.join(parts[3:])}"
-                        except (ValueError, IndexError):
-                            continue
-
-                    # If the key is needed, load only that tensor from the file
-                    if is_needed:
-                        shard_weights[remapped_key] = mx.array(f.get_tensor(key))
-
-        if (quantization := config.get("quantization", None)) is not None:
-            logger.debug("Model is quantized. Applying quantization parameters...")
-
-            def class_predicate(p, m):
-                # Handle custom per-layer quantizations from the config
-                qcfg = config.get("quantization", {})
-                # Direct key (Parallax remapped keys usually drop the 'model.' prefix)
-                if p in qcfg:
-                    override = qcfg[p]
-                    if isinstance(override, dict):
-                        logger.debug(
-                            f"[quantize] Using override for '{p}': bits={override.get('bits')} group_size={override.get('group_size')}"
-                        )
-                    return override
-                # Allow config keys that still include the original 'model.' prefix (as in mlx-lm)
-                prefixed = f"model.{p}"
-                if prefixed in qcfg:
-                    override = qcfg[prefixed]
-                    return override
-                if not hasattr(m, "to_quantized"):
-                    return False
-                # Handle legacy models by checking if quantized weights exist
-                return f"{p}.scales" in shard_weights
-
-            nn.quantize(
-                model_shard,
-                group_size=quantization["group_size"],
-                bits=quantization["bits"],
-                mode=quantization.get("mode", "affine"),
-                class_predicate=class_predicate,
+        Args:
+            lazy (bool): If False, evaluates model parameters to ensure they are loaded
+                         into memory. Defaults to False.
+            strict (bool): If True, raises an exception if weights do not match.
+                           Defaults to True.
+            use_selective_download (bool): If True, only download necessary weight files
+                                          from Hugging Face. Unless `lazy`, each file is
+                                          read as soon as it has been downloaded.
+                                          Defaults to True.
+        Returns:
+            A tuple containing the loaded sharded MLX model and its configuration dictionary.
+        """
+        model_shard = None
+        prefetched = {}
+        if (
+            use_selective_download
+            and not lazy
+            and self.start_layer is not None
+            and self.end_layer is not None
+        ):
+            model_path, model_shard, prefetched = self._download_and_prefetch(
+                self.start_layer, self.end_layer
             )
+        else:
+            model_path = self._resolve_model_path(
+                self.start_layer, self.end_layer, use_selective_download
+            )
+
+        config = load_config(model_path)
+        tokenizer = load_tokenizer(model_path, eos_token_ids=config.get("eos_token_id", None))
 
+        num_hidden_layers = config.get("num_hidden_layers", 0)
+        current_start_layer = self.start_layer if self.start_layer is not None else 0
+        current_end_layer = self.end_layer if self.end_layer is not None else num_hidden_layers
+
+        if model_shard is None:
+            model_shard = self._build_model_shard(config, current_start_layer, current_end_layer)
+        shard_weights = self._read_shard_weights(
+            model_path, config, model_shard, strict=strict, prefetched=prefetched
+        )
+        self._quantize(model_shard, config, shard_weights)
         model_shard.load_weights(list(shard_weights.items()), strict=strict)
 
         if not lazy:
@@ -300,3 +410,82 @@ class MLXModelLoader:
             mx.get_active_memory() / 1024**3,
         )
         return model_shard, config, tokenizer
+
+    def reshard(
+        self,
+        model_shard: ShardedModel,
+        start_layer: int,
+        end_layer: int,
+        lazy: bool = False,
+        use_selective_download: bool = True,
+    ) -> ShardedModel:
+        """
+        Moves a loaded shard to layers [start_layer, end_layer).
+
+        Layers (and the embedding / final norm / lm_head) that the new range still
+        needs are taken over from `model_shard` as they are; only the weights of the
+        newly assigned layers are read from disk. Layers that fall out of the range
+        are freed; `model_shard` gives up its modules and must not be used afterwards.
+
+        Args:
+            model_shard (ShardedModel): The currently loaded shard.
+            start_layer (int): The new starting layer index (inclusive).
+            end_layer (int): The new ending layer index (exclusive).
+            lazy (bool): If False, evaluates the new parameters. Defaults to False.
+            use_selective_download (bool): If True, only download the weight files
+                                          of the new range. Defaults to True.
+        Returns:
+            The ShardedModel for the new layer range.
+        """
+        model_path = self._resolve_model_path(start_layer, end_layer, use_selective_download)
+        config = load_config(model_path)
+
+        new_shard = self._build_model_shard(config, start_layer, end_layer)
+        shard_weights = self._read_shard_weights(model_path, config, new_shard)
+        # Quantize before taking over the old modules, which are quantized already
+        self._quantize(new_shard, config, shard_weights)
+
+        kept_prefixes = []
+        for layer_idx in range(
+            max(start_layer, model_shard.start_layer), min(end_layer, model_shard.end_layer)
+        ):
+            local_idx = layer_idx - start_layer
+            new_shard.layers[local_idx] = model_shard.layers[layer_idx - model_shard.start_layer]
+            kept_prefixes.append(f"layers.{local_idx}.")
+        if new_shard.is_first_shard and model_shard.is_first_shard:
+            new_shard.embed_tokens = model_shard.embed_tokens
+            kept_prefixes.append("embed_tokens.")
+        if new_shard.is_last_shard and model_shard.is_last_shard:
+            new_shard.norm = model_shard.norm
+            new_shard.lm_head = model_shard.lm_head
+            kept_prefixes.extend(["norm.", "lm_head."])
+        kept_prefixes = tuple(kept_prefixes)
+
+        new_weights = {k: v for k, v in shard_weights.items() if not k.startswith(kept_prefixes)}
+        missing = [
+            k
+            for k, _ in tree_flatten(new_shard.parameters())
+            if not k.startswith(kept_prefixes) and k not in new_weights
+        ]
+        if missing:
+            raise ValueError(f"Missing weights for layers [{start_layer}, {end_layer}): {missing}")
+        new_shard.load_weights(list(new_weights.items()), strict=False)
+
+        # Free the dropped layers before the new weights are read into memory
+        model_shard.layers = []
+        model_shard.embed_tokens = model_shard.norm = model_shard.lm_head = None
+        mx.clear_cache()
+
+        if not lazy:
+            mx.eval(new_shard.parameters())
+        new_shard.eval()
+        logger.info(
+            "Resharded layers [%d-%d) -> [%d-%d), loaded %d new tensors, memory usage: %.3f GB",
+            model_shard.start_layer,
+            model_shard.end_layer,
+            start_layer,
+            end_layer,
+            len(new_weights),
+            mx.get_active_memory() / 1024**3,
+        )
+        return new_shard
@@ -0,0 +1,75 @@
+"""
+SSE chunk encoder for streaming chat completions.
+
+A streamed response repeats the same envelope (id, object, model, created) in every
+chunk. ChatCompletionChunkEncoder renders that envelope once per request and only
+encodes the per-token values, producing the same bytes as
+
+    json.dumps(chunk, separators=(",", ":"))
+
+on the full chunk dict. Strings go through the C string escaper that json.dumps uses
+with ensure_ascii, so the output stays ASCII like before. (orjson would be faster
+but always writes UTF-8, which would change the bytes sent to clients.)
+"""
+
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, Optional
+
+
+def _encode_value(value: Any) -> str:
+    """Encodes a JSON scalar exactly as json.dumps does."""
+    if value is None:
+        return "null"
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if type(value) is int:
+        return int.__repr__(value)
+    return json.dumps(value)
+
+
+class ChatCompletionChunkEncoder:
+    """Encodes the `chat.completion.chunk` SSE events of one streaming request."""
+
+    def __init__(self, rid: str, model: str, created: float):
+        self._prefix = (
+            'data: {"id":'
+            + _encode_value(rid)
+            + ',"object":"chat.completion.chunk","model":'
+            + _encode_value(model)
+            + ',"created":'
+            + _encode_value(created)
+            + ',"choices":[{"index":0,"logprobs":'
+        )
+
+    def encode(
+        self,
+        role: Optional[str],
+        content: Optional[str],
+        finish_reason: Optional[str],
+        logprobs: Optional[float],
+        matched_stop: Optional[int],
+        prompt_tokens: int,
+        completion_tokens: int,
+    ) -> bytes:
+        return "".join(
+            (
+                self._prefix,
+                _encode_value(logprobs),
+                ',"finish_reason":',
+                _encode_value(finish_reason),
+                ',"matched_stop":',
+                _encode_value(matched_stop),
+                ',"delta":{"role":',
+                _encode_value(role),
+                ',"content":',
+                _encode_value(content),
+                '}}],"usage":{"prompt_tokens":',
+                _encode_value(prompt_tokens),
+                ',"total_tokens":',
+                _encode_value(prompt_tokens + completion_tokens),
+                ',"completion_tokens":',
+                _encode_value(completion_tokens),
+                "}}\n\n",
+            )
+        ).encode()
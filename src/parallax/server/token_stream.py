@@ -0,0 +1,93 @@
+"""
+Executor -> HTTP server output channel.
+
+The executor reports the tokens committed in one step as a single token batch instead
+of one message per request. Messages are two zmq frames, a message type and a msgpack
+payload:
+
+    TOKEN_BATCH: [rids, token_ids, finish_reason_codes, prompt_tokens, logprobs]
+    ERROR:       {"rid", "error", "error_type", "status_code"}
+
+where the batch is a list of parallel arrays, one entry per request, and
+finish_reason_codes index FINISH_REASONS.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import msgpack
+
+TOKEN_BATCH = b"tokens"
+ERROR = b"error"
+
+FINISH_REASONS = (None, "eos", "length")
+_FINISH_REASON_CODES = {reason: code for code, reason in enumerate(FINISH_REASONS)}
+
+
+@dataclass
+class StreamedToken:
+    """One entry of a token batch, as seen by the HTTP server."""
+
+    rid: str
+    token_id: int
+    finish_reason: Optional[str]
+    prompt_tokens: int
+    logprob: Optional[float] = None
+
+
+class TokenBatchBuilder:
+    """Collects the tokens of one executor step into a single TOKEN_BATCH message."""
+
+    def __init__(self):
+        self.rids: List[str] = []
+        self.token_ids: List[int] = []
+        self.finish_reasons: List[int] = []
+        self.prompt_tokens: List[int] = []
+        self.logprobs: List[Optional[float]] = []
+
+    def __len__(self) -> int:
+        return len(self.rids)
+
+    def add(
+        self,
+        rid: str,
+        token_id: int,
+        finish_reason: Optional[str],
+        prompt_tokens: int,
+        logprob: Optional[float] = None,
+    ):
+        self.rids.append(rid)
+        self.token_ids.append(int(token_id))
+        self.finish_reasons.append(_FINISH_REASON_CODES[finish_reason])
+        self.prompt_tokens.append(prompt_tokens)
+        self.logprobs.append(logprob)
+
+    def to_frames(self) -> Tuple[bytes, bytes]:
+        payload = [
+            self.rids,
+            self.token_ids,
+            self.finish_reasons,
+            self.prompt_tokens,
+            self.logprobs,
+        ]
+        return TOKEN_BATCH, msgpack.packb(payload)
+
+
+def error_to_frames(payload: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    return ERROR, msgpack.packb(payload)
+
+
+def decode_token_batch(payload: bytes) -> Iterator[StreamedToken]:
+    rids, token_ids, finish_reasons, prompt_tokens, logprobs = msgpack.unpackb(payload)
+    for i, rid in enumerate(rids):
+        yield StreamedToken(
+            rid=rid,
+            token_id=token_ids[i],
+            finish_reason=FINISH_REASONS[finish_reasons[i]],
+            prompt_tokens=prompt_tokens[i],
+            logprob=logprobs[i],
+        )
+
+
+def decode_error(payload: bytes) -> Dict[str, Any]:
+    return msgpack.unpackb(payload)
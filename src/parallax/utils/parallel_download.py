@@ -0,0 +1,193 @@
+"""
+Parallel, resumable download of model weight files.
+
+ParallelDownloader fetches a set of files over HTTP with a bounded number of
+concurrent transfers. Each file is written to `<name>.part` next to its destination
+and renamed once complete, so an interrupted transfer is resumed with a `Range`
+request on the next attempt instead of starting over. Files with a known sha256 are
+verified before the rename; a corrupt download is discarded and fetched again.
+
+Completed files are reported as they finish (see `iter_download`), so a caller can
+start loading the first weight shards while later ones are still arriving.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from parallax_utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("PARALLAX_DOWNLOAD_WORKERS", "4"))
+_CHUNK_SIZE = 8 * 1024 * 1024
+_PART_SUFFIX = ".part"
+
+
+@dataclass
+class RemoteFile:
+    """A file to download; `size` and `sha256` are checked when known."""
+
+    filename: str
+    url: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+def _hash_file(path: Path) -> "hashlib._Hash":
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest
+
+
+class ParallelDownloader:
+    """Downloads files with bounded concurrency, resuming partial transfers."""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        headers: Optional[Dict[str, str]] = None,
+        max_retries: int = 3,
+        timeout: float = 30.0,
+        retry_backoff_s: float = 1.0,
+    ):
+        """
+        Args:
+            max_workers: Maximum number of files transferred at the same time.
+            headers: Extra HTTP headers sent with every request (e.g. authorization).
+            max_retries: Attempts per file before its download fails.
+            timeout: Connect / read timeout of a single request in seconds.
+            retry_backoff_s: Delay before the first retry, doubled on each attempt.
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max(1, max_retries)
+        self.retry_backoff_s = retry_backoff_s
+        self._client = httpx.Client(headers=headers or {}, timeout=timeout, follow_redirects=True)
+        self._lock = threading.Lock()
+        self.bytes_downloaded = 0
+
+    def close(self):
+        self._client.close()
+
+    def download(
+        self,
+        files: List[RemoteFile],
+        dest_dir: Path,
+        on_file_ready: Optional[Callable[[Path], None]] = None,
+    ) -> List[Path]:
+        """Downloads `files` into `dest_dir` and returns their paths in input order."""
+        paths = {}
+        for path in self.iter_download(files, dest_dir):
+            paths[path.name] = path
+            if on_file_ready is not None:
+                on_file_ready(path)
+        return [paths[Path(f.filename).name] for f in files]
+
+    def iter_download(self, files: List[RemoteFile], dest_dir: Path) -> Iterator[Path]:
+        """
+        Yields the path of every file as soon as it is complete and verified.
+
+        Files that already exist in `dest_dir` are yielded first without being fetched.
+        The first failed file raises once the transfers in flight have finished.
+        """
+        dest_dir = Path(dest_dir)
+        pending = []
+        for remote in files:
+            dest = dest_dir / remote.filename
+            if dest.exists():
+                logger.debug(f"{remote.filename} already exists locally, skipping download")
+                yield dest
+            else:
+                pending.append(remote)
+        if not pending:
+            return
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(pending)), thread_name_prefix="download"
+        ) as pool:
+            futures = [pool.submit(self._download_file, f, dest_dir) for f in pending]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        elapsed = time.monotonic() - start
+        logger.info(
+            f"Downloaded {len(pending)} files ({self.bytes_downloaded / 1024**2:.1f} MB) "
+            f"in {elapsed:.1f} s"
+        )
+
+    def _download_file(self, remote: RemoteFile, dest_dir: Path) -> Path:
+        dest = dest_dir / remote.filename
+        part = dest.with_name(dest.name + _PART_SUFFIX)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                digest = self._fetch(remote, part)
+            except httpx.HTTPError as e:
+                if attempt == self.max_retries:
+                    raise RuntimeError(f"Failed to download {remote.filename}: {e}") from e
+                logger.warning(
+                    f"Download of {remote.filename} interrupted ({e}), "
+                    f"resuming (attempt {attempt + 1}/{self.max_retries})"
+                )
+                time.sleep(self.retry_backoff_s * 2 ** (attempt - 1))
+                continue
+
+            size = part.stat().st_size
+            if remote.size is not None and size != remote.size:
+                error = f"expected {remote.size} bytes, got {size}"
+            elif remote.sha256 is not None and digest.hexdigest() != remote.sha256:
+                error = f"sha256 mismatch, expected {remote.sha256}, got {digest.hexdigest()}"
+            else:
+                os.replace(part, dest)
+                logger.debug(f"Downloaded {remote.filename} ({size} bytes)")
+                return dest
+
+            part.unlink()
+            if attempt == self.max_retries:
+                raise ValueError(f"Downloaded {remote.filename} is corrupt: {error}")
+            logger.warning(f"Downloaded {remote.filename} is corrupt ({error}), downloading again")
+        raise AssertionError("unreachable")
+
+    def _fetch(self, remote: RemoteFile, part: Path) -> "hashlib._Hash":
+        """Fetches `remote` into `part`, continuing from the bytes already there."""
+        offset = part.stat().st_size if part.exists() else 0
+        if remote.size is not None and offset > remote.size:
+            part.unlink()
+            offset = 0
+        if remote.size is not None and offset == remote.size:
+            return _hash_file(part)
+
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with self._client.stream("GET", remote.url, headers=headers) as response:
+            response.raise_for_status()
+            if offset and response.status_code == 206:
+                logger.debug(f"Resuming {remote.filename} at byte {offset}")
+                digest = _hash_file(part)
+                mode = "ab"
+            else:
+                # The server ignored the range; start from scratch
+                digest = hashlib.sha256()
+                mode = "wb"
+            with open(part, mode) as f:
+                # Write data as it arrives so an interrupted transfer keeps what it got
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+                    digest.update(chunk)
+                    with self._lock:
+                        self.bytes_downloaded += len(chunk)
+        return digest
@@ -2,11 +2,17 @@ import inspect
 import logging
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Callable, List, Optional
 
-from huggingface_hub import HfApi, hf_hub_download, snapshot_download
+from huggingface_hub import HfApi, hf_hub_download, hf_hub_url, snapshot_download
+from huggingface_hub.utils import build_hf_headers
 
 logger = logging.getLogger(__name__)
+from parallax.utils.parallel_download import (
+    DEFAULT_MAX_WORKERS,
+    ParallelDownloader,
+    RemoteFile,
+)
 from parallax.utils.weight_filter_utils import (
     determine_needed_weight_files_for_download,
 )
@@ -70,6 +76,52 @@ def download_metadata_only(
     return Path(path)
 
 
+def download_weight_files(
+    repo_id: str,
+    model_path: Path,
+    filenames: List[str],
+    force_download: bool = False,
+    on_file_ready: Optional[Callable[[Path], None]] = None,
+    max_workers: Optional[int] = None,
+) -> List[Path]:
+    """
+    Downloads weight files of a Hub repo into its snapshot directory `model_path`.
+
+    Files are fetched in parallel and resumed if a previous attempt was interrupted.
+    Each one is verified against the size and LFS sha256 the Hub lists for it.
+    `on_file_ready` is called with the path of every file as soon as it is complete.
+    """
+    # model_path is <cache>/snapshots/<commit>; pin the files to the same commit
+    revision = model_path.name if model_path.parent.name == "snapshots" else None
+    if force_download:
+        for filename in filenames:
+            (model_path / filename).unlink(missing_ok=True)
+
+    infos = {
+        info.path: info for info in HfApi().get_paths_info(repo_id, filenames, revision=revision)
+    }
+    remote_files = []
+    for filename in filenames:
+        info = infos.get(filename)
+        lfs = getattr(info, "lfs", None)
+        remote_files.append(
+            RemoteFile(
+                filename=filename,
+                url=hf_hub_url(repo_id, filename, revision=revision),
+                size=getattr(info, "size", None),
+                sha256=lfs.sha256 if lfs is not None else None,
+            )
+        )
+
+    downloader = ParallelDownloader(
+        max_workers=max_workers or DEFAULT_MAX_WORKERS, headers=build_hf_headers()
+    )
+    try:
+        return downloader.download(remote_files, model_path, on_file_ready=on_file_ready)
+    finally:
+        downloader.close()
+
+
 def selective_model_download(
     repo_id: str,
     start_layer: Optional[int] = None,
@@ -77,6 +129,7 @@ def selective_model_download(
     cache_dir: Optional[str] = None,
     force_download: bool = False,
     local_files_only: bool = False,
+    on_weight_file_ready: Optional[Callable[[Path], None]] = None,
 ) -> Path:
     # Handle local model directory
     local_path = Path(repo_id)
@@ -117,31 +170,30 @@ def selective_model_download(
                 # Step 3: Download only the needed weight files
                 logger.info(f"Downloading {len(needed_weight_files)} weight files")
 
-                for weight_file in needed_weight_files:
-                    # Check if file already exists in local cache before downloading
-                    weight_file_path = model_path / weight_file
-                    if weight_file_path.exists():
-                        logger.debug(
-                            f"Weight file {weight_file} already exists locally, skipping download"
-                        )
-                        continue
-
-                    logger.debug(f"Downloading {weight_file}")
-                    try:
-                        hf_hub_download(
+                try:
+                    if local_files_only:
+                        for weight_file in needed_weight_files:
+                            hf_hub_download(
+                                repo_id=repo_id,
+                                filename=weight_file,
+                                cache_dir=cache_dir,
+                                local_files_only=True,
+                            )
+                    else:
+                        download_weight_files(
                             repo_id=repo_id,
-                            filename=weight_file,
-                            cache_dir=cache_dir,
+                            model_path=model_path,
+                            filenames=needed_weight_files,
                             force_download=force_download,
-                            local_files_only=local_files_only,
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to download {weight_file} for {repo_id}: {e}")
-                        logger.error(
-                            "This node cannot reach Hugging Face Hub to download weight files. "
-                            "Please check network connectivity or pre-download the model."
+                            on_file_ready=on_weight_file_ready,
                         )
-                        raise
+                except Exception as e:
+                    logger.error(f"Failed to download weight files for {repo_id}: {e}")
+                    logger.error(
+                        "This node cannot reach Hugging Face Hub to download weight files. "
+                        "Please check network connectivity or pre-download the model."
+                    )
+                    raise
 
                 logger.debug(f"Downloaded weight files for layers [{start_layer}, {end_layer})")
         else:
@@ -168,10 +220,12 @@ def get_model_path_with_selective_download(
     start_layer: Optional[int] = None,
     end_layer: Optional[int] = None,
     local_files_only: bool = False,
+    on_weight_file_ready: Optional[Callable[[Path], None]] = None,
 ) -> Path:
     return selective_model_download(
         repo_id=model_path_or_repo,
         start_layer=start_layer,
         end_layer=end_layer,
         local_files_only=local_files_only,
+        on_weight_file_ready=on_weight_file_ready,
     )
@@ -0,0 +1,239 @@
+"""
+Admission control: decides whether a request is routed now, retried later or rejected.
+
+Without it the scheduler routes every request until each pipeline reports
+`is_overloaded`, after which clients poll with fixed back-offs and latency collapses.
+`AdmissionController` instead compares the recent arrival rate with the cluster's
+service rate and sheds load *before* pipelines saturate:
+
+- Capacity: the cluster serves at most `slots` requests concurrently, the smallest sum
+  of `max_requests` over the active nodes hosting a layer. A request holds a slot for
+  about `expected_output_tokens` decode steps, one step being the sum of per-layer
+  latencies (live `avg_layer_latency_ms` when reported, the node's roofline estimate
+  otherwise), so by Little's law the service rate is `slots / service_time`.
+- Arrival rate: distinct requests received over the last `window_sec`; a client retrying
+  the same request doesn't count again.
+
+With utilization `rho = arrival_rate / service_rate`, a request is admitted while a slot
+is free, with probability `max_utilization / rho` once `rho` exceeds `max_utilization`.
+Otherwise it is delayed with a Retry-After hint equal to the expected wait for a slot, or
+rejected outright when the time it already waited plus that wait exceeds
+`max_queue_delay_s`. Either way the admitted load stays below capacity and no admitted
+request waited much longer than `max_queue_delay_s`.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Hashable, List, Literal, Optional, Tuple
+
+from parallax_utils.logging_config import get_logger
+from scheduling.node import Node
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ServiceCapacity:
+    """Concurrency and throughput the active nodes can sustain."""
+
+    # Requests the bottleneck layer can serve concurrently, and how many are free now
+    slots: int = 0
+    free_slots: int = 0
+    # Seconds a request holds its slot
+    service_time_s: float = float("inf")
+
+    @property
+    def service_rate(self) -> float:
+        """Requests per second the cluster completes when all slots are busy."""
+        if self.slots <= 0 or self.service_time_s <= 0 or self.service_time_s == float("inf"):
+            return 0.0
+        return self.slots / self.service_time_s
+
+
+@dataclass
+class AdmissionDecision:
+    """Outcome of `AdmissionController.decide`."""
+
+    action: Literal["admit", "delay", "reject"]
+    # Seconds the client should wait before retrying (delay / reject only)
+    retry_after_s: float = 0.0
+    # Estimated utilization (arrival rate / service rate) at decision time
+    utilization: float = 0.0
+
+    @property
+    def admitted(self) -> bool:
+        return self.action == "admit"
+
+
+def request_slots(nodes: List[Node], num_layers: int) -> Tuple[int, int]:
+    """
+    Concurrent requests the active nodes can serve, and how many of them are free now.
+
+    Both are bottlenecked by the weakest layer: the smallest sum over the active nodes
+    hosting a layer. (0, 0) while some layer has no active host.
+    """
+    if num_layers <= 0:
+        return 0, 0
+    # Per-layer sums via difference arrays, O(nodes + layers)
+    slots = [0] * (num_layers + 1)
+    free = [0] * (num_layers + 1)
+    for node in nodes:
+        if node.start_layer is None or node.end_layer is None or not node.is_active:
+            continue
+        max_requests = node.max_requests
+        for arr, value in (
+            (slots, max_requests),
+            (free, max(0, max_requests - node.current_requests)),
+        ):
+            arr[node.start_layer] += value
+            arr[node.end_layer] -= value
+
+    min_slots, min_free = None, None
+    run_slots, run_free = 0, 0
+    for layer in range(num_layers):
+        run_slots += slots[layer]
+        run_free += free[layer]
+        min_slots = run_slots if min_slots is None else min(min_slots, run_slots)
+        min_free = run_free if min_free is None else min(min_free, run_free)
+    return min_slots, min_free
+
+
+class AdmissionController:
+    """Arrival-rate-aware admission with load shedding and Retry-After hints."""
+
+    def __init__(
+        self,
+        *,
+        window_sec: float = 10.0,
+        history_sec: float = 600.0,
+        expected_output_tokens: int = 256,
+        max_utilization: float = 0.9,
+        max_queue_delay_s: float = 30.0,
+        min_retry_after_s: float = 0.5,
+        max_retry_after_s: float = 60.0,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        """
+        Args:
+            window_sec: Window over which the arrival rate is measured.
+            history_sec: How long arrival timestamps are kept.
+            expected_output_tokens: Decode steps a request is assumed to take.
+            max_utilization: Target utilization; arrivals beyond it are shed.
+            max_queue_delay_s: Longest expected wait a delayed request may get before
+                it is rejected instead.
+            min_retry_after_s: Lower bound of the Retry-After hint.
+            max_retry_after_s: Upper bound of the Retry-After hint.
+            rng: Random source of probabilistic shedding (for reproducible tests).
+        """
+        self.window_sec = window_sec
+        self.history_sec = max(history_sec, window_sec)
+        self.expected_output_tokens = expected_output_tokens
+        self.max_utilization = max_utilization
+        self.max_queue_delay_s = max_queue_delay_s
+        self.min_retry_after_s = min_retry_after_s
+        self.max_retry_after_s = max_retry_after_s
+        self._rng = rng or random.Random()
+        # (arrival time, request id) of distinct requests, and the ids among them
+        self._arrivals: Deque[Tuple[float, Optional[Hashable]]] = deque()
+        self._seen: Dict[Hashable, float] = {}
+        # Arrivals are recorded by the HTTP side and read by the dispatcher
+        self._lock = threading.Lock()
+
+    def record_arrival(
+        self, now: Optional[float] = None, request_id: Optional[Hashable] = None
+    ) -> None:
+        """Records a request arrival; retries of a known `request_id` are ignored."""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._arrivals and now - self._arrivals[0][0] > self.history_sec:
+                _, old_id = self._arrivals.popleft()
+                self._seen.pop(old_id, None)
+            if request_id is not None:
+                if request_id in self._seen:
+                    return
+                self._seen[request_id] = now
+            self._arrivals.append((now, request_id))
+
+    def arrival_rate(self, now: Optional[float] = None) -> float:
+        """Requests per second received over the last `window_sec`."""
+        now = time.time() if now is None else now
+        count = 0
+        with self._lock:
+            for ts, _ in reversed(self._arrivals):
+                if now - ts > self.window_sec:
+                    break
+                count += 1
+        return count / self.window_sec
+
+    def estimate_capacity(self, nodes: List[Node], num_layers: int) -> ServiceCapacity:
+        """Service capacity of the active nodes, bottlenecked by the weakest layer."""
+        if num_layers <= 0:
+            return ServiceCapacity()
+        latency = [0.0] * (num_layers + 1)
+        hosts = [0] * (num_layers + 1)
+        for node in nodes:
+            if node.start_layer is None or node.end_layer is None or not node.is_active:
+                continue
+            layer_ms = node.avg_layer_latency_ms
+            if layer_ms is None:
+                layer_ms = node.roofline_layer_latency_ms()
+            for arr, value in ((latency, layer_ms), (hosts, 1)):
+                arr[node.start_layer] += value
+                arr[node.end_layer] -= value
+
+        step_ms = 0.0
+        run_latency, run_hosts = 0.0, 0
+        for layer in range(num_layers):
+            run_latency += latency[layer]
+            run_hosts += hosts[layer]
+            if run_hosts == 0:
+                return ServiceCapacity()
+            # A step runs each layer on one of its hosts; use their mean latency
+            step_ms += run_latency / run_hosts
+        min_slots, min_free = request_slots(nodes, num_layers)
+        return ServiceCapacity(
+            slots=min_slots,
+            free_slots=min_free,
+            service_time_s=self.expected_output_tokens * step_ms / 1000.0,
+        )
+
+    def decide(
+        self,
+        nodes: List[Node],
+        num_layers: int,
+        queued: int = 0,
+        now: Optional[float] = None,
+        waited_s: float = 0.0,
+    ) -> AdmissionDecision:
+        """
+        Decides what to do with the next request.
+
+        Args:
+            nodes: All nodes of the cluster.
+            num_layers: Number of decoder layers of the model.
+            queued: Requests still waiting to be routed behind this one.
+            now: Current time, for tests.
+            waited_s: Time since the request was first received, including retries.
+        """
+        capacity = self.estimate_capacity(nodes, num_layers)
+        service_rate = capacity.service_rate
+        if service_rate <= 0.0:
+            # No full pipeline of active nodes to estimate from; leave it to the router
+            return AdmissionDecision("admit", utilization=float("inf"))
+
+        utilization = self.arrival_rate(now) / service_rate
+        if capacity.free_slots > 0:
+            if utilization <= self.max_utilization:
+                return AdmissionDecision("admit", utilization=utilization)
+            if self._rng.random() < self.max_utilization / utilization:
+                return AdmissionDecision("admit", utilization=utilization)
+
+        # Expected wait until enough slots free up for this request and those queued
+        wait_s = max(1, queued + 1 - capacity.free_slots) / service_rate
+        retry_after_s = min(self.max_retry_after_s, max(self.min_retry_after_s, wait_s))
+        if waited_s + wait_s > self.max_queue_delay_s:
+            return AdmissionDecision("reject", retry_after_s, utilization)
+        return AdmissionDecision("delay", retry_after_s, utilization)
@@ -0,0 +1,75 @@
+"""
+Heartbeat deadline tracking for the scheduler.
+
+`HeartbeatTracker` keeps a deadline heap with at most one entry per node, so finding
+expired nodes doesn't scan the fleet:
+
+- `refresh` records the heartbeat time in a dict, O(1). The node's heap entry is left
+  alone, so its deadline may be stale.
+- `expired` pops only the entries that are due. An entry whose node was refreshed in
+  the meantime is pushed back with its real deadline. This costs one heap operation
+  per node per `timeout` at most, however often the node sends heartbeats.
+- `next_deadline` tells the event loop how long it may sleep, so expirations fire when
+  due instead of at the next periodic scan.
+"""
+
+import heapq
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class HeartbeatTracker:
+    """Deadline heap of node heartbeats with O(1) refreshes."""
+
+    def __init__(self, timeout: float) -> None:
+        """
+        Args:
+            timeout: Seconds without a heartbeat after which a node expires.
+        """
+        self.timeout = timeout
+        self._last_seen: Dict[str, float] = {}
+        # (deadline, node_id); a node's deadline can be earlier than its real one
+        self._heap: List[Tuple[float, str]] = []
+        self._armed: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._last_seen
+
+    def refresh(self, node_id: str, now: Optional[float] = None) -> None:
+        """Records a heartbeat of `node_id`, starting to track it if needed."""
+        now = time.time() if now is None else now
+        self._last_seen[node_id] = now
+        if node_id not in self._armed:
+            self._armed.add(node_id)
+            heapq.heappush(self._heap, (now + self.timeout, node_id))
+
+    def remove(self, node_id: str) -> None:
+        """Stops tracking `node_id`; its heap entry is dropped when it comes due."""
+        self._last_seen.pop(node_id, None)
+
+    def next_deadline(self) -> Optional[float]:
+        """Earliest time a node may expire, or None if no node is tracked."""
+        return self._heap[0][0] if self._heap else None
+
+    def expired(self, now: Optional[float] = None) -> List[str]:
+        """Pops and returns the nodes whose last heartbeat is `timeout` old or more."""
+        now = time.time() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, node_id = heapq.heappop(self._heap)
+            last_seen = self._last_seen.get(node_id)
+            if last_seen is None:
+                self._armed.discard(node_id)
+                continue
+            deadline = last_seen + self.timeout
+            if deadline > now:
+                # Refreshed since this entry was pushed
+                heapq.heappush(self._heap, (deadline, node_id))
+                continue
+            self._armed.discard(node_id)
+            del self._last_seen[node_id]
+            expired.append(node_id)
+        return expired
@@ -18,8 +18,8 @@ embedding/LM head endpoints on the first/last nodes of a pipeline.
 """
 
 import heapq
+import time
 from dataclasses import dataclass, field
-from functools import lru_cache
 from math import floor
 from typing import Dict, List, Literal, Optional, Set, Tuple
 
@@ -131,6 +131,9 @@ class BaseLayerAllocator:
 
         # Node allocation
         self.node_allocation: Dict[str, Tuple[int, int]] = {}
+        # Monotonic version of the allocation; bumped on every allocate/deallocate/
+        # declare/leave so that routing caches can detect stale pipelines.
+        self.allocation_epoch: int = 0
 
         # Heapify Layer Loads
         self.layer_loads_heap: List[LayerLoad] = []
@@ -184,6 +187,7 @@ class BaseLayerAllocator:
                 raise ValueError(f"Layer {layer_id} not found in layer_to_load")
             self.layer_to_load[layer_id].add_node(node)
         self._update_layer_loads_heap()
+        self.allocation_epoch += 1
 
     def deallocate(self, node: Node) -> None:
         """Deallocate a node from its assigned layers."""
@@ -206,6 +210,7 @@ class BaseLayerAllocator:
         node.clear_layer_allocation()
         node.is_active = False
         self._update_layer_loads_heap()
+        self.allocation_epoch += 1
 
     def reallocate(self, node: Node, start_layer: int, end_layer: int) -> None:
         """Reallocate a node to a specific layer range."""
@@ -219,6 +224,7 @@ class BaseLayerAllocator:
             self.node_id_to_node[node.node_id] = node
         # Keep order deterministic without rebinding the list reference
         self.nodes.sort(key=lambda node: node.get_decoder_layer_capacity(), reverse=True)
+        self.allocation_epoch += 1
         logger.debug("Declared node %s (total declared: %d)", node.node_id, len(self.nodes))
 
     def join(self, node: Node) -> None:
@@ -255,6 +261,7 @@ class BaseLayerAllocator:
             if node.node_id == node_id:
                 self.nodes.remove(node)
                 break
+        self.allocation_epoch += 1
 
     def allocate_left_over_nodes(self) -> None:
         """Assign any nodes without allocations by treating them as dynamic joins.
@@ -767,6 +774,10 @@ class GreedyLayerAllocator(BaseLayerAllocator):
         return True
 
 
+class _SearchTimeout(Exception):
+    """Raised inside the DP search when its time budget is used up."""
+
+
 class DynamicProgrammingLayerAllocator(BaseLayerAllocator):
     """
     Dynamic programming based allocator that balances two objectives:
@@ -784,18 +795,24 @@ class DynamicProgrammingLayerAllocator(BaseLayerAllocator):
         s*(k): minimum total number of stages realizing k pipelines
 
     DP State:
-        dp(i, open_residuals, finshed_pipes) := min total stages needed using GPUs with index >= i;
+        dp(i, open_residuals, remaining_pipes) := min total stages needed using GPUs with index >= i;
         where:
             i: GPU index, in [0, N]
             open_residuals: sorted tuple of remaining layers for all open pipelines (values in 1..L-1)
-            finished_pipes: number of already fully closed pipelines
+            remaining_pipes: number of pipelines still to close (k_target - finished pipelines)
         Transitions (for node i with capacity c_i):
-            1. Skip node: dp(i + 1, open_residuals, finished_pipes)
+            1. Skip node: dp(i + 1, open_residuals, remaining_pipes)
             2. Assign to an existing open pipeline j:
-               r' = r_j - c_i. If r' <= 0, try closing with LM head; if still <= 0 -> close (remove j, finished+1),
-               else keep open with updated residual r'.
-            3. Start a new pipeline (if finished + len(open_residuals) < k_target):
-               r = L - c_i (with input embedding). If r <= 0, it closes immediately (finished+1), else append r.
+               r' = r_j - c_i. If r' <= 0, try closing with LM head; if still <= 0 -> close
+               (remove j, remaining-1), else keep open with updated residual r'.
+            3. Start a new pipeline (if len(open_residuals) < remaining_pipes):
+               r = L - c_i (with input embedding). If r <= 0, it closes immediately (remaining-1),
+               else append r.
+        The state doesn't depend on k_target, so one memo table serves every k:
+        s*(k) = dp(0, (), k).
+
+    With `time_budget_s` set, the search over k stops once the budget is used up and
+    the best k found so far is allocated.
 
     Finally:
         Compute objective Z(k) = (k**alpha) / (T_comp + (total_stages/k)*r_RTT)
@@ -811,6 +828,7 @@ class DynamicProgrammingLayerAllocator(BaseLayerAllocator):
         assign_left_over_nodes: bool = True,
         rebalance_threshold: float = 0.25,
         water_filling_max_iterations: int = 40,
+        time_budget_s: Optional[float] = None,
     ) -> None:
         super().__init__(
             model_info,
@@ -820,7 +838,9 @@ class DynamicProgrammingLayerAllocator(BaseLayerAllocator):
         )
         # Sort GPUs by layer capacity descending for stronger pruning
         self.alpha = alpha
-        self._path: Dict[Tuple[int, Tuple[int, ...], int], Tuple] = {}
+        # Search time limit of global_allocation; None searches every k
+        self.time_budget_s = time_budget_s
+        self._path: Dict[Tuple[int, ...], Tuple] = {}
 
     def global_allocation(self) -> bool:
         logger.debug(
@@ -847,111 +867,124 @@ class DynamicProgrammingLayerAllocator(BaseLayerAllocator):
                 num_layers,
                 total_cap,
             )
+        # Capacities don't change during the search; look them up instead of
+        # recomputing them in every DP state.
+        caps = [node.get_decoder_layer_capacity() for node in self.nodes]
+        close_caps = [node.get_decoder_layer_capacity(include_lm_head=True) for node in self.nodes]
+        start_caps = [
+            node.get_decoder_layer_capacity(include_input_embed=True) for node in self.nodes
+        ]
         # used for pruning
         suffix_sum = [0] * (num_nodes + 1)
         for i in range(num_nodes - 1, -1, -1):
-            suffix_sum[i] = suffix_sum[i + 1] + self.nodes[i].get_decoder_layer_capacity()
+            suffix_sum[i] = suffix_sum[i + 1] + caps[i]
 
+        inf = float("inf")
+        # Keyed by (i, remaining_pipes, *open_residuals); shared by all k targets
+        memo: Dict[Tuple[int, ...], float] = {}
+        path: Dict[Tuple[int, ...], Tuple] = {}
+        deadline = None if self.time_budget_s is None else time.monotonic() + self.time_budget_s
         max_num_pipes = min(num_nodes, total_cap // num_layers)
         best_num_pipes = 0
         best_score: float = float("-inf")
 
-        best_path: Dict[Tuple[int, Tuple[int, ...], int], Tuple] = {}
-        for k_target in range(1, max_num_pipes + 1):
-            path: Dict[Tuple[int, Tuple[int, ...], int], Tuple] = {}
-
-            @lru_cache(maxsize=None)
-            def dp(i: int, open_residuals: Tuple[int, ...], finished_pipes: int) -> int:
-                # Completed target with no open pipelines
-                if finished_pipes == k_target and len(open_residuals) == 0:
-                    path[(i, open_residuals, finished_pipes)] = ("done",)
-                    return 0
-                if i == num_nodes:
-                    return float("inf")
-
-                new_needed = k_target - finished_pipes - len(open_residuals)
-                need_open = sum(open_residuals)
-                remaining_cap = suffix_sum[i]
-
-                # Pruning
-                # 1. already have more (finished + open) than target;
-                # 2. remaining capacity is not enough to close ongoing pipelines
-                #    and unfulfilled new pipelines
-                # 3. remaining nodes are not enough to fulfill new pipelines
-                if (
-                    new_needed < 0
-                    or remaining_cap < need_open + max(0, new_needed) * num_layers
-                    or finished_pipes + len(open_residuals) + (num_nodes - i) < k_target
-                ):
-                    return float("inf")
-
-                # Option 1: Skip this node
-                best_cost = dp(i + 1, open_residuals, finished_pipes)
-                best_action: Tuple = ("skip",)
-
-                # Option 2: Assign to existing open pipeline
-                for j, rj in enumerate(open_residuals):
-                    c_norm = self.nodes[i].get_decoder_layer_capacity()
-                    r_after = rj - c_norm
+        def dp(i: int, open_residuals: Tuple[int, ...], remaining_pipes: int) -> float:
+            key = (i, remaining_pipes) + open_residuals
+            cost = memo.get(key)
+            if cost is not None:
+                return cost
+            # Only give up once there is an allocation to fall back to
+            if deadline is not None and best_num_pipes and time.monotonic() > deadline:
+                raise _SearchTimeout
+
+            # Completed target with no open pipelines
+            if remaining_pipes == 0 and len(open_residuals) == 0:
+                memo[key] = 0
+                path[key] = ("done",)
+                return 0
+            new_needed = remaining_pipes - len(open_residuals)
+            # Pruning
+            # 1. already have more (finished + open) than target;
+            # 2. remaining capacity is not enough to close ongoing pipelines
+            #    and unfulfilled new pipelines
+            # 3. remaining nodes are not enough to fulfill new pipelines
+            if (
+                i == num_nodes
+                or new_needed < 0
+                or suffix_sum[i] < sum(open_residuals) + new_needed * num_layers
+                or len(open_residuals) + (num_nodes - i) < remaining_pipes
+            ):
+                memo[key] = inf
+                return inf
+
+            # Option 1: Skip this node
+            best_cost = dp(i + 1, open_residuals, remaining_pipes)
+            best_action: Tuple = ("skip",)
+
+            # Option 2: Assign to existing open pipeline
+            for j, rj in enumerate(open_residuals):
+                if j > 0 and rj == open_residuals[j - 1]:
+                    # Same residual as the previous pipeline, same outcome
+                    continue
+                r_after = rj - caps[i]
+                if r_after <= 0:
+                    # try closing with LM head allowance
+                    r_after = rj - close_caps[i]
                     if r_after <= 0:
-                        # try closing with LM head allowance
-                        c_close = self.nodes[i].get_decoder_layer_capacity(include_lm_head=True)
-                        r_after_close = rj - c_close
-                        if r_after_close <= 0:
-                            new_open = list(open_residuals)
-                            new_open.pop(j)
-                            cost = 1 + dp(i + 1, tuple(new_open), finished_pipes + 1)
-                            if cost < best_cost:
-                                best_cost = cost
-                                best_action = ("assign", j, True)
-                        else:
-                            new_open = list(open_residuals)
-                            new_open[j] = r_after_close
-                            new_open.sort()
-                            cost = 1 + dp(i + 1, tuple(new_open), finished_pipes)
-                            if cost < best_cost:
-                                best_cost = cost
-                                best_action = ("assign", j, False)
-                    else:
-                        new_open = list(open_residuals)
-                        new_open[j] = r_after
-                        new_open.sort()
-                        cost = 1 + dp(i + 1, tuple(new_open), finished_pipes)
-                        if cost < best_cost:
-                            best_cost = cost
-                            best_action = ("assign", j, False)
-
-                # Option 3: start a new pipeline (if we still need more)
-                if new_needed > 0:
-                    c_start = self.nodes[i].get_decoder_layer_capacity(include_input_embed=True)
-                    r_new = num_layers - c_start
-                    if r_new <= 0:
-                        cost = 1 + dp(i + 1, open_residuals, finished_pipes + 1)
-                        if cost < best_cost:
-                            best_cost = cost
-                            best_action = ("start", 0, True)
-                    else:
-                        new_open = list(open_residuals) + [r_new]
-                        new_open.sort()
-                        cost = 1 + dp(i + 1, tuple(new_open), finished_pipes)
+                        new_open = open_residuals[:j] + open_residuals[j + 1 :]
+                        cost = 1 + dp(i + 1, new_open, remaining_pipes - 1)
                         if cost < best_cost:
                             best_cost = cost
-                            best_action = ("start", r_new, False)
+                            best_action = ("assign", j, True)
+                        continue
+                new_open = list(open_residuals)
+                new_open[j] = r_after
+                new_open.sort()
+                cost = 1 + dp(i + 1, tuple(new_open), remaining_pipes)
+                if cost < best_cost:
+                    best_cost = cost
+                    best_action = ("assign", j, False)
+
+            # Option 3: start a new pipeline (if we still need more)
+            if new_needed > 0:
+                r_new = num_layers - start_caps[i]
+                if r_new <= 0:
+                    cost = 1 + dp(i + 1, open_residuals, remaining_pipes - 1)
+                    if cost < best_cost:
+                        best_cost = cost
+                        best_action = ("start", 0, True)
+                else:
+                    new_open = list(open_residuals) + [r_new]
+                    new_open.sort()
+                    cost = 1 + dp(i + 1, tuple(new_open), remaining_pipes)
+                    if cost < best_cost:
+                        best_cost = cost
+                        best_action = ("start", r_new, False)
 
-                path[(i, open_residuals, finished_pipes)] = best_action
-                return best_cost
+            memo[key] = best_cost
+            path[key] = best_action
+            return best_cost
 
-            s_star = dp(0, tuple(), 0)
-            if s_star < float("inf"):
+        for k_target in range(1, max_num_pipes + 1):
+            try:
+                s_star = dp(0, tuple(), k_target)
+            except _SearchTimeout:
+                logger.warning(
+                    "[DP] Time budget of %.2fs exhausted at k=%d; using best k=%d found so far",
+                    self.time_budget_s,
+                    k_target,
+                    best_num_pipes,
+                )
+                break
+            if s_star < inf:
                 score = (k_target * k_target) / s_star  # Z(k) = k^2 / s*(k)
                 if score > best_score:
                     best_score, best_num_pipes = score, k_target
-                    best_path = dict(path)
 
         if best_num_pipes is None or best_num_pipes == 0:
             logger.debug("[DP] Could not find a feasible number of pipelines")
             return False
-        self._path = best_path
+        self._path = path
         pipelines = self._backtrack(best_num_pipes, num_nodes)
 
         # Assign layers for each pipeline via in-place rebalancing
@@ -980,7 +1013,7 @@ class DynamicProgrammingLayerAllocator(BaseLayerAllocator):
         finished = 0
         while i < num_nodes and finished < best_num_pipes:
             open_tuple = tuple(sorted(r for r, _ in open_list))
-            action = self._path.get((i, open_tuple, finished))
+            action = self._path.get((i, best_num_pipes - finished) + open_tuple)
             if action is None:
                 break
             kind = action[0]
@@ -5,17 +5,24 @@ Scheduling primitives for distributed LLM inference.
 - `RequestSignal`: minimal request envelope (id, received timestamp)
 - `RooflinePerformanceModel`: compute/IO roofline estimator with configurable
   sequence/batch shape
+- `NodeCapacityModel`: memoized per-node derived quantities (max batch size, KV
+  tokens, roofline per-layer latency, decoder-layer capacity)
 - `Node`: worker serving state; manages layer allocation, capacity helpers,
   latency tracking, and RTT cache for network-aware request routing
 """
 
 import time
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from math import floor
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from parallax_utils.logging_config import get_logger
-from parallax_utils.utils import bytes_per_element, compute_max_batch_size
+from parallax_utils.utils import (
+    bytes_per_element,
+    compute_max_batch_size,
+    compute_max_tokens_in_cache,
+)
 from scheduling.model_info import ModelInfo
 
 logger = get_logger(__name__)
@@ -48,11 +55,30 @@ class RequestSignal:
     - received_ts: UNIX timestamp (seconds) when the request was received
     - routing_table: Set by the scheduler when a path is assigned. Semantics:
         None -> not assigned yet; [] -> all pipelines full at the moment; [..] -> route
+    - routing_future: Completion channel resolved with `routing_table` by the
+        scheduler. Waiters block on (or `asyncio.wrap_future`) it instead of polling;
+        cancelling it before dispatch makes the scheduler drop the request.
+    - retry_after_s: Set with an empty routing table when admission control held the
+        request back; seconds the client should wait before retrying.
+    - rejected: True if admission control rejected the request instead of delaying it.
     """
 
     request_id: str
     received_ts: float = field(default_factory=time.time)
     routing_table: Optional[List[str]] = None
+    routing_future: "Future[List[str]]" = field(default_factory=Future, repr=False, compare=False)
+    retry_after_s: Optional[float] = None
+    rejected: bool = False
+
+    def claim(self) -> bool:
+        """Mark the request as being routed; False if the waiter already gave up."""
+        return self.routing_future.set_running_or_notify_cancel()
+
+    def set_routing_table(self, routing_table: List[str]) -> None:
+        """Record the assigned path and wake up any waiter."""
+        self.routing_table = routing_table
+        if not self.routing_future.done():
+            self.routing_future.set_result(routing_table)
 
 
 class RooflinePerformanceModel:
@@ -158,6 +184,177 @@ class RooflinePerformanceModel:
         ) / num_current_layers
 
 
+class NodeCapacityModel:
+    """
+    Memoized capacity model for a single `Node`.
+
+    Derived quantities (max batch size, KV token budget, roofline per-layer
+    latency and decoder-layer parameter capacity) are pure functions of the
+    node's hardware, layer range, model and memory knobs, but were recomputed on
+    every access in the routing hot path. This model caches them under a key of
+    those inputs and drops the cache only when the key changes. Roofline
+    estimates are additionally cached per batch size (= current request count).
+    """
+
+    def __init__(self, node: "Node") -> None:
+        self._node = node
+        self._key: Optional[Tuple] = None
+        self._max_batch_size: Optional[int] = None
+        self._max_kv_tokens: Optional[int] = None
+        self._roofline_ms: Dict[int, float] = {}
+        self._layer_capacity: Dict[Tuple[bool, bool], int] = {}
+
+    def _cache_key(self) -> Tuple:
+        node = self._node
+        hw = node.hardware
+        return (
+            hw.num_gpus,
+            hw.tflops_fp16,
+            hw.memory_gb,
+            hw.memory_bandwidth_gbps,
+            hw.device,
+            # ModelInfo is treated as immutable once constructed
+            id(node.model_info),
+            node.start_layer,
+            node.end_layer,
+            node.kvcache_mem_ratio,
+            node.param_mem_ratio,
+            node.max_concurrent_requests,
+            node.max_sequence_length,
+        )
+
+    def _validate(self) -> None:
+        key = self._cache_key()
+        if key != self._key:
+            self._key = key
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """Drop all cached quantities."""
+        self._max_batch_size = None
+        self._max_kv_tokens = None
+        self._roofline_ms.clear()
+        self._layer_capacity.clear()
+
+    def _elem_bytes(self) -> int:
+        try:
+            return bytes_per_element(
+                getattr(self._node.model_info, "cache_bytes_per_element", None)
+            )
+        except Exception:
+            return 2
+
+    def max_batch_size(self) -> int:
+        """KV-bounded max concurrent requests for the current layer range."""
+        self._validate()
+        if self._max_batch_size is None:
+            node = self._node
+            model_info = node.model_info
+            derived_max = compute_max_batch_size(
+                requested_max_batch_size=node.max_concurrent_requests,
+                max_sequence_len=node.max_sequence_length,
+                device=None,
+                kv_cache_memory_fraction=node.kvcache_mem_ratio,
+                num_shard_layers=node.num_current_layers,
+                num_key_value_heads=model_info.num_kv_heads,
+                head_dim=model_info.head_size,
+                elem_bytes=self._elem_bytes(),
+                memory_gb=node.hardware.memory_gb,
+                head_dim_k=model_info.head_size_k,
+                head_dim_v=model_info.head_size_v,
+            )
+            if derived_max <= 0:
+                raise ValueError(
+                    f"Node {node.node_id} has invalid max concurrent requests: {derived_max}"
+                )
+            self._max_batch_size = derived_max
+        return self._max_batch_size
+
+    def max_kv_tokens(self) -> int:
+        """Number of tokens the KV budget can hold for the current layer range."""
+        self._validate()
+        if self._max_kv_tokens is None:
+            node = self._node
+            if node.num_current_layers == 0:
+                return 0
+            model_info = node.model_info
+            self._max_kv_tokens = compute_max_tokens_in_cache(
+                device="",
+                kv_cache_memory_fraction=node.kvcache_mem_ratio,
+                num_shard_layers=node.num_current_layers,
+                num_key_value_heads=model_info.num_kv_heads,
+                head_dim_k=model_info.head_size_k,
+                head_dim_v=model_info.head_size_v,
+                elem_bytes=self._elem_bytes(),
+                available_cache_bytes=int(
+                    node.hardware.memory_gb * 1024**3 * node.kvcache_mem_ratio
+                ),
+            )
+        return self._max_kv_tokens
+
+    def roofline_layer_latency_ms(self, batch_size: int) -> float:
+        """Roofline per-layer latency estimate for `batch_size` concurrent requests."""
+        self._validate()
+        cached = self._roofline_ms.get(batch_size)
+        if cached is not None:
+            return cached
+        node = self._node
+        # Compute an effective compute speedup due to quantization.
+        bytes_per_elem = float(node.model_info.param_bytes_per_element)
+        # bf16/fp16 baseline ~2 bytes
+        base = 1.0 if bytes_per_elem <= 0 else 2.0 / bytes_per_elem
+        # Empirical efficiency factor: int8 often achieves ~80% of theoretical 2x
+        efficiency = 0.8 if bytes_per_elem < 2.0 else 1.0
+        quantization_speedup = max(0.1, base * efficiency)
+        perf_model = RooflinePerformanceModel(
+            hardware=node.hardware,
+            model_info=node.model_info,
+            quantization_speedup=quantization_speedup,
+            batch_size=batch_size,
+            target_seq_len=1,
+            source_seq_len=node.max_sequence_length,
+            using_mlx=node.hardware.device == "mlx",
+        )
+        latency = perf_model.roofline_layer_latency_ms(
+            include_input_embed=node.has_embedding,
+            include_lm_head=node.has_lm_head,
+            num_current_layers=node.num_current_layers,
+        )
+        self._roofline_ms[batch_size] = latency
+        return latency
+
+    def decoder_layer_capacity(self, include_input_embed: bool, include_lm_head: bool) -> int:
+        """Number of decoder layers the parameter budget can hold."""
+        self._validate()
+        flags = (include_input_embed, include_lm_head)
+        cached = self._layer_capacity.get(flags)
+        if cached is not None:
+            return cached
+        node = self._node
+        model_info = node.model_info
+        available_memory_bytes = floor(
+            node.hardware.num_gpus
+            * node.hardware.memory_gb
+            * 1024
+            * 1024
+            * 1024
+            * node.param_mem_ratio
+        )
+        if include_input_embed:
+            available_memory_bytes -= model_info.embedding_io_bytes
+        if include_lm_head:
+            if not (include_input_embed and model_info.tie_embedding):
+                available_memory_bytes -= model_info.embedding_io_bytes
+
+        layer_bytes = model_info.decoder_layer_io_bytes(roofline=False)
+        if node.hardware.device == "mlx":
+            # For mlx, consider mlx bit factor
+            layer_bytes *= model_info.mlx_bit_factor
+        capacity = floor(available_memory_bytes / layer_bytes)
+        self._layer_capacity[flags] = capacity
+        return capacity
+
+
 @dataclass
 class Node:
     """
@@ -196,12 +393,21 @@ class Node:
     rtt_to_nodes: Optional[Dict[str, float]] = None
 
     _force_max_concurrent_requests: bool = False
+    _capacity_model: Optional[NodeCapacityModel] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def __post_init__(self):
         if self.last_heartbeat == 0.0:
             self.last_heartbeat = time.time()
         if self.rtt_to_nodes is None:
             self.rtt_to_nodes = {}
+        self._capacity_model = NodeCapacityModel(self)
+
+    @property
+    def capacity_model(self) -> NodeCapacityModel:
+        """Memoized capacity model for this node."""
+        return self._capacity_model
 
     @property
     def max_requests(self) -> int:
@@ -211,34 +417,17 @@ class Node:
 
         if self.start_layer is None or self.end_layer is None:
             return self.max_concurrent_requests
-        try:
-            elem_bytes = bytes_per_element(
-                getattr(self.model_info, "cache_bytes_per_element", None)
-            )
-        except Exception:
-            elem_bytes = 2
-        derived_max = compute_max_batch_size(
-            requested_max_batch_size=self.max_concurrent_requests,
-            max_sequence_len=self.max_sequence_length,
-            device=None,
-            kv_cache_memory_fraction=self.kvcache_mem_ratio,
-            num_shard_layers=self.num_current_layers,
-            num_key_value_heads=self.model_info.num_kv_heads,
-            head_dim=self.model_info.head_size,
-            elem_bytes=elem_bytes,
-            memory_gb=self.hardware.memory_gb,
-            head_dim_k=self.model_info.head_size_k,
-            head_dim_v=self.model_info.head_size_v,
-        )
-        if derived_max <= 0:
-            raise ValueError(
-                f"Node {self.node_id} has invalid max concurrent requests: {derived_max}"
-            )
+        derived_max = self._capacity_model.max_batch_size()
         if self.max_concurrent_requests is None:
             return derived_max
         else:
             return min(self.max_concurrent_requests, derived_max)
 
+    @property
+    def max_kv_tokens(self) -> int:
+        """Tokens storable in the KV budget for the current layer range (0 if unallocated)."""
+        return self._capacity_model.max_kv_tokens()
+
     @property
     def num_current_layers(self) -> int:
         """Number of currently allocated layers."""
@@ -272,33 +461,7 @@ class Node:
 
         Capacity is measured using the parameter memory budget on the device.
         """
-        available_memory_bytes = floor(
-            self.hardware.num_gpus
-            * self.hardware.memory_gb
-            * 1024
-            * 1024
-            * 1024
-            * self.param_mem_ratio
-        )
-        if include_input_embed:
-            available_memory_bytes -= self.model_info.embedding_io_bytes
-        if include_lm_head:
-            if not (include_input_embed and self.model_info.tie_embedding):
-                available_memory_bytes -= self.model_info.embedding_io_bytes
-
-        if self.hardware.device == "mlx":
-            # For mlx, consider mlx bit factor
-            return floor(
-                available_memory_bytes
-                / (
-                    self.model_info.decoder_layer_io_bytes(roofline=False)
-                    * self.model_info.mlx_bit_factor
-                )
-            )
-        else:
-            return floor(
-                available_memory_bytes / self.model_info.decoder_layer_io_bytes(roofline=False)
-            )
+        return self._capacity_model.decoder_layer_capacity(include_input_embed, include_lm_head)
 
     @property
     def per_decoder_layer_kv_cache_memory(self) -> Optional[int]:
@@ -333,27 +496,7 @@ class Node:
 
     def roofline_layer_latency_ms(self) -> float:
         """Get the roofline layer latency for this node."""
-        # Compute an effective compute speedup due to quantization.
-        bytes_per_elem = float(self.model_info.param_bytes_per_element)
-        # bf16/fp16 baseline ~2 bytes
-        base = 1.0 if bytes_per_elem <= 0 else 2.0 / bytes_per_elem
-        # Empirical efficiency factor: int8 often achieves ~80% of theoretical 2x
-        efficiency = 0.8 if bytes_per_elem < 2.0 else 1.0
-        quantization_speedup = max(0.1, base * efficiency)
-        perf_model = RooflinePerformanceModel(
-            hardware=self.hardware,
-            model_info=self.model_info,
-            quantization_speedup=quantization_speedup,
-            batch_size=self.current_requests,
-            target_seq_len=1,
-            source_seq_len=self.max_sequence_length,
-            using_mlx=self.hardware.device == "mlx",
-        )
-        return perf_model.roofline_layer_latency_ms(
-            include_input_embed=self.has_embedding,
-            include_lm_head=self.has_lm_head,
-            num_current_layers=self.num_current_layers,
-        )
+        return self._capacity_model.roofline_layer_latency_ms(self.current_requests)
 
     @property
     def layer_latency_ms(self) -> float:
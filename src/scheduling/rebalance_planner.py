@@ -0,0 +1,274 @@
+"""
+Incremental rebalancing: move a cluster from its current layer allocation to a new one
+while reloading as little as possible.
+
+A global allocation (`GreedyLayerAllocator` / `DynamicProgrammingLayerAllocator`) only
+fixes *which ranges* the cluster should host and roughly which kind of node hosts each.
+Nodes with the same hardware and memory budget are interchangeable, so the planner
+re-matches every target range to one of the equivalent nodes, preferring the node that
+already holds most of its layers:
+
+    cost(node, range) = layers of `range` the node doesn't hold * layer bytes / bandwidth
+
+i.e. the estimated reload time, minimized per group of equivalent nodes with a min-cost
+assignment. Nodes whose range is unchanged are not touched at all.
+
+The remaining moves run in stages. A node reloading its shard can't serve, so each
+stage only moves nodes whose absence still leaves a full pipeline among the nodes that
+keep serving (with their old ranges, or their new ones once an earlier stage finished).
+Only when no node can move without breaking the last pipeline (e.g. the cluster already
+has none) do the rest move together.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from parallax_utils.logging_config import get_logger
+from scheduling.node import Node
+
+logger = get_logger(__name__)
+
+LayerRange = Optional[Tuple[int, int]]
+
+# Added to the cost of every changed range, so ties don't move nodes for nothing
+_CHANGE_PENALTY = 1e-9
+
+
+@dataclass
+class LayerMove:
+    """Moves one node from `source` to `target` (None: not allocated)."""
+
+    node_id: str
+    source: LayerRange
+    target: LayerRange
+    # Estimated seconds to load the layers of `target` the node doesn't hold yet
+    cost: float = 0.0
+
+    @property
+    def layers_to_load(self) -> int:
+        return _layers_to_load(self.source, self.target)
+
+
+@dataclass
+class RebalancePlan:
+    """Moves grouped into stages; a stage starts once the previous one finished loading."""
+
+    stages: List[List[LayerMove]] = field(default_factory=list)
+    # Final allocation of every node
+    target: Dict[str, LayerRange] = field(default_factory=dict)
+
+    @property
+    def moves(self) -> List[LayerMove]:
+        return [move for stage in self.stages for move in stage]
+
+    @property
+    def layers_to_load(self) -> int:
+        return sum(move.layers_to_load for move in self.moves)
+
+    @property
+    def cost(self) -> float:
+        return sum(move.cost for move in self.moves)
+
+
+def _layers_to_load(source: LayerRange, target: LayerRange) -> int:
+    if target is None:
+        return 0
+    if source is None:
+        return target[1] - target[0]
+    overlap = max(0, min(source[1], target[1]) - max(source[0], target[0]))
+    return target[1] - target[0] - overlap
+
+
+def has_full_pipeline(ranges: Iterable[Tuple[int, int]], num_layers: int) -> bool:
+    """Whether contiguous ranges chain from layer 0 to `num_layers`."""
+    ends_by_start: Dict[int, List[int]] = {}
+    for start, end in ranges:
+        ends_by_start.setdefault(start, []).append(end)
+    reached, frontier = {0}, [0]
+    while frontier:
+        layer = frontier.pop()
+        if layer == num_layers:
+            return True
+        for end in ends_by_start.get(layer, []):
+            if end > layer and end not in reached:
+                reached.add(end)
+                frontier.append(end)
+    return False
+
+
+def _equivalence_key(node: Node) -> Tuple:
+    """Nodes with equal keys can host each other's layer ranges."""
+    hw = node.hardware
+    return (
+        hw.device,
+        hw.num_gpus,
+        hw.tflops_fp16,
+        hw.memory_gb,
+        hw.memory_bandwidth_gbps,
+        node.get_decoder_layer_capacity(),
+        node.get_decoder_layer_capacity(include_input_embed=True),
+        node.get_decoder_layer_capacity(include_lm_head=True),
+    )
+
+
+def _min_cost_assignment(cost: List[List[float]]) -> List[int]:
+    """
+    Hungarian algorithm for a square cost matrix, O(n^3).
+
+    Returns `assignment` where row i is matched to column assignment[i].
+    """
+    n = len(cost)
+    inf = float("inf")
+    # 1-indexed potentials; match[j] is the row matched to column j
+    u, v = [0.0] * (n + 1), [0.0] * (n + 1)
+    match, way = [0] * (n + 1), [0] * (n + 1)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_v = [inf] * (n + 1)
+        used = [False] * (n + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = match[j0], inf, 0
+            row = cost[i0 - 1]
+            for j in range(1, n + 1):
+                if not used[j]:
+                    reduced = row[j - 1] - u[i0] - v[j]
+                    if reduced < min_v[j]:
+                        min_v[j], way[j] = reduced, j0
+                    if min_v[j] < delta:
+                        delta, j1 = min_v[j], j
+            for j in range(n + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    assignment = [0] * n
+    for j in range(1, n + 1):
+        assignment[match[j] - 1] = j - 1
+    return assignment
+
+
+class RebalancePlanner:
+    """Plans a minimum-movement, staged transition between two layer allocations."""
+
+    def __init__(self, num_layers: int):
+        self.num_layers = num_layers
+
+    @staticmethod
+    def reload_cost(node: Node, source: LayerRange, target: LayerRange) -> float:
+        """Estimated seconds for `node` to load the layers of `target` it doesn't hold."""
+        num_layers = _layers_to_load(source, target)
+        if num_layers == 0:
+            return 0.0
+        layer_bytes = node.model_info.decoder_layer_io_bytes(roofline=False)
+        bandwidth = node.hardware.memory_bandwidth_gbps * node.hardware.num_gpus * 1024**3
+        return num_layers * layer_bytes / bandwidth
+
+    def match_targets(
+        self,
+        nodes: List[Node],
+        current: Dict[str, LayerRange],
+        target: Dict[str, LayerRange],
+    ) -> Dict[str, LayerRange]:
+        """Reassigns target ranges among equivalent nodes to minimize the reload cost."""
+        groups: Dict[Tuple, List[Node]] = {}
+        for node in nodes:
+            groups.setdefault(_equivalence_key(node), []).append(node)
+
+        matched: Dict[str, LayerRange] = {}
+        for group in groups.values():
+            if len(group) == 1:
+                matched[group[0].node_id] = target.get(group[0].node_id)
+                continue
+            # Unallocated targets stay in the pool as None, so the matrix is square
+            ranges = [target.get(node.node_id) for node in group]
+            # Ties (e.g. dropping a range vs. keeping it) go to leaving a node unchanged
+            cost = [
+                [
+                    self.reload_cost(node, current.get(node.node_id), r)
+                    + (0.0 if r == current.get(node.node_id) else _CHANGE_PENALTY)
+                    for r in ranges
+                ]
+                for node in group
+            ]
+            for node, column in zip(group, _min_cost_assignment(cost)):
+                matched[node.node_id] = ranges[column]
+        return matched
+
+    def plan(
+        self,
+        nodes: List[Node],
+        current: Dict[str, LayerRange],
+        target: Dict[str, LayerRange],
+        serving: Optional[Iterable[str]] = None,
+    ) -> RebalancePlan:
+        """
+        Plans the transition from `current` to (an equivalent of) `target`.
+
+        Args:
+            nodes: All nodes of the cluster.
+            current: Current range of each node; missing or None means unallocated.
+            target: Range of each node in the new allocation.
+            serving: Nodes currently able to serve their range; all allocated nodes
+                if None. Nodes still loading don't count towards a full pipeline.
+        """
+        node_by_id = {node.node_id: node for node in nodes}
+        matched = self.match_targets(nodes, current, target)
+        pending = [
+            LayerMove(
+                node_id=node_id,
+                source=current.get(node_id),
+                target=new_range,
+                cost=self.reload_cost(node_by_id[node_id], current.get(node_id), new_range),
+            )
+            for node_id, new_range in matched.items()
+            if current.get(node_id) != new_range
+        ]
+        # Idle nodes first (moving them costs no serving capacity), then cheapest first
+        pending.sort(key=lambda move: (move.source is not None, move.cost, move.node_id))
+
+        serving_ids = set(node_by_id) if serving is None else set(serving)
+        state = {
+            node_id: current.get(node_id)
+            for node_id in node_by_id
+            if node_id in serving_ids and current.get(node_id) is not None
+        }
+        plan = RebalancePlan(target=matched)
+        while pending:
+            available = dict(state)
+            stage = []
+            for move in pending:
+                remaining = [r for node_id, r in available.items() if node_id != move.node_id]
+                if has_full_pipeline(remaining, self.num_layers):
+                    available.pop(move.node_id, None)
+                    stage.append(move)
+            if not stage:
+                # Every pipeline would break anyway; move everything at once
+                stage = pending
+            for move in stage:
+                if move.target is None:
+                    state.pop(move.node_id, None)
+                else:
+                    state[move.node_id] = move.target
+            moved = {move.node_id for move in stage}
+            pending = [move for move in pending if move.node_id not in moved]
+            plan.stages.append(stage)
+
+        logger.debug(
+            "Rebalance plan: %d of %d nodes move in %d stages, %d layers to load (%.2fs)",
+            len(plan.moves),
+            len(nodes),
+            len(plan.stages),
+            plan.layers_to_load,
+            plan.cost,
+        )
+        return plan
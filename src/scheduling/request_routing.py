@@ -3,8 +3,11 @@ Phase 2: Request routing.
 
 Provides:
 - A base strategy interface.
+- A NumPy-backed layer-level routing table that is updated incrementally as node
+  latencies and RTTs change.
 - A dynamic-programming router that minimizes end-to-end latency across nodes.
-- A round-robin router that uses round-robin over complete pipelines.
+- A round-robin router that uses round-robin over complete pipelines, backed by
+  a pipeline registry versioned on the allocator's allocation epoch.
 
 Routing is at node granularity: once a request enters a node, it runs all layers
 hosted by that node. We can optionally compute layer-level turning points for a
@@ -13,7 +16,9 @@ final node path and total latency.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
 
 from parallax_utils.logging_config import get_logger
 from scheduling.node import Node
@@ -40,84 +45,168 @@ class RequestRoutingStrategy(ABC):
     def find_optimal_path(self, nodes: List[Node], num_layers: int) -> Tuple[List[str], float]:
         """Shard-level DP path across nodes. Returns (node_ids, latency)."""
 
+    def notify_node_update(self, node: Node) -> None:
+        """Hook called when a node's load, latency or RTTs change. No-op by default."""
 
-class DynamicProgrammingRouting(RequestRoutingStrategy):
-    """
-    Dynamic-programming router.
 
-    - Warm-up: run a layer-level DP to identify turning points (where the optimal
-      path switches nodes even if the current node still hosts the next layer).
-    - Routing: run a shard-level DP over node assignments (contiguous layer ranges),
-      using per-node execution latency and RTT via `Node.get_rtt_to`, to obtain a
-      minimum-latency node sequence and total latency.
+class LayerRoutingTable:
     """
+    Layer-level routing DP kept as NumPy arrays and updated incrementally.
 
-    @staticmethod
-    def find_turning_points(nodes: List[Node], num_layers: int) -> List[Tuple[str, int, str]]:
-        """Find shard truncation points via layer-level DP.
+    DP state is (layer l, node i that hosts l):
+        cost[l, i] = min_j (cost[l - 1, j] + rtt[j, i]) + latency[i]
+    with rtt[i, i] = 0 and cost = inf for nodes not hosting l.
 
-        DP state is (layer l, node i that hosts l). Node cost uses the node's
-        per-layer latency proxy; edge cost uses RTT between nodes.
+    The table caches per-node latencies, the RTT matrix and the DP/backpointer
+    arrays. Changing a node's latency or RTT only invalidates DP rows from the
+    first layer that node hosts, and those rows are recomputed lazily on the next
+    query. When nothing changed, a query is a lookup on the last row plus a
+    backtrack. Any change of node membership or layer ranges triggers a rebuild.
+    """
 
-        This is a static method that can be called directly without creating an instance:
-        DynamicProgrammingRouting.find_turning_points(nodes, num_layers)
+    def __init__(self) -> None:
+        self.num_layers: int = 0
+        self._topology: Tuple[Tuple[str, Optional[int], Optional[int]], ...] = ()
+        self._nodes: List[Node] = []
+        self._node_index: Dict[str, int] = {}
+        # (L, H) hosting mask and per-layer host indices
+        self._host_mask: np.ndarray = np.zeros((0, 0), dtype=bool)
+        self._layer_hosts: List[np.ndarray] = []
+        # (H,) per-node latency and (H, H) RTT matrix
+        self._latency: np.ndarray = np.zeros(0)
+        self._rtt: np.ndarray = np.zeros((0, 0))
+        # (L, H) DP costs and backpointers
+        self._cost: np.ndarray = np.zeros((0, 0))
+        self._back: np.ndarray = np.zeros((0, 0), dtype=np.int32)
+        # First DP row that needs recomputation; num_layers means clean
+        self._dirty_from: int = 0
+
+    @staticmethod
+    def _latency_of(node: Node) -> float:
+        """Per-layer latency proxy; unallocated nodes never host a layer."""
+        if node.start_layer is None or node.end_layer is None:
+            return float("inf")
+        return float(node.layer_latency_ms)
 
-        It can also be called via an instance, which will work due to Python's method resolution.
+    @staticmethod
+    def _topology_of(nodes: List[Node]) -> Tuple[Tuple[str, Optional[int], Optional[int]], ...]:
+        return tuple((n.node_id, n.start_layer, n.end_layer) for n in nodes)
+
+    def rebuild(self, nodes: List[Node], num_layers: int) -> None:
+        """Rebuild all arrays from scratch for the given nodes and layer count."""
+        num_hosts = len(nodes)
+        self.num_layers = num_layers
+        self._topology = self._topology_of(nodes)
+        self._nodes = list(nodes)
+        self._node_index = {n.node_id: i for i, n in enumerate(self._nodes)}
+
+        self._host_mask = np.zeros((num_layers, num_hosts), dtype=bool)
+        for i, n in enumerate(self._nodes):
+            if n.start_layer is None or n.end_layer is None:
+                continue
+            self._host_mask[max(0, n.start_layer) : min(num_layers, n.end_layer), i] = True
+        self._layer_hosts = [np.flatnonzero(self._host_mask[l]) for l in range(num_layers)]
+
+        self._latency = np.array([self._latency_of(n) for n in self._nodes], dtype=np.float64)
+        self._rtt = np.full((num_hosts, num_hosts), np.inf, dtype=np.float64)
+        for i in range(num_hosts):
+            self._fill_rtt(i)
+
+        self._cost = np.full((num_layers, num_hosts), np.inf, dtype=np.float64)
+        self._back = np.full((num_layers, num_hosts), -1, dtype=np.int32)
+        self._dirty_from = 0
+
+    def _fill_rtt(self, i: int) -> None:
+        """Refresh row and column `i` of the RTT matrix from the nodes' RTT caches."""
+        node_i = self._nodes[i]
+        row = node_i.rtt_to_nodes or {}
+        for j, node_j in enumerate(self._nodes):
+            if i == j:
+                self._rtt[i, i] = 0.0
+                continue
+            self._rtt[i, j] = row.get(node_j.node_id, np.inf)
+            col = node_j.rtt_to_nodes or {}
+            self._rtt[j, i] = col.get(node_i.node_id, np.inf)
+
+    def _mark_dirty(self, i: int) -> None:
+        start = self._nodes[i].start_layer
+        if start is None:
+            return
+        self._dirty_from = min(self._dirty_from, max(0, start))
+
+    def update_node(self, node: Node) -> None:
+        """Refresh one node's latency and RTT row/column; no-op for unknown nodes."""
+        i = self._node_index.get(node.node_id)
+        if i is None:
+            return
+        self._latency[i] = self._latency_of(node)
+        self._fill_rtt(i)
+        self._mark_dirty(i)
+
+    def sync(self, nodes: List[Node], num_layers: int) -> None:
+        """Bring the table in line with `nodes`.
+
+        Rebuilds if membership or layer ranges changed; otherwise re-reads each
+        node's latency and invalidates DP rows only for nodes whose latency moved.
+        RTT changes are picked up through `update_node`.
         """
-        if num_layers <= 0 or not nodes:
+        if num_layers != self.num_layers or self._topology_of(nodes) != self._topology:
+            self.rebuild(nodes, num_layers)
+            return
+        for i, n in enumerate(self._nodes):
+            latency = self._latency_of(n)
+            if latency != self._latency[i]:
+                self._latency[i] = latency
+                self._mark_dirty(i)
+
+    def _recompute(self) -> None:
+        """Recompute DP rows from the first dirty layer onward."""
+        start = self._dirty_from
+        if start >= self.num_layers:
+            return
+        if start == 0:
+            hosts = self._layer_hosts[0]
+            self._cost[0].fill(np.inf)
+            self._back[0].fill(-1)
+            self._cost[0, hosts] = self._latency[hosts]
+            start = 1
+        for l in range(start, self.num_layers):
+            prev_hosts = self._layer_hosts[l - 1]
+            hosts = self._layer_hosts[l]
+            row_cost = self._cost[l]
+            row_back = self._back[l]
+            row_cost.fill(np.inf)
+            row_back.fill(-1)
+            if len(prev_hosts) == 0 or len(hosts) == 0:
+                continue
+            # (|prev|, |hosts|) candidate costs of arriving at each host of layer l
+            cand = self._cost[l - 1, prev_hosts][:, None] + self._rtt[np.ix_(prev_hosts, hosts)]
+            best = np.argmin(cand, axis=0)
+            row_cost[hosts] = cand[best, np.arange(len(hosts))] + self._latency[hosts]
+            row_back[hosts] = prev_hosts[best]
+        self._dirty_from = self.num_layers
+
+    def best_path(self) -> List[int]:
+        """Return the optimal host index per layer, or [] if no finite route exists."""
+        if self.num_layers <= 0 or not self._nodes:
             return []
-
-        # Build host lists per layer using start/end layer ranges
-        layer_hosts: List[List[int]] = []
-        for l in range(num_layers):
-            hosts = [i for i, n in enumerate(nodes) if n.hosts_layer(l)]
-            layer_hosts.append(hosts)
-
-        # If any layer lacks a host, return empty
-        if any(len(h) == 0 for h in layer_hosts):
+        if any(len(h) == 0 for h in self._layer_hosts):
             return []
-
-        # layer_id: node_id -> cost
-        dp: List[Dict[int, float]] = [{i: float("inf") for i in layer_hosts[0]}]
-        back: List[Dict[int, Optional[int]]] = [{i: None for i in layer_hosts[0]}]
-
-        # Init layer 0
-        for i in layer_hosts[0]:
-            dp[0][i] = nodes[i].layer_latency_ms
-
-        # Recurrrence: dp[l+1][g] = min_g' (dp[l][g] + rtt(g,g') + latency(g'))
-        for l in range(1, num_layers):
-            curr: Dict[int, float] = {i: float("inf") for i in layer_hosts[l]}
-            prev_back: Dict[int, Optional[int]] = {i: None for i in layer_hosts[l]}
-            for i in layer_hosts[l]:
-                node_i = nodes[i]
-                best_cost = float("inf")
-                best_j: Optional[int] = None
-                for j, prev_cost in dp[l - 1].items():
-                    if prev_cost == float("inf"):
-                        continue
-                    node_j = nodes[j]
-                    trans = 0.0 if i == j else node_j.get_rtt_to(node_i)
-                    total = prev_cost + trans + node_i.layer_latency_ms
-                    if total < best_cost:
-                        best_cost = total
-                        best_j = j
-                curr[i] = best_cost
-                prev_back[i] = best_j
-            dp.append(curr)
-            back.append(prev_back)
-
-        # Backtrack optimal node index per layer
-        last = dp[-1]
-        end_i = min(last, key=lambda k: last[k])
-        path_idx: List[int] = [end_i]
-        for l in range(num_layers - 1, 0, -1):
-            prev_i = back[l][path_idx[-1]]
-            if prev_i is None:
-                break
-            path_idx.append(prev_i)
+        self._recompute()
+        last = self._cost[-1]
+        end_i = int(np.argmin(last))
+        if not np.isfinite(last[end_i]):
+            return []
+        path_idx = [end_i]
+        for l in range(self.num_layers - 1, 0, -1):
+            path_idx.append(int(self._back[l, path_idx[-1]]))
         path_idx.reverse()
+        return path_idx
 
+    def turning_points(self) -> List[Tuple[str, int, str]]:
+        """Turning points of the current optimal layer-level path."""
+        path_idx = self.best_path()
+        nodes = self._nodes
         # Identify turning points: tail truncations when switching away
         turning: List[Tuple[str, int, str]] = []
         for l in range(1, len(path_idx)):
@@ -125,8 +214,7 @@ class DynamicProgrammingRouting(RequestRoutingStrategy):
             cur_i = path_idx[l]
             if prev_i == cur_i:
                 continue
-            prev_node = nodes[prev_i]
-            if prev_node.hosts_layer(l):
+            if self._host_mask[l, prev_i]:
                 turning.append((nodes[prev_i].node_id, l, "tail"))
         # Identify front truncations: for each node on the path, if the first
         # layer used is greater than its hosted start, we can drop the prefix
@@ -143,6 +231,37 @@ class DynamicProgrammingRouting(RequestRoutingStrategy):
                 turning.append((n.node_id, l0, "head"))
         return turning
 
+
+class DynamicProgrammingRouting(RequestRoutingStrategy):
+    """
+    Dynamic-programming router.
+
+    - Warm-up: run a layer-level DP to identify turning points (where the optimal
+      path switches nodes even if the current node still hosts the next layer).
+    - Routing: run a shard-level DP over node assignments (contiguous layer ranges),
+      using per-node execution latency and RTT via `Node.get_rtt_to`, to obtain a
+      minimum-latency node sequence and total latency.
+    """
+
+    @staticmethod
+    def find_turning_points(nodes: List[Node], num_layers: int) -> List[Tuple[str, int, str]]:
+        """Find shard truncation points via layer-level DP.
+
+        DP state is (layer l, node i that hosts l). Node cost uses the node's
+        per-layer latency proxy; edge cost uses RTT between nodes.
+
+        This is a static method that can be called directly without creating an instance:
+        DynamicProgrammingRouting.find_turning_points(nodes, num_layers)
+
+        It builds a fresh `LayerRoutingTable`; callers that route repeatedly over
+        the same fleet should keep their own table and call `sync` instead.
+        """
+        if num_layers <= 0 or not nodes:
+            return []
+        table = LayerRoutingTable()
+        table.rebuild(nodes, num_layers)
+        return table.turning_points()
+
     def find_optimal_path(self, nodes: List[Node], num_layers: int) -> Tuple[List[str], float]:
         """Shard-level DP path across node ranges using `Node` APIs."""
         if num_layers <= 0 or not nodes:
@@ -214,6 +333,105 @@ class DynamicProgrammingRouting(RequestRoutingStrategy):
         return [nodes[i].node_id for i in path_indices], dp[end_idx]
 
 
+class PipelineRegistry:
+    """
+    Versioned cache of complete pipelines with per-pipeline aggregates.
+
+    The registry is tagged with an allocation epoch (see
+    `BaseLayerAllocator.allocation_epoch`). Any allocation change bumps the epoch
+    and the registry is repopulated by the owner; pipelines from an older epoch
+    are never served.
+
+    For each pipeline it tracks the end-to-end latency (node latencies plus RTT
+    between consecutive stages) and the load (max `current_requests /
+    max_requests` across its nodes). Node updates mark only the pipelines
+    containing that node dirty; aggregates are recomputed lazily on access.
+    """
+
+    def __init__(self) -> None:
+        self.epoch: Optional[Hashable] = None
+        self.pipelines: List[List[str]] = []
+        self._id_to_node: Dict[str, Node] = {}
+        self._node_to_pipelines: Dict[str, List[int]] = {}
+        self._latency: List[float] = []
+        self._load: List[float] = []
+        self._dirty: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.pipelines)
+
+    def is_current(self, epoch: Hashable) -> bool:
+        """Whether the registry was populated for `epoch`."""
+        return self.epoch is not None and self.epoch == epoch
+
+    def invalidate(self) -> None:
+        """Drop all pipelines; the next lookup must repopulate."""
+        self.epoch = None
+        self.pipelines = []
+        self._id_to_node = {}
+        self._node_to_pipelines = {}
+        self._latency = []
+        self._load = []
+        self._dirty = set()
+
+    def reset(self, epoch: Hashable, pipelines: List[List[str]], nodes: List[Node]) -> None:
+        """Replace the registry content with `pipelines` discovered at `epoch`."""
+        self.epoch = epoch
+        self.pipelines = pipelines
+        self._id_to_node = {n.node_id: n for n in nodes}
+        self._node_to_pipelines = {}
+        for idx, pipeline in enumerate(pipelines):
+            for nid in pipeline:
+                self._node_to_pipelines.setdefault(nid, []).append(idx)
+        self._latency = [float("inf")] * len(pipelines)
+        self._load = [0.0] * len(pipelines)
+        self._dirty = set(range(len(pipelines)))
+
+    def mark_node_dirty(self, node_id: str) -> None:
+        """Invalidate aggregates of every pipeline containing `node_id`."""
+        self._dirty.update(self._node_to_pipelines.get(node_id, ()))
+
+    def nodes_of(self, idx: int) -> List[Optional[Node]]:
+        """Nodes of pipeline `idx`, in stage order (None for unknown ids)."""
+        return [self._id_to_node.get(nid) for nid in self.pipelines[idx]]
+
+    def is_viable(self, idx: int) -> bool:
+        """True if every node of pipeline `idx` is present and not overloaded."""
+        return all(n is not None and not n.is_overloaded for n in self.nodes_of(idx))
+
+    def latency(self, idx: int) -> float:
+        """Estimated end-to-end latency (ms) of pipeline `idx`."""
+        self._refresh(idx)
+        return self._latency[idx]
+
+    def load(self, idx: int) -> float:
+        """Max request utilization across the nodes of pipeline `idx`."""
+        self._refresh(idx)
+        return self._load[idx]
+
+    def _refresh(self, idx: int) -> None:
+        if idx not in self._dirty:
+            return
+        self._dirty.discard(idx)
+        total_latency = 0.0
+        load = 0.0
+        prev: Optional[Node] = None
+        for node in self.nodes_of(idx):
+            if node is None:
+                total_latency = float("inf")
+                break
+            total_latency += float(node.layer_latency_ms)
+            if prev is not None:
+                total_latency += (
+                    0.0 if prev.node_id == node.node_id else float(prev.get_rtt_to(node))
+                )
+            max_requests = node.max_requests
+            load = max(load, node.current_requests / max_requests if max_requests else 1.0)
+            prev = node
+        self._latency[idx] = total_latency
+        self._load[idx] = load
+
+
 class RoundRobinPipelineRouting(RequestRoutingStrategy):
     """
     Baseline routing strategy using round-robin over complete pipelines.
@@ -223,15 +441,32 @@ class RoundRobinPipelineRouting(RequestRoutingStrategy):
     node allocations, skip any pipeline that contains an overloaded node, and
     dispatch requests by rotating among the remaining pipelines.
 
-    This implementation discovers all complete pipelines once, caches them as
-    node-id sequences sorted by their estimated end-to-end latency (including
-    RTT), and then round-robins over that cached list. Use `reset_pipelines()`
-    to force rediscovery if allocations change.
+    Discovered pipelines live in a `PipelineRegistry` tagged with an allocation
+    epoch. When `allocation_epoch` is provided (the scheduler passes the layer
+    allocator's counter), rediscovery happens only after the epoch moves; otherwise
+    the epoch falls back to a signature of node ids and layer ranges. Use
+    `reset_pipelines()` to force rediscovery.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, allocation_epoch: Optional[Callable[[], int]] = None) -> None:
         self._rr_cursor: int = 0
-        self._pipelines: Optional[List[List[str]]] = None
+        self._allocation_epoch = allocation_epoch
+        self._registry = PipelineRegistry()
+
+    @property
+    def _pipelines(self) -> Optional[List[List[str]]]:
+        """Currently cached pipelines, or None if not discovered yet."""
+        if self._registry.epoch is None:
+            return None
+        return self._registry.pipelines
+
+    def reset_pipelines(self) -> None:
+        """Force pipeline rediscovery on the next routing call."""
+        self._registry.invalidate()
+
+    def notify_node_update(self, node: Node) -> None:
+        """Mark cached aggregates of pipelines containing `node` as stale."""
+        self._registry.mark_node_dirty(node.node_id)
 
     def pipeline_discovery(self, nodes: List[Node], num_layers: int) -> List[List[str]]:
         """Discover and return all complete pipelines via DFS backtracking.
@@ -295,10 +530,16 @@ class RoundRobinPipelineRouting(RequestRoutingStrategy):
         """No warm-up/truncation in the baseline; return no turning points."""
         return []
 
+    def _current_epoch(self, nodes: List[Node], num_layers: int) -> Hashable:
+        if self._allocation_epoch is not None:
+            return (num_layers, self._allocation_epoch())
+        return (num_layers, tuple((n.node_id, n.start_layer, n.end_layer) for n in nodes))
+
     def _ensure_pipelines(self, nodes: List[Node], num_layers: int) -> None:
-        """Ensure cached pipelines exist; discover and cache if missing."""
-        if self._pipelines is None:
-            self._pipelines = self.pipeline_discovery(nodes, num_layers)
+        """Ensure cached pipelines match the current allocation epoch; rediscover if not."""
+        epoch = self._current_epoch(nodes, num_layers)
+        if not self._registry.is_current(epoch):
+            self._registry.reset(epoch, self.pipeline_discovery(nodes, num_layers), nodes)
 
     def _build_start_index(self, nodes: List[Node]) -> Dict[int, List[Node]]:
         """Build an index of nodes by their `start_layer` for fast lookups.
@@ -388,56 +629,43 @@ class RoundRobinPipelineRouting(RequestRoutingStrategy):
         """Round-robin among cached pipelines, skipping overloaded ones.
 
         Selection procedure:
-        - On first use, greedily discover and cache all full pipelines.
+        - Discover and cache all full pipelines whenever the allocation epoch moved.
         - Pick the pipeline at `rr_cursor % len(pipelines)`.
         - If any node in that pipeline is overloaded or missing, advance cursor
           and try the next one, up to the number of pipelines. Additionally, if
           the selected pipeline contains overloaded nodes, attempt a best-effort
           repair by backtracking from the tail to find an alternative suffix that
           completes coverage without overloaded nodes.
-        - Return the first viable pipeline and its latency estimate using
-          current per-node stats and RTTs. If none are viable, return empty.
+        - Return the first viable pipeline and its cached latency aggregate. If
+          none are viable, return empty.
         """
         if not nodes or num_layers <= 0:
             return [], float("inf")
 
         self._ensure_pipelines(nodes, num_layers)
-        if not self._pipelines:
+        registry = self._registry
+        if not len(registry):
             return [], float("inf")
 
-        id_to_node: Dict[str, Node] = {n.node_id: n for n in nodes}
-
         attempts = 0
-        total_pipelines = len(self._pipelines)
+        total_pipelines = len(registry)
         self._rr_cursor %= total_pipelines
         while attempts < total_pipelines:
             idx = self._rr_cursor % total_pipelines
-            candidate_ids = self._pipelines[idx]
-            # Check overloaded / presence
-            viable = True
-            prev: Optional[Node] = None
-            total_latency = 0.0
-            for nid in candidate_ids:
-                node = id_to_node.get(nid)
-                if node is None or node.is_overloaded:
-                    viable = False
-                    break
-                total_latency += float(node.layer_latency_ms)
-                if prev is not None:
-                    total_latency += (
-                        0.0 if prev.node_id == node.node_id else float(prev.get_rtt_to(node))
-                    )
-                prev = node
+            candidate_ids = registry.pipelines[idx]
             self._rr_cursor += 1
             attempts += 1
-            if viable and total_latency != float("inf"):
-                return candidate_ids, total_latency
+            if registry.is_viable(idx):
+                total_latency = registry.latency(idx)
+                if total_latency != float("inf"):
+                    return candidate_ids, total_latency
             # Attempt a one-shot repair if the selected pipeline is not viable
             repaired = self._attempt_repair_pipeline(candidate_ids, nodes, num_layers)
             if repaired:
+                id_to_node: Dict[str, Node] = {n.node_id: n for n in nodes}
                 # Compute latency for the repaired path
                 total_latency = 0.0
-                prev = None
+                prev: Optional[Node] = None
                 for nid in repaired:
                     node = id_to_node.get(nid)
                     # If any node is missing/overloaded, skip this repair
@@ -24,23 +24,38 @@ import queue
 import threading
 import time
 from collections import deque
-from typing import Deque, Dict, List, Literal, Optional, Tuple
+from typing import Callable, Deque, Dict, List, Literal, Optional, Tuple
 
 from parallax_utils.logging_config import get_logger
+from scheduling.admission import AdmissionController, request_slots
+from scheduling.heartbeat import HeartbeatTracker
 from scheduling.layer_allocation import (
     DynamicProgrammingLayerAllocator,
     GreedyLayerAllocator,
 )
 from scheduling.model_info import ModelInfo
 from scheduling.node import Node, RequestSignal
+from scheduling.rebalance_planner import LayerMove, RebalancePlanner
 from scheduling.request_routing import (
     DynamicProgrammingRouting,
+    LayerRoutingTable,
     RoundRobinPipelineRouting,
 )
 
 logger = get_logger(__name__)
 
 
+def _drain(events: "queue.Queue", limit: int) -> list:
+    """Takes up to `limit` events off `events` without blocking."""
+    batch = []
+    while len(batch) < limit:
+        try:
+            batch.append(events.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
 class Scheduler:
     """
     分布式推理调度器主类
@@ -67,8 +82,12 @@ class Scheduler:
         request_arrival_horizon_sec: float = 600.0,
         rebalance_threshold: float = float("inf"),
         water_filling_max_iterations: int = 40,
+        allocation_time_budget_s: Optional[float] = 1.0,
         request_warm_up_for_reshard: int = 0,
         heartbeat_timeout: float = 60.0,
+        admission_controller: Optional[AdmissionController] = None,
+        on_capacity_freed: Optional[Callable[[int], None]] = None,
+        event_batch_size: int = 1024,
     ) -> None:
         """
         初始化分布式推理调度器
@@ -87,48 +106,87 @@ class Scheduler:
             request_arrival_horizon_sec (float): 请求到达时间预测范围，秒，默认600秒
             rebalance_threshold (float): 负载重平衡阈值，默认无穷大（不重平衡）
             water_filling_max_iterations (int): 水填充算法最大迭代次数，默认40
+            allocation_time_budget_s (Optional[float]): 动态规划层分配的搜索时间上限，秒，
+                                  默认1秒；None表示完整搜索
             request_warm_up_for_reshard (int): 重新分片前的请求预热数量，默认0
             heartbeat_timeout (float): 心跳超时时间，秒，默认60秒
+            admission_controller (Optional[AdmissionController]): 准入控制器，默认按到达率
+                                  和服务能力自动创建
+            on_capacity_freed (Optional[Callable[[int], None]]): 节点释放容量时的回调，
+                                  参数为整个集群（按最薄弱的层计）释放的请求槽位数
+            event_batch_size (int): 事件循环每轮从每个事件队列最多取出的事件数，默认1024
             strategy: Layer allocation strategy ("dp" or "greedy").
             routing_strategy: Request routing strategy ("dp" for dynamic programming, or
                 "greedy" for round-robin over complete pipelines skipping overloaded ones).
             request_arrival_horizon_sec: Sliding window horizon for arrival-rate tracking.
             rebalance_threshold: Threshold for triggering rebalancing in allocation.
             water_filling_max_iterations: Max iterations for water-filling allocation.
+            allocation_time_budget_s: Search time limit of each global allocation with the
+                "dp" strategy; once used up, the best pipeline count found so far is
+                allocated. None searches exhaustively, which grows exponentially with the
+                number of nodes.
             request_warm_up_for_reshard: Number of warm-up requests to detect truncation.
             heartbeat_timeout: Time in seconds to consider node heartbeat stale.
+            admission_controller: Decides whether requests are routed, delayed or rejected;
+                defaults to an `AdmissionController` keeping `request_arrival_horizon_sec`
+                of arrival history.
+            on_capacity_freed: Called from the event loop with the number of request slots
+                that freed up across the cluster (bottlenecked by the weakest layer) when
+                node updates report fewer requests or a node becomes active, so callers
+                waiting for capacity can retry right away.
+            event_batch_size: Most events the event loop takes off each queue per round;
+                node updates of a batch are merged per node before being applied.
         """
         self.model_info = model_info
         self.num_layers = model_info.num_layers
 
-        allocator_class = (
-            GreedyLayerAllocator if strategy == "greedy" else DynamicProgrammingLayerAllocator
-        )
-        self.layer_allocator = allocator_class(
-            model_info,
-            nodes,
-            rebalance_threshold=rebalance_threshold,
-            water_filling_max_iterations=water_filling_max_iterations,
-        )
+        if strategy == "greedy":
+            self.layer_allocator = GreedyLayerAllocator(
+                model_info,
+                nodes,
+                rebalance_threshold=rebalance_threshold,
+                water_filling_max_iterations=water_filling_max_iterations,
+            )
+        else:
+            self.layer_allocator = DynamicProgrammingLayerAllocator(
+                model_info,
+                nodes,
+                rebalance_threshold=rebalance_threshold,
+                water_filling_max_iterations=water_filling_max_iterations,
+                time_budget_s=allocation_time_budget_s,
+            )
         # Ensure Scheduler and allocator share the same node list to avoid divergence.
         self.nodes = self.layer_allocator.nodes
         self.node_id_to_node: Dict[str, Node] = self.layer_allocator.node_id_to_node
         self.min_nodes_bootstrapping = min_nodes_bootstrapping
 
         self.request_router = (
-            DynamicProgrammingRouting() if routing_strategy == "dp" else RoundRobinPipelineRouting()
+            DynamicProgrammingRouting()
+            if routing_strategy == "dp"
+            else RoundRobinPipelineRouting(
+                allocation_epoch=lambda: self.layer_allocator.allocation_epoch
+            )
         )
         self.request_warm_up_for_reshard = request_warm_up_for_reshard
+        # Layer-level DP kept across warm-ups; rebuilt lazily on allocation changes
+        self._layer_routing_table = LayerRoutingTable()
 
         self._request_queue: "queue.Queue[RequestSignal]" = queue.Queue()
         self.request_arrival_horizon_sec = request_arrival_horizon_sec
         self.heartbeat_timeout = heartbeat_timeout
-        self._arrival_ts: Deque[float] = deque()
+        self._heartbeats = HeartbeatTracker(heartbeat_timeout)
+        for node in self.nodes:
+            self._heartbeats.refresh(node.node_id, node.last_heartbeat)
+        self.event_batch_size = event_batch_size
+        self.admission = admission_controller or AdmissionController(
+            history_sec=request_arrival_horizon_sec
+        )
+        self.on_capacity_freed = on_capacity_freed
 
         # Event queues for main loop orchestration (thread-safe)
         self._pending_joins: "queue.Queue[Node]" = queue.Queue()
         self._pending_leaves: "queue.Queue[str]" = queue.Queue()
-        self._pending_node_updates: "queue.Queue[Tuple[str, Optional[int], Optional[float], Optional[Dict[str, float]], Optional[bool]]]" = (queue.Queue())
+        self._pending_node_updates: "queue.Queue[Tuple[str, Optional[int], Optional[float], Optional[Dict[str, float]], Optional[bool], Optional[Tuple[int, int]]]]" = (queue.Queue())
 
         # Concurrency controls
         self._stop_event: threading.Event = threading.Event()
@@ -146,6 +204,12 @@ class Scheduler:
         )
         self._node_assigned_request_count: Dict[str, int] = {}
 
+        # Staged rebalance in progress: stages not applied yet, and the nodes of the
+        # applied stage still loading (node_id -> target range they must report)
+        self._rebalance_planner = RebalancePlanner(self.num_layers)
+        self._rebalance_stages: Deque[List[LayerMove]] = deque()
+        self._rebalance_loading: Dict[str, Tuple[int, int]] = {}
+
         # Eager bootstrap for initial allocation if enough nodes are present
         try:
             if len(self.nodes) >= self.min_nodes_bootstrapping:
@@ -216,6 +280,83 @@ class Scheduler:
         logger.debug(f"{action.capitalize()} completed successfully; full pipeline established")
         return True
 
+    def rebalance(self) -> bool:
+        """Global rebalance that moves as few layers as possible.
+
+        Computes the target allocation like `bootstrap(clear_existing=True)`, then moves
+        the cluster there in stages planned by `RebalancePlanner`: nodes keeping their
+        range are left alone, and every stage keeps a full pipeline serving whenever the
+        cluster has one. The first stage is applied now, the others by the event loop
+        once the nodes of the previous stage report their new range as active.
+
+        Returns:
+            True if the target allocation has a full pipeline; False otherwise.
+        """
+        self._rebalance_stages.clear()
+        self._rebalance_loading.clear()
+        current = {
+            n.node_id: (n.start_layer, n.end_layer)
+            for n in self.nodes
+            if n.start_layer is not None and n.end_layer is not None
+        }
+        serving = {n.node_id for n in self.nodes if n.is_active}
+        if not self.bootstrap(clear_existing=True, skip_warmup=True):
+            return False
+        target = {node_id: (start, end) for node_id, start, end in self.list_node_allocations()}
+        plan = self._rebalance_planner.plan(self.nodes, current, target, serving=serving)
+        logger.info(
+            f"Rebalancing: {len(plan.moves)} of {len(self.nodes)} nodes move in "
+            f"{len(plan.stages)} stages, {plan.layers_to_load} layers to load"
+        )
+
+        # Go back to the current allocation and apply the plan from there
+        for n in self.nodes:
+            if n.start_layer is not None and n.end_layer is not None:
+                self.layer_allocator.deallocate(n)
+        for n in self.nodes:
+            if n.node_id in current:
+                self.layer_allocator.allocate(n, *current[n.node_id])
+            n.is_active = n.node_id in serving
+        self._rebalance_stages.extend(plan.stages)
+        if self._rebalance_stages:
+            self._apply_next_rebalance_stage()
+        return True
+
+    def _apply_next_rebalance_stage(self) -> None:
+        """Moves the nodes of the next rebalance stage to their target ranges."""
+        stage = self._rebalance_stages.popleft()
+        for move in stage:
+            node = self.node_id_to_node.get(move.node_id)
+            if node is None:
+                continue
+            if move.target is None:
+                self.layer_allocator.deallocate(node)
+            else:
+                # Inactive until the node reports it finished loading the new range
+                self.layer_allocator.reallocate(node, *move.target)
+                self._rebalance_loading[move.node_id] = move.target
+        logger.debug(
+            f"Applied rebalance stage of {len(stage)} moves, "
+            f"{len(self._rebalance_stages)} stages left"
+        )
+
+    def _advance_rebalance(self) -> None:
+        """Applies the next rebalance stage once the nodes of the previous one are active.
+
+        A moved node counts as done only when an update reports its target range together
+        with `is_active` (see `_process_node_updates`); metrics deltas and heartbeats sent
+        before the move don't.
+        """
+        if not self._rebalance_stages and not self._rebalance_loading:
+            return
+        if any(node_id in self.node_id_to_node for node_id in self._rebalance_loading):
+            return
+        self._rebalance_loading.clear()
+        if self._rebalance_stages:
+            self._apply_next_rebalance_stage()
+        else:
+            logger.info("Rebalance completed")
+
     def list_node_allocations(self) -> List[Tuple[str, int, int]]:
         """List the allocations of all nodes."""
         return self.layer_allocator.list_node_allocations()
@@ -228,9 +369,10 @@ class Scheduler:
         - kind == "tail": drop [layer_idx, end) on that node
         - kind == "head": drop [start, layer_idx) on that node
 
-        Note: Always uses DynamicProgrammingRouting for finding turning points,
-        regardless of the current request_router type, since turning points
-        detection requires layer-level DP analysis.
+        Note: Always uses the scheduler's `LayerRoutingTable` for finding turning
+        points, regardless of the current request_router type, since turning points
+        detection requires layer-level DP analysis. The table is kept across calls
+        and only recomputes the DP rows invalidated since the previous warm-up.
 
         Args:
             override_warmup_count: If > 0, use this value instead of request_warm_up_for_reshard.
@@ -249,7 +391,8 @@ class Scheduler:
 
         agg_turns: Dict[Tuple[str, int, str], int] = {}
         for _ in range(warmup_count):
-            turns = DynamicProgrammingRouting.find_turning_points(nodes_list, num_layers)
+            self._layer_routing_table.sync(nodes_list, num_layers)
+            turns = self._layer_routing_table.turning_points()
             for t in turns:
                 agg_turns[t] = agg_turns.get(t, 0) + 1
 
@@ -278,6 +421,26 @@ class Scheduler:
         is_active: Optional[bool] = None,
     ) -> None:
         """Update the info of a node."""
+        free_before = self._free_request_slots()
+        self._apply_node_update(
+            node,
+            current_requests=current_requests,
+            layer_latency_ms=layer_latency_ms,
+            new_rtt_to_nodes=new_rtt_to_nodes,
+            is_active=is_active,
+        )
+        self._report_freed_capacity(free_before)
+
+    def _apply_node_update(
+        self,
+        node: Node,
+        *,
+        current_requests: Optional[int] = None,
+        layer_latency_ms: Optional[float] = None,
+        new_rtt_to_nodes: Optional[Dict[str, float]] = None,
+        is_active: Optional[bool] = None,
+    ) -> None:
+        """Apply reported stats to a node without notifying the capacity listener."""
         if current_requests is not None:
             node.current_requests = current_requests
         if layer_latency_ms is not None:
@@ -287,6 +450,10 @@ class Scheduler:
         if is_active is not None:
             node.is_active = is_active
         node.last_heartbeat = time.time()
+        self._heartbeats.refresh(node.node_id, node.last_heartbeat)
+        if layer_latency_ms is not None or new_rtt_to_nodes is not None:
+            self._layer_routing_table.update_node(node)
+        self.request_router.notify_node_update(node)
         # logger.debug(
         #     "Node updated: %s (requests=%s, latency_ms=%s, rtt_updates=%s)",
         #     node.node_id,
@@ -295,6 +462,29 @@ class Scheduler:
         #     0 if new_rtt_to_nodes is None else len(new_rtt_to_nodes),
         # )
 
+    def _free_request_slots(self) -> int:
+        """Requests the cluster can take now, bottlenecked by the weakest layer.
+
+        A finished request frees a slot on every node of its pipeline, but only one
+        more request fits; counting per-node drops would over-report it. Only computed
+        when a capacity listener is registered.
+        """
+        if self.on_capacity_freed is None:
+            return 0
+        return request_slots(self.nodes, self.num_layers)[1]
+
+    def _report_freed_capacity(self, free_before: int) -> None:
+        """Tell the capacity listener how many request slots freed up since `free_before`."""
+        if self.on_capacity_freed is None:
+            return
+        freed = self._free_request_slots() - free_before
+        if freed <= 0:
+            return
+        try:
+            self.on_capacity_freed(freed)
+        except Exception as exc:
+            logger.warning(f"Capacity listener failed: {exc}")
+
     # Async-style event enqueuers for main loop
     def enqueue_join(self, node: Node) -> None:
         """Enqueue a join event."""
@@ -315,21 +505,39 @@ class Scheduler:
         layer_latency_ms: Optional[float] = None,
         new_rtt_to_nodes: Optional[Dict[str, float]] = None,
         is_active: Optional[bool] = None,
+        start_layer: Optional[int] = None,
+        end_layer: Optional[int] = None,
     ) -> None:
-        """Enqueue a node update event."""
+        """Enqueue a node update event.
+
+        `start_layer`/`end_layer` are the range the node reports serving; `is_active`
+        only applies to the range the scheduler allocated to the node.
+        """
+        layers = None
+        if start_layer is not None and end_layer is not None:
+            layers = (start_layer, end_layer)
         self._pending_node_updates.put(
-            (node_id, current_requests, layer_latency_ms, new_rtt_to_nodes, is_active)
+            (node_id, current_requests, layer_latency_ms, new_rtt_to_nodes, is_active, layers)
         )
         self._wake_event.set()
 
-    def checking_node_heartbeat(self) -> None:
-        """Check the heartbeat of all nodes."""
-        for node in self.nodes:
+    def checking_node_heartbeat(self, now: Optional[float] = None) -> None:
+        """Evict active nodes without a heartbeat for `heartbeat_timeout` seconds.
+
+        Only nodes whose deadline is due are looked at, so this is cheap to call on
+        every event loop round.
+        """
+        now = time.time() if now is None else now
+        for node_id in self._heartbeats.expired(now):
+            node = self.node_id_to_node.get(node_id)
+            if node is None:
+                continue
             if not node.is_active:
+                # Inactive nodes aren't evicted; look again one timeout from now
+                self._heartbeats.refresh(node_id, now)
                 continue
-            if time.time() - node.last_heartbeat > self.heartbeat_timeout:
-                logger.debug(f"Node {node.node_id} heartbeat timeout")
-                self.leave(node.node_id)
+            logger.debug(f"Node {node_id} heartbeat timeout")
+            self.leave(node_id)
 
     # Dynamic node management
     def join(self, node: Node, bootstrap: bool = False) -> None:
@@ -342,6 +550,7 @@ class Scheduler:
             node.manual_layer_assignment,
         )
         self.layer_allocator.declare(node)
+        self._heartbeats.refresh(node.node_id, node.last_heartbeat)
 
         # Manual layer assignment bypasses bootstrap waiting
         if node.manual_layer_assignment:
@@ -385,6 +594,12 @@ class Scheduler:
             "Leaving node %s (start=%s, end=%s)", node_id, node.start_layer, node.end_layer
         )
         self.layer_allocator.leave(node_id)
+        self._heartbeats.remove(node_id)
+        if self._rebalance_stages:
+            # The plan assumed this node; the check below replans from the current state
+            logger.debug("Abandoning the rebalance in progress due to node leave")
+            self._rebalance_stages.clear()
+            self._rebalance_loading.clear()
         if self.layer_allocator.should_global_rebalance():
             logger.debug("Global rebalance triggered due to node leave")
 
@@ -408,30 +623,49 @@ class Scheduler:
                     )
                     self._run_warmup_and_truncate(override_warmup_count=1)
                     if not self.layer_allocator.has_full_pipeline():
-                        self.bootstrap(clear_existing=True, skip_warmup=True)
+                        self.rebalance()
                     else:
                         logger.debug(
                             "Pipeline recovered through warmup and truncate, skipping global rebalance"
                         )
                 else:
-                    self.bootstrap(clear_existing=True, skip_warmup=True)
+                    self.rebalance()
 
         with self._node_count_cv:
             self._node_count_cv.notify_all()
 
     def receive_request(self, request: RequestSignal) -> None:
         """Add a request to the wait pool."""
+        self.admission.record_arrival(request_id=request.request_id)
         self._request_queue.put(request)
         self._wake_event.set()
-        now = time.time()
-        self._arrival_ts.append(now)
         logger.debug(
             "Received request %s (queue_size=%d)", request.request_id, self._request_queue.qsize()
         )
-        # Trim old timestamps to keep arrival-rate window bounded
-        horizon = self.request_arrival_horizon_sec
-        while self._arrival_ts and now - self._arrival_ts[0] > horizon:
-            self._arrival_ts.popleft()
+
+    def _admit(self, req: RequestSignal) -> bool:
+        """Runs admission control; resolves a request held back with an empty route."""
+        now = time.time()
+        decision = self.admission.decide(
+            self.nodes,
+            self.num_layers,
+            queued=self._request_queue.qsize(),
+            now=now,
+            waited_s=max(0.0, now - req.received_ts),
+        )
+        if decision.admitted:
+            return True
+        req.retry_after_s = decision.retry_after_s
+        req.rejected = decision.action == "reject"
+        req.set_routing_table([])
+        logger.debug(
+            "Admission %s request %s (utilization=%.2f, retry after %.1fs)",
+            decision.action,
+            req.request_id,
+            decision.utilization,
+            decision.retry_after_s,
+        )
+        return False
 
     def dispatch_next_request(self) -> Optional[Tuple[str, List[str], float]]:
         """Route the next request in the wait pool; returns (request_id, path, latency)."""
@@ -441,8 +675,12 @@ class Scheduler:
             req = None
         if req is None:
             return None
+        if not req.claim():
+            logger.debug("Skipping request %s: waiter cancelled", req.request_id)
+            return None
+        if not self._admit(req):
+            return req.request_id, [], float("inf")
         path, latency = self.request_router.find_optimal_path(self.nodes, self.num_layers)
-        req.routing_table = path
         # Update simple load counters
         for node_id in path:
             n = self.node_id_to_node[node_id]
@@ -451,6 +689,8 @@ class Scheduler:
                     self._node_assigned_request_count.get(node_id, 0) + 1
                 )
                 n.add_request()
+                self.request_router.notify_node_update(n)
+        req.set_routing_table(path)
         logger.debug(
             "Dispatched request %s via path %s (est_lat=%.2fms)", req.request_id, path, latency
         )
@@ -537,17 +777,21 @@ class Scheduler:
 
     # === Modularized worker loops ===
     def _event_loop(self, poll_interval: float) -> None:
-        """Process joins/leaves/updates and perform heartbeat checks."""
-        last_hb_check = 0.0
+        """Process joins/leaves/updates in batches and evict nodes whose heartbeat expired."""
         while not self._stop_event.is_set():
-            self._process_node_updates()
-            self._process_joins()
-            self._process_leaves()
-            now = time.time()
-            if now - last_hb_check >= max(0.5, poll_interval):
-                self.checking_node_heartbeat()
-                last_hb_check = now
-            self._wake_event.wait(timeout=poll_interval)
+            backlog = self._process_node_updates()
+            backlog = self._process_joins() or backlog
+            backlog = self._process_leaves() or backlog
+            self._advance_rebalance()
+            self.checking_node_heartbeat()
+            if backlog:
+                continue
+            # Sleep no longer than until the next heartbeat deadline
+            timeout = poll_interval
+            deadline = self._heartbeats.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - time.time()))
+            self._wake_event.wait(timeout=timeout)
             self._wake_event.clear()
 
     def _dispatch_loop(self, poll_interval: float) -> None:
@@ -557,9 +801,13 @@ class Scheduler:
                 req = self._request_queue.get(timeout=poll_interval)
                 if req is None:
                     continue
+                if not req.claim():
+                    logger.debug("Skipping request %s: waiter cancelled", req.request_id)
+                    continue
+                if not self._admit(req):
+                    continue
                 path, path_rtt = self.request_router.find_optimal_path(self.nodes, self.num_layers)
                 logger.debug(f"Path RTT: {path_rtt}")
-                req.routing_table = path
                 for node_id in path:
                     n = self.node_id_to_node[node_id]
                     if n is not None:
@@ -567,6 +815,9 @@ class Scheduler:
                             self._node_assigned_request_count.get(node_id, 0) + 1
                         )
                         n.add_request()
+                        self.request_router.notify_node_update(n)
+                # Resolve the waiter only after load counters reflect this request
+                req.set_routing_table(path)
                 logger.debug(
                     "Dispatched request %s via path %s", getattr(req, "request_id", "?"), path
                 )
@@ -588,33 +839,50 @@ class Scheduler:
                 self._node_count_cv.wait(timeout=max(1.0, poll_interval))
         return not self._stop_event.is_set()
 
-    def _process_node_updates(self) -> None:
-        """Apply pending node stats updates from the queue."""
-        while True:
-            try:
-                node_id, cur, lat, rtts, is_active = self._pending_node_updates.get_nowait()
-            except queue.Empty:
-                break
+    def _process_node_updates(self) -> bool:
+        """Apply a batch of pending node stats updates; returns True if more are pending.
+
+        Updates of the same node within the batch are merged, the latest value of each
+        field winning, so the node and the routing tables are updated once per node.
+        The capacity listener is told once per batch how many slots freed up.
+        """
+        merged: Dict[str, List] = {}
+        for node_id, *fields in _drain(self._pending_node_updates, self.event_batch_size):
             if node_id not in self.node_id_to_node:
                 logger.warning(f"Node {node_id} not found in node list, ignore the update")
                 continue
-            self.update_node_info(
-                self.node_id_to_node[node_id],
+            latest = merged.setdefault(node_id, [None] * len(fields))
+            for i, value in enumerate(fields):
+                if value is not None:
+                    latest[i] = value
+        free_before = self._free_request_slots()
+        for node_id, (cur, lat, rtts, is_active, layers) in merged.items():
+            node = self.node_id_to_node[node_id]
+            if layers is not None and layers != (node.start_layer, node.end_layer):
+                # Sent before the node picked up its new range; its status is for the old one
+                is_active = None
+            elif is_active and layers is not None and node_id in self._rebalance_loading:
+                if layers == self._rebalance_loading[node_id]:
+                    # Finished loading its rebalance target
+                    del self._rebalance_loading[node_id]
+            self._apply_node_update(
+                node,
                 current_requests=cur,
                 layer_latency_ms=lat,
                 new_rtt_to_nodes=rtts,
                 is_active=is_active,
             )
+        self._report_freed_capacity(free_before)
+        return not self._pending_node_updates.empty()
+
+    def _process_joins(self) -> bool:
+        """Handle a batch of pending join events, honoring bootstrap state for assignment.
 
-    def _process_joins(self) -> None:
-        """Handle pending join events, honoring bootstrap state for assignment."""
+        Returns True if more joins are pending.
+        """
         joined_any = False
         had_manual_assignment = False
-        while True:
-            try:
-                node = self._pending_joins.get_nowait()
-            except queue.Empty:
-                break
+        for node in _drain(self._pending_joins, self.event_batch_size):
             # During bootstrap (no full pipeline yet), only declare nodes; no dynamic assignment.
             # After bootstrap, allow dynamic light-weight joins.
             # Exception: manual layer assignments are processed immediately regardless of bootstrap state.
@@ -646,18 +914,16 @@ class Scheduler:
                     len(self.nodes),
                     self.min_nodes_bootstrapping,
                 )
+        return not self._pending_joins.empty()
 
-    def _process_leaves(self) -> None:
-        """Handle pending leave events safely."""
-        while True:
-            try:
-                node_id = self._pending_leaves.get_nowait()
-            except queue.Empty:
-                break
+    def _process_leaves(self) -> bool:
+        """Handle a batch of pending leave events safely; returns True if more are pending."""
+        for node_id in _drain(self._pending_leaves, self.event_batch_size):
             try:
                 self.leave(node_id)
             except Exception as exc:
                 logger.warning(f"Leave failed for {node_id}: {exc}")
+        return not self._pending_leaves.empty()
 
     def stop(self) -> None:
         """Signal background threads to stop and wake any waiters."""
@@ -0,0 +1,195 @@
+"""
+Tests for arrival-rate-aware admission control.
+
+Covers:
+- Capacity estimation (bottleneck layer slots, live vs. roofline latency)
+- Admit / delay / reject decisions and Retry-After hints
+- Bounded latency of admitted requests under a synthetic overload
+- Scheduler resolving held-back requests with an empty route
+"""
+
+import heapq
+import random
+
+from scheduling.admission import AdmissionController
+from scheduling.node import RequestSignal
+from scheduling.scheduler import Scheduler
+
+from .test_utils import build_model_info, build_node, set_rtt_from_coords
+
+NUM_LAYERS = 12
+
+
+def _pipeline(max_requests: int = 4, layer_ms: float = 1.0):
+    """Two nodes forming one pipeline with known slots and per-layer latency."""
+    model = build_model_info(NUM_LAYERS)
+    head = build_node("head", model)
+    tail = build_node("tail", model)
+    head.set_layer_allocation(0, 6)
+    tail.set_layer_allocation(6, NUM_LAYERS)
+    for node in (head, tail):
+        node.max_concurrent_requests = max_requests
+        node.avg_layer_latency_ms = layer_ms
+    return [head, tail]
+
+
+def test_capacity_is_bottlenecked_by_weakest_layer():
+    nodes = _pipeline(max_requests=4)
+    replica = build_node("tail-2", nodes[0].model_info)
+    replica.set_layer_allocation(6, NUM_LAYERS)
+    replica.max_concurrent_requests = 4
+    replica.avg_layer_latency_ms = 3.0
+    nodes.append(replica)
+    nodes[0].current_requests = 3
+    controller = AdmissionController(expected_output_tokens=100)
+
+    capacity = controller.estimate_capacity(nodes, NUM_LAYERS)
+
+    # Layers [0, 6) are hosted by one node only
+    assert capacity.slots == 4
+    assert capacity.free_slots == 1
+    # 6 layers at 1 ms + 6 layers at mean(1, 3) ms per decode step
+    assert abs(capacity.service_time_s - 100 * 18 / 1000) < 1e-9
+
+
+def test_capacity_ignores_inactive_nodes_and_gaps():
+    nodes = _pipeline()
+    controller = AdmissionController()
+    nodes[1].is_active = False
+
+    assert controller.estimate_capacity(nodes, NUM_LAYERS).service_rate == 0.0
+    # Nothing to estimate from: routing decides
+    assert controller.decide(nodes, NUM_LAYERS).admitted
+
+
+def test_decisions_follow_utilization_and_expected_wait():
+    nodes = _pipeline(max_requests=4, layer_ms=1.0)
+    # service time 1.2 s, 4 slots -> 3.33 requests/s
+    controller = AdmissionController(
+        window_sec=10.0, expected_output_tokens=100, max_queue_delay_s=2.0
+    )
+    for i in range(10):
+        controller.record_arrival(now=100.0 + i * 0.5)
+    assert controller.decide(nodes, NUM_LAYERS, now=105.0).admitted
+
+    for node in nodes:
+        node.current_requests = 4
+    delayed = controller.decide(nodes, NUM_LAYERS, queued=2, now=105.0)
+    assert delayed.action == "delay"
+    assert abs(delayed.retry_after_s - 3 / (4 / 1.2)) < 1e-9
+
+    rejected = controller.decide(nodes, NUM_LAYERS, queued=20, now=105.0)
+    assert rejected.action == "reject"
+    assert rejected.retry_after_s > controller.max_queue_delay_s
+
+
+def test_sheds_load_above_target_utilization_before_saturation():
+    nodes = _pipeline(max_requests=100, layer_ms=1.0)
+    # 100 slots / 1.2 s -> 83 requests/s; offer twice that
+    controller = AdmissionController(
+        window_sec=1.0, expected_output_tokens=100, max_utilization=0.8, rng=random.Random(0)
+    )
+    for i in range(167):
+        controller.record_arrival(now=10.0 + i / 167)
+
+    decisions = [controller.decide(nodes, NUM_LAYERS, now=11.0) for _ in range(2000)]
+
+    admitted = sum(d.admitted for d in decisions) / len(decisions)
+    assert abs(admitted - 0.8 / 2.0) < 0.05
+    assert all(d.retry_after_s >= controller.min_retry_after_s for d in decisions if not d.admitted)
+
+
+def test_retries_of_a_request_count_as_one_arrival():
+    controller = AdmissionController(window_sec=10.0)
+    for i in range(5):
+        controller.record_arrival(now=100.0 + i, request_id="same")
+    controller.record_arrival(now=105.0, request_id="other")
+
+    assert controller.arrival_rate(now=105.0) == 2 / 10.0
+
+
+def _simulate(rate: float, duration_s: float, seed: int = 0):
+    """Poisson arrivals against one pipeline; clients honor Retry-After, give up on reject."""
+    rng = random.Random(seed)
+    nodes = _pipeline(max_requests=4, layer_ms=1.0)
+    service_s = 1.2
+    controller = AdmissionController(
+        window_sec=5.0,
+        expected_output_tokens=100,
+        max_queue_delay_s=3.0,
+        rng=random.Random(seed),
+    )
+    # (time, kind, first_arrival, request id)
+    events = []
+    t = 0.0
+    while t < duration_s:
+        t += rng.expovariate(rate)
+        heapq.heappush(events, (t, "arrival", t, len(events)))
+
+    latencies, rejected, max_busy = [], 0, 0
+    while events:
+        now, kind, first_arrival, rid = heapq.heappop(events)
+        if kind == "done":
+            for node in nodes:
+                node.remove_request()
+            continue
+        controller.record_arrival(now, request_id=rid)
+        decision = controller.decide(nodes, NUM_LAYERS, now=now, waited_s=now - first_arrival)
+        if decision.admitted:
+            for node in nodes:
+                node.add_request()
+            max_busy = max(max_busy, nodes[0].current_requests)
+            heapq.heappush(events, (now + service_s, "done", first_arrival, rid))
+            latencies.append(now + service_s - first_arrival)
+        elif decision.action == "delay":
+            heapq.heappush(events, (now + decision.retry_after_s, kind, first_arrival, rid))
+        else:
+            rejected += 1
+    return sorted(latencies), rejected, max_busy
+
+
+def test_admitted_latency_stays_bounded_under_overload():
+    """At 3x capacity, admitted requests wait at most about `max_queue_delay_s`."""
+    # 4 slots / 1.2 s -> 3.33 requests/s
+    latencies, rejected, max_busy = _simulate(rate=10.0, duration_s=120.0)
+
+    assert rejected > 0
+    assert max_busy <= 4
+    assert latencies[-1] <= 1.2 + 3.0 + 0.5 + 1e-9
+    # Shedding doesn't starve the cluster
+    assert len(latencies) / 120.0 > 0.5 * 4 / 1.2
+
+
+def test_light_load_is_admitted_immediately():
+    latencies, rejected, _ = _simulate(rate=1.0, duration_s=60.0)
+
+    assert rejected == 0
+    assert sum(latency > 1.2 + 1e-9 for latency in latencies) <= 0.2 * len(latencies)
+
+
+def test_scheduler_resolves_rejected_requests_with_retry_after():
+    model = build_model_info(NUM_LAYERS)
+    n1 = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    set_rtt_from_coords([n1])
+    n1.max_concurrent_requests = 1
+    sched = Scheduler(
+        model,
+        [n1],
+        strategy="greedy",
+        min_nodes_bootstrapping=1,
+        admission_controller=AdmissionController(max_queue_delay_s=0.0),
+    )
+    sched.layer_allocator.global_allocation()
+    n1.is_active = True
+    n1.avg_layer_latency_ms = 0.01
+
+    first, second = RequestSignal("first"), RequestSignal("second")
+    sched.receive_request(first)
+    sched.receive_request(second)
+    assert sched.dispatch_next_request()[1] == ["a100-0"]
+    assert sched.dispatch_next_request()[1] == []
+
+    assert second.routing_future.result(timeout=1.0) == []
+    assert second.rejected
+    assert second.retry_after_s >= sched.admission.min_retry_after_s
+    assert n1.current_requests == 1
@@ -0,0 +1,129 @@
+"""
+Tests for heartbeat deadline tracking and batched event processing in the Scheduler.
+"""
+
+from scheduling.heartbeat import HeartbeatTracker
+from scheduling.scheduler import Scheduler
+
+from .test_utils import build_model_info, build_node, set_rtt_from_coords
+
+
+def test_nodes_expire_when_their_deadline_is_due():
+    tracker = HeartbeatTracker(timeout=10.0)
+    tracker.refresh("a", now=0.0)
+    tracker.refresh("b", now=5.0)
+
+    assert tracker.next_deadline() == 10.0
+    assert tracker.expired(now=9.9) == []
+    assert tracker.expired(now=10.0) == ["a"]
+    assert "a" not in tracker
+    assert tracker.expired(now=14.9) == []
+    assert tracker.expired(now=15.0) == ["b"]
+    assert len(tracker) == 0
+    assert tracker.next_deadline() is None
+
+
+def test_refreshed_nodes_are_rearmed_not_expired():
+    tracker = HeartbeatTracker(timeout=10.0)
+    tracker.refresh("a", now=0.0)
+    for t in range(1, 10):
+        tracker.refresh("a", now=float(t))
+
+    # One heap entry however many heartbeats arrived
+    assert len(tracker._heap) == 1
+    assert tracker.expired(now=10.0) == []
+    assert tracker.next_deadline() == 19.0
+    assert tracker.expired(now=19.0) == ["a"]
+
+
+def test_removed_nodes_never_expire():
+    tracker = HeartbeatTracker(timeout=1.0)
+    tracker.refresh("a", now=0.0)
+    tracker.remove("a")
+    assert tracker.expired(now=5.0) == []
+
+    # Rejoining reuses the stale entry with the new heartbeat time
+    tracker.refresh("a", now=0.5)
+    tracker.remove("a")
+    tracker.refresh("a", now=4.0)
+    assert tracker.expired(now=4.5) == []
+    assert tracker.expired(now=5.0) == ["a"]
+
+
+def test_expiry_pops_only_due_entries_in_a_large_fleet():
+    tracker = HeartbeatTracker(timeout=60.0)
+    for i in range(5000):
+        tracker.refresh(f"node-{i}", now=i * 0.01)
+
+    assert tracker.expired(now=60.0 + 9 * 0.01) == [f"node-{i}" for i in range(10)]
+    assert len(tracker._heap) == 4990
+
+
+def _scheduler(heartbeat_timeout=10.0, **kwargs):
+    model = build_model_info(12)
+    n1 = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    n2 = build_node("a100-1", model, tflops=312.0, mem_gb=80.0, x=1, y=0)
+    set_rtt_from_coords([n1, n2])
+    sched = Scheduler(
+        model,
+        [n1, n2],
+        strategy="greedy",
+        min_nodes_bootstrapping=1,
+        heartbeat_timeout=heartbeat_timeout,
+        **kwargs,
+    )
+    sched.layer_allocator.global_allocation()
+    for node in (n1, n2):
+        node.is_active = True
+    return sched, n1, n2
+
+
+def test_scheduler_evicts_only_silent_active_nodes():
+    sched, n1, n2 = _scheduler()
+    sched.enqueue_node_update(n2.node_id, current_requests=0)
+    sched._process_node_updates()
+    now = n2.last_heartbeat + 10.0
+
+    n1.is_active = False
+    sched.checking_node_heartbeat(now=now)
+    assert n1.node_id in sched.node_id_to_node
+
+    n1.is_active = True
+    sched.checking_node_heartbeat(now=now + 10.0)
+    assert n1.node_id not in sched.node_id_to_node
+    assert n2.node_id not in sched.node_id_to_node
+
+
+def test_node_updates_are_merged_per_node_within_a_batch():
+    sched, n1, n2 = _scheduler(event_batch_size=3)
+    applied = []
+    apply_node_update = sched._apply_node_update
+
+    def record(node, **fields):
+        applied.append((node.node_id, fields))
+        apply_node_update(node, **fields)
+
+    sched._apply_node_update = record
+    sched.enqueue_node_update(n1.node_id, current_requests=1, layer_latency_ms=2.0)
+    sched.enqueue_node_update(n1.node_id, current_requests=3)
+    sched.enqueue_node_update(n2.node_id, is_active=False)
+    sched.enqueue_node_update(n2.node_id, current_requests=4)
+
+    assert sched._process_node_updates()
+    assert applied == [
+        (
+            n1.node_id,
+            dict(current_requests=3, layer_latency_ms=2.0, new_rtt_to_nodes=None, is_active=None),
+        ),
+        (
+            n2.node_id,
+            dict(
+                current_requests=None,
+                layer_latency_ms=None,
+                new_rtt_to_nodes=None,
+                is_active=False,
+            ),
+        ),
+    ]
+    assert not sched._process_node_updates()
+    assert n2.current_requests == 4
@@ -315,3 +315,55 @@ def test_allocator_does_not_duplicate_leftover_nodes(strategy: Literal["greedy",
     ok = alloc.global_allocation()
     assert ok is True
     assert len(alloc.nodes) == expected_node_count, "Should not duplicate nodes during allocation"
+
+
+def test_node_capacity_model_memoizes_until_inputs_change(monkeypatch):
+    """Derived capacity is computed once per (hardware, layer range, model) key."""
+    import scheduling.node as node_module
+
+    calls = []
+    original = node_module.compute_max_batch_size
+
+    def counting_compute_max_batch_size(**kwargs):
+        calls.append(kwargs["num_shard_layers"])
+        return original(**kwargs)
+
+    monkeypatch.setattr(node_module, "compute_max_batch_size", counting_compute_max_batch_size)
+
+    model = build_model_info(36)
+    node = _build_node("a100-80g", model)
+    node.set_layer_allocation(0, 10)
+    first = node.max_requests
+    for _ in range(5):
+        assert node.max_requests == first
+        _ = node.is_overloaded
+        _ = node.layer_latency_ms
+    assert calls == [10]
+
+    # Changing the layer range invalidates the cache
+    node.set_layer_allocation(0, 4)
+    assert node.max_requests >= first
+    assert calls == [10, 4]
+    assert node.max_kv_tokens > 0
+
+    # Hardware changes invalidate as well
+    node.hardware.memory_gb = 40.0
+    _ = node.max_requests
+    assert calls == [10, 4, 4]
+
+
+def test_dp_time_budget_returns_best_allocation_found_so_far():
+    """An exhausted time budget still yields a full allocation from the k searched so far."""
+    import time
+
+    model = build_model_info(36)
+    gpu_types = ["a100-80g", "a100-40g", "rtx5090", "rtx4090"]
+    nodes = [
+        _build_node(gpu_types[i % len(gpu_types)], model, id_suffix=f"-{i}") for i in range(40)
+    ]
+    # Without a budget this fleet takes seconds; only k=1 is searched here
+    alloc = DynamicProgrammingLayerAllocator(model, nodes, time_budget_s=0.0)
+    start = time.monotonic()
+    assert alloc.global_allocation() is True
+    assert time.monotonic() - start < 1.0
+    assert alloc.has_full_pipeline()
@@ -0,0 +1,200 @@
+"""
+Tests for incremental rebalancing: minimum-movement matching and staged transitions.
+
+Covers:
+- Re-matching target ranges among equivalent nodes (no-op when only labels differ)
+- Stages that keep a full pipeline serving
+- Scheduler-driven staged rebalance over synthetic join/leave sequences
+"""
+
+import random
+
+import pytest
+
+from scheduling.rebalance_planner import (
+    LayerMove,
+    RebalancePlanner,
+    _min_cost_assignment,
+    has_full_pipeline,
+)
+from scheduling.scheduler import Scheduler
+
+from .test_layer_allocation import _build_node
+from .test_utils import build_model_info
+
+
+def test_min_cost_assignment_is_optimal():
+    rng = random.Random(0)
+    from itertools import permutations
+
+    for n in range(1, 6):
+        cost = [[rng.randint(0, 9) for _ in range(n)] for _ in range(n)]
+        assignment = _min_cost_assignment(cost)
+        assert sorted(assignment) == list(range(n))
+        best = min(sum(cost[i][p[i]] for i in range(n)) for p in permutations(range(n)))
+        assert sum(cost[i][assignment[i]] for i in range(n)) == best
+
+
+def test_has_full_pipeline():
+    assert has_full_pipeline([(0, 4), (4, 12)], 12)
+    assert has_full_pipeline([(0, 6), (0, 4), (4, 12)], 12)
+    assert not has_full_pipeline([(0, 6), (4, 12)], 12)
+    assert not has_full_pipeline([], 12)
+
+
+def test_equivalent_nodes_keep_their_ranges():
+    """A target that only swaps ranges between identical nodes needs no moves."""
+    model = build_model_info(12)
+    nodes = [_build_node("a100-40g", model, id_suffix=f"-{i}") for i in range(4)]
+    current = {
+        "a100-40g-0": (0, 6),
+        "a100-40g-1": (6, 12),
+        "a100-40g-2": (0, 6),
+        "a100-40g-3": (6, 12),
+    }
+    target = {
+        "a100-40g-0": (6, 12),
+        "a100-40g-1": (0, 6),
+        "a100-40g-2": (6, 12),
+        "a100-40g-3": (0, 6),
+    }
+
+    plan = RebalancePlanner(12).plan(nodes, current, target)
+
+    assert plan.stages == []
+    assert plan.target == current
+
+
+def test_partial_overlap_prefers_node_holding_most_layers():
+    model = build_model_info(12)
+    nodes = [_build_node("a100-40g", model, id_suffix=f"-{i}") for i in range(2)]
+    current = {"a100-40g-0": (0, 6), "a100-40g-1": (6, 12)}
+    target = {"a100-40g-0": (5, 12), "a100-40g-1": (0, 5)}
+
+    plan = RebalancePlanner(12).plan(nodes, current, target)
+
+    assert plan.target == {"a100-40g-0": (0, 5), "a100-40g-1": (5, 12)}
+    assert plan.layers_to_load == 1
+
+
+def test_stages_keep_a_full_pipeline():
+    """The only pipeline moves one node at a time while the spare nodes take over."""
+    model = build_model_info(12)
+    nodes = [_build_node("a100-40g", model, id_suffix=f"-{i}") for i in range(4)]
+    nodes.append(_build_node("a100-80g", model, id_suffix="-4"))
+    current = {"a100-40g-0": (0, 6), "a100-40g-1": (6, 12), "a100-80g-4": (0, 12)}
+    target = {
+        "a100-40g-0": (0, 4),
+        "a100-40g-1": (4, 8),
+        "a100-40g-2": (8, 12),
+        "a100-80g-4": (0, 10),
+        "a100-40g-3": (10, 12),
+    }
+
+    plan = RebalancePlanner(12).plan(nodes, current, target)
+
+    assert len(plan.stages) > 1
+    serving = dict(current)
+    for stage in plan.stages:
+        moving = {move.node_id for move in stage}
+        assert has_full_pipeline([r for node_id, r in serving.items() if node_id not in moving], 12)
+        for move in stage:
+            serving[move.node_id] = move.target
+    assert serving == {k: v for k, v in plan.target.items() if v is not None}
+
+
+def _finish_loading(sched: Scheduler) -> None:
+    """Lets every node of the applied stage report its new range active, then advances."""
+    for node_id, (start, end) in list(sched._rebalance_loading.items()):
+        sched.enqueue_node_update(node_id, is_active=True, start_layer=start, end_layer=end)
+    sched._process_node_updates()
+    sched._advance_rebalance()
+
+
+def test_stage_waits_for_nodes_to_report_their_target_range():
+    """Metrics deltas and heartbeats for the old range don't finish a move."""
+    model = build_model_info(12)
+    nodes = [_build_node("a100-40g", model, id_suffix=f"-{i}") for i in range(3)]
+    sched = Scheduler(model, nodes, strategy="greedy", min_nodes_bootstrapping=1)
+    allocator = sched.layer_allocator
+    for node in nodes:
+        if node.start_layer is not None:
+            allocator.deallocate(node)
+    for node, (start, end) in zip(nodes, [(0, 12), (0, 6), (6, 12)]):
+        allocator.allocate(node, start, end)
+        node.is_active = True
+    # Node 1 takes over the whole model, then node 0 is released
+    sched._rebalance_stages.extend(
+        [
+            [LayerMove(nodes[1].node_id, (0, 6), (0, 12), 1.0)],
+            [LayerMove(nodes[0].node_id, (0, 12), None, 0.0)],
+        ]
+    )
+    sched._apply_next_rebalance_stage()
+    moving = nodes[1].node_id
+    assert not nodes[1].is_active
+
+    sched.enqueue_node_update(moving, current_requests=0)
+    sched.enqueue_node_update(moving, is_active=True, start_layer=0, end_layer=6)
+    sched._process_node_updates()
+    sched._advance_rebalance()
+    assert not nodes[1].is_active
+    assert nodes[0].start_layer == 0 and len(sched._rebalance_stages) == 1
+
+    sched.enqueue_node_update(moving, is_active=False, start_layer=0, end_layer=12)
+    sched._process_node_updates()
+    sched._advance_rebalance()
+    assert len(sched._rebalance_stages) == 1
+
+    sched.enqueue_node_update(moving, is_active=True, start_layer=0, end_layer=12)
+    sched._process_node_updates()
+    sched._advance_rebalance()
+    assert nodes[1].is_active
+    assert not sched._rebalance_stages
+    assert nodes[0].start_layer is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scheduler_staged_rebalance_on_synthetic_churn(seed: int):
+    rng = random.Random(seed)
+    model = build_model_info(24)
+    gpu_types = ["a100-80g", "a100-40g", "rtx5090", "rtx4090"]
+    nodes = [_build_node(rng.choice(gpu_types), model, id_suffix=f"-{i}") for i in range(10)]
+    # rebalance_threshold=0 makes every leave rebalance
+    sched = Scheduler(model, nodes, strategy="dp", rebalance_threshold=0.0)
+    assert sched.bootstrap()
+    for node in sched.nodes:
+        node.is_active = True
+
+    for step in range(6):
+        ranges_before = {node_id: (s, e) for node_id, s, e in sched.list_node_allocations()}
+        if step % 2 == 0:
+            leaving = rng.choice(sched.nodes).node_id
+            ranges_before.pop(leaving, None)
+            sched.leave(leaving)
+        else:
+            joining = _build_node(rng.choice(gpu_types), model, id_suffix=f"-join-{step}")
+            sched.join(joining)
+            ranges_before[joining.node_id] = (joining.start_layer, joining.end_layer)
+            sched.rebalance()
+        had_pipeline = has_full_pipeline(ranges_before.values(), model.num_layers)
+
+        moved = set()
+        while sched._rebalance_stages or sched._rebalance_loading:
+            if had_pipeline:
+                assert sched.layer_allocator.has_full_pipeline(active_only=True)
+            moved.update(sched._rebalance_loading)
+            _finish_loading(sched)
+
+        assert sched.layer_allocator.has_full_pipeline(active_only=True)
+        ranges_after = {node_id: (s, e) for node_id, s, e in sched.list_node_allocations()}
+        loaded = 0
+        for node_id, (start, end) in ranges_after.items():
+            old = ranges_before.get(node_id)
+            overlap = 0 if old is None else max(0, min(old[1], end) - max(old[0], start))
+            loaded += end - start - overlap
+            if node_id not in moved:
+                assert old == (start, end)
+        assert loaded <= sum(end - start for start, end in ranges_after.values())
+        for node in sched.nodes:
+            node.is_active = True
@@ -4,15 +4,19 @@ Unit tests for request routing strategies.
 Covers:
 - Shard-level DP path using `Node` APIs (latency + RTT)
 - Turning point detection via layer-level DP
+- Incremental updates of the NumPy layer routing table on synthetic fleets
 - Parametrized scenarios with different splits/overlaps
 - Round-robin baseline pipeline routing and overload skipping
+- Epoch-versioned pipeline registry invalidation
 """
 
 import pytest
 
+from scheduling.layer_allocation import BaseLayerAllocator
 from scheduling.node import Node
 from scheduling.request_routing import (
     DynamicProgrammingRouting,
+    LayerRoutingTable,
     RoundRobinPipelineRouting,
 )
 
@@ -281,3 +285,158 @@ def test_round_robin_pipeline_discovery_overlapping_heads_and_tails():
     )
     has_expected2 = any(matches_path(r, expected2) for r in ranges)
     assert has_expected1 and has_expected2
+
+
+def _build_layer_fleet(num_layers: int, num_nodes: int, seed: int) -> list[Node]:
+    """Synthetic fleet with overlapping random layer ranges covering [0, L)."""
+    import random
+
+    rng = random.Random(seed)
+    model = build_model(num_layers)
+    nodes: list[Node] = []
+    for i in range(num_nodes):
+        n = build_node(
+            f"n{i}",
+            model,
+            mem_bandwidth_gbps=rng.uniform(50.0, 3000.0),
+            x=rng.random(),
+            y=rng.random(),
+        )
+        if i < 2:
+            # Guarantee coverage with two full-range nodes
+            start, end = 0, num_layers
+        else:
+            start = rng.randrange(0, num_layers - 1)
+            end = rng.randrange(start + 1, num_layers + 1)
+        n.set_layer_allocation(start, end)
+        nodes.append(n)
+    set_rtt_from_coords(nodes)
+    return nodes
+
+
+def test_layer_routing_table_incremental_matches_rebuild():
+    """Incremental latency/RTT updates yield the same DP result as a fresh table."""
+    num_layers = 24
+    nodes = _build_layer_fleet(num_layers, num_nodes=40, seed=7)
+
+    table = LayerRoutingTable()
+    table.sync(nodes, num_layers)
+    assert table.best_path()
+
+    # Mutate one node's latency and another's RTTs, then notify the table
+    slow = nodes[5]
+    slow.set_layer_latency_ms(1e-4)
+    table.sync(nodes, num_layers)
+    moved = nodes[11]
+    for other in nodes:
+        if other is not moved:
+            moved.update_rtt(other.node_id, 1.0)
+            other.update_rtt(moved.node_id, 1.0)
+    table.update_node(moved)
+
+    fresh = LayerRoutingTable()
+    fresh.rebuild(nodes, num_layers)
+    assert table.best_path() == fresh.best_path()
+    assert set(table.turning_points()) == set(fresh.turning_points())
+    assert set(table.turning_points()) == set(
+        DynamicProgrammingRouting.find_turning_points(nodes, num_layers)
+    )
+
+
+def test_layer_routing_table_rebuilds_on_allocation_change():
+    """Changing a node's layer range is detected by `sync` and rebuilds the table."""
+    num_layers = 10
+    model = build_model(num_layers)
+    head = build_node("head", model, mem_bandwidth_gbps=1.0, x=0.0, y=0.0)
+    tail = build_node("tail", model, mem_bandwidth_gbps=3000.0, x=0.01, y=0.0)
+    head.set_layer_allocation(0, 6)
+    tail.set_layer_allocation(4, 10)
+    nodes = [head, tail]
+    set_rtt_from_coords(nodes)
+
+    table = LayerRoutingTable()
+    table.sync(nodes, num_layers)
+    assert set(table.turning_points()) == {("head", 4, "tail")}
+
+    tail.set_layer_allocation(6, 10)
+    table.sync(nodes, num_layers)
+    assert table.turning_points() == []
+
+
+def test_layer_routing_table_unreachable_layer():
+    """A layer without any host yields no path and no turning points."""
+    num_layers = 8
+    model = build_model(num_layers)
+    a = build_node("a", model)
+    b = build_node("b", model, x=1.0)
+    a.set_layer_allocation(0, 3)
+    b.set_layer_allocation(4, 8)
+    set_rtt_from_coords([a, b])
+
+    table = LayerRoutingTable()
+    table.sync([a, b], num_layers)
+    assert table.best_path() == []
+    assert table.turning_points() == []
+
+
+def test_round_robin_rediscovers_only_when_allocation_epoch_moves():
+    """Pipelines are cached per allocator epoch; a leave invalidates them immediately."""
+    num_layers = 12
+    model = build_model(num_layers)
+    a = build_node("a", model, tflops=200.0, x=0.0, y=0.0)
+    b = build_node("b", model, tflops=200.0, x=1.0, y=0.0)
+    c = build_node("c", model, tflops=220.0, x=0.0, y=1.0)
+    d = build_node("d", model, tflops=220.0, x=1.0, y=1.0)
+    nodes = [a, b, c, d]
+    allocator = BaseLayerAllocator(model, nodes)
+    allocator.allocate(a, 0, 6)
+    allocator.allocate(b, 6, 12)
+    allocator.allocate(c, 0, 4)
+    allocator.allocate(d, 4, 12)
+    set_rtt_from_coords(nodes)
+
+    rr = RoundRobinPipelineRouting(allocation_epoch=lambda: allocator.allocation_epoch)
+    discoveries = []
+    original_discovery = rr.pipeline_discovery
+
+    def counting_discovery(ns, nl):
+        discoveries.append(1)
+        return original_discovery(ns, nl)
+
+    rr.pipeline_discovery = counting_discovery  # type: ignore[method-assign]
+
+    for _ in range(4):
+        node_ids, _ = rr.find_optimal_path(allocator.nodes, num_layers)
+        assert node_ids in (["a", "b"], ["c", "d"])
+    assert len(discoveries) == 1
+
+    allocator.leave("b")
+    for _ in range(3):
+        node_ids, _ = rr.find_optimal_path(allocator.nodes, num_layers)
+        assert node_ids == ["c", "d"]
+    assert len(discoveries) == 2
+
+
+def test_round_robin_latency_aggregate_tracks_node_updates():
+    """Cached pipeline latency is refreshed after `notify_node_update`."""
+    num_layers = 10
+    model = build_model(num_layers)
+    a = build_node("a", model, tflops=200.0, x=0.0, y=0.0)
+    b = build_node("b", model, tflops=200.0, x=1.0, y=0.0)
+    a.set_layer_allocation(0, 5)
+    b.set_layer_allocation(5, 10)
+    nodes = [a, b]
+    set_rtt_from_coords(nodes)
+
+    rr = RoundRobinPipelineRouting()
+    _, latency = rr.find_optimal_path(nodes, num_layers)
+    assert latency == pytest.approx(
+        float(a.layer_latency_ms) + float(a.get_rtt_to(b)) + float(b.layer_latency_ms)
+    )
+
+    b.set_layer_latency_ms(50.0)
+    rr.notify_node_update(b)
+    _, latency = rr.find_optimal_path(nodes, num_layers)
+    assert latency == pytest.approx(
+        float(a.layer_latency_ms) + float(a.get_rtt_to(b)) + float(b.layer_latency_ms)
+    )
@@ -4,6 +4,11 @@ Minimal tests for the Scheduler orchestrator.
 
 from __future__ import annotations
 
+import asyncio
+import threading
+import time
+
+from scheduling.admission import AdmissionController
 from scheduling.node import RequestSignal
 from scheduling.scheduler import Scheduler
 
@@ -239,3 +244,129 @@ def test_scheduler_three_nodes_sequential_join_leave_rejoin():
     # Verify full pipeline coverage
     total_covered = sum(e - s for _, s, e in allocations)
     assert total_covered >= model.num_layers, "All layers should be covered"
+
+
+def test_scheduler_resolves_routing_futures_for_concurrent_waiters():
+    """Dispatcher completes each request's future; asyncio waiters need no extra threads."""
+    model = build_model_info(12)
+    n1 = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    n2 = build_node("a100-1", model, tflops=312.0, mem_gb=80.0, x=1, y=0)
+    set_rtt_from_coords([n1, n2])
+    for n in (n1, n2):
+        n.max_concurrent_requests = 10_000
+    # The burst is far above the arrival rate the admission controller would let through
+    sched = Scheduler(
+        model,
+        [n1, n2],
+        strategy="greedy",
+        min_nodes_bootstrapping=1,
+        admission_controller=AdmissionController(max_utilization=float("inf")),
+    )
+
+    runner = threading.Thread(target=sched.run, kwargs={"poll_interval": 0.01}, daemon=True)
+    runner.start()
+    try:
+        assert sched._bootstrapped_event.wait(timeout=5.0)  # type: ignore[attr-defined]
+        threads_before = threading.active_count()
+
+        async def wait_one(i: int):
+            req = RequestSignal(request_id=f"req-{i}")
+            sched.receive_request(req)
+            return await asyncio.wait_for(asyncio.wrap_future(req.routing_future), 5.0)
+
+        async def wait_all():
+            return await asyncio.gather(*(wait_one(i) for i in range(2000)))
+
+        paths = asyncio.run(wait_all())
+        assert all(path for path in paths)
+        assert threading.active_count() <= threads_before + 1
+    finally:
+        sched.stop()
+        runner.join(timeout=5.0)
+
+
+def test_scheduler_skips_cancelled_requests():
+    """A request whose waiter gave up is not routed and does not add node load."""
+    model = build_model_info(12)
+    n1 = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    set_rtt_from_coords([n1])
+    sched = Scheduler(model, [n1], strategy="greedy", min_nodes_bootstrapping=1)
+    sched.layer_allocator.global_allocation()
+
+    req = RequestSignal(request_id="gone")
+    sched.receive_request(req)
+    req.routing_future.cancel()
+    assert sched.dispatch_next_request() is None
+    assert req.routing_table is None
+    assert n1.current_requests == 0
+
+
+def test_scheduler_reports_freed_capacity():
+    """Node updates with fewer requests (or a node becoming active) notify the listener."""
+    model = build_model_info(12)
+    n1 = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    set_rtt_from_coords([n1])
+    freed = []
+    sched = Scheduler(
+        model, [n1], strategy="greedy", min_nodes_bootstrapping=1, on_capacity_freed=freed.append
+    )
+    sched.layer_allocator.global_allocation()
+
+    sched.update_node_info(n1, current_requests=5, is_active=True)
+    assert freed == [n1.max_requests - 5]
+    sched.update_node_info(n1, current_requests=2)
+    sched.update_node_info(n1, current_requests=4)
+    assert freed == [n1.max_requests - 5, 3]
+
+
+def test_finished_request_wakes_one_waiter_per_freed_pipeline_slot():
+    """Every node of a pipeline reports the finished request; only one slot freed up."""
+    model = build_model_info(12)
+    n1 = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    n2 = build_node("a100-1", model, tflops=312.0, mem_gb=80.0, x=1, y=0)
+    set_rtt_from_coords([n1, n2])
+    freed = []
+    sched = Scheduler(
+        model,
+        [n1, n2],
+        strategy="greedy",
+        min_nodes_bootstrapping=1,
+        on_capacity_freed=freed.append,
+    )
+    n1.set_layer_allocation(0, 6)
+    n2.set_layer_allocation(6, 12)
+    for node in (n1, n2):
+        node.is_active = True
+        node.max_concurrent_requests = 4
+        node.current_requests = 4
+
+    # Applied one at a time: the first node alone frees nothing usable
+    sched.update_node_info(n1, current_requests=3)
+    assert freed == []
+    sched.update_node_info(n2, current_requests=3)
+    assert freed == [1]
+
+    # Applied as one batch by the event loop
+    sched.enqueue_node_update(n1.node_id, current_requests=1)
+    sched.enqueue_node_update(n2.node_id, current_requests=1)
+    sched._process_node_updates()
+    assert freed == [1, 2]
+
+
+def test_large_fleet_bootstraps_within_the_allocation_time_budget():
+    """The DP allocator's search stops at the scheduler's time budget on large fleets."""
+    model = build_model_info(36)
+    gpus = [(312.0, 80.0), (312.0, 40.0), (165.0, 32.0), (82.6, 24.0)]
+    nodes = []
+    for i in range(100):
+        tflops, mem_gb = gpus[i % len(gpus)]
+        nodes.append(build_node(f"node-{i}", model, tflops, mem_gb, x=i % 10, y=i // 10))
+    set_rtt_from_coords(nodes)
+
+    # The exhaustive search takes seconds from about 35 such nodes on
+    sched = Scheduler(model, nodes, strategy="dp", allocation_time_budget_s=0.5)
+    assert sched.layer_allocator.time_budget_s == 0.5
+    start = time.monotonic()
+    assert sched.bootstrap()
+    assert time.monotonic() - start < 2.0
+    assert sched.layer_allocator.has_full_pipeline()
@@ -1,4 +1,11 @@
-from parallax.server.request import InitialRequest, Request, RequestStatus
+import mlx.core as mx
+
+from parallax.server.request import (
+    InitialRequest,
+    IntermediateRequest,
+    Request,
+    RequestStatus,
+)
 from parallax.server.scheduler import Scheduler
 
 
@@ -6,6 +13,8 @@ class FakeKVCacheManager:
     def __init__(self, allow: bool = True):
         self.allow = allow
         self._reqs = set()
+        # Tokens written per request, i.e. prefill progress
+        self.lengths = {}
 
     def has_request(self, request_id: str) -> bool:
         return request_id in self._reqs
@@ -16,6 +25,9 @@ class FakeKVCacheManager:
         self._reqs.add(request.request_id)
         return True
 
+    def request_length(self, request_id: str) -> int:
+        return self.lengths.get(request_id, 0)
+
 
 def make_prefill(rid: str, prompt_len: int) -> InitialRequest:
     return InitialRequest(request_id=rid, input_ids=[0] * prompt_len)
@@ -105,3 +117,74 @@ def test_kv_cache_admission_guard_blocks_prefill():
     batch = sched.form_batch()
     assert len(batch) == 0
     assert sched.num_running_requests == 0
+
+
+def test_chunked_prefill_splits_long_prompt_and_keeps_decodes():
+    kv_mgr = FakeKVCacheManager()
+    sched = Scheduler(
+        max_batch_size=4,
+        max_num_tokens_per_batch=8,
+        micro_batch_ratio=1,
+        kv_cache_manager=kv_mgr,
+    )
+    d = make_decode("d")
+    sched._running_requests[d.request_id] = d
+    sched.enque_request(d)
+    p = make_prefill("p", 20)
+    sched.enque_request(p)
+
+    batch = sched.form_batch()
+    assert [r.request_id for r in batch] == ["p", "d"]
+    # One token of the budget is reserved for the ready decode
+    assert (p.prefill_offset, p.prefill_chunk_len) == (0, 7)
+    assert p.is_partial_prefill
+
+    # The executor writes the chunk to the KV cache and re-enqueues the prompt
+    kv_mgr.lengths["p"] = 7
+    sched.enque_request(p)
+    batch = sched.form_batch()
+    assert [r.request_id for r in batch] == ["p"]
+    assert (p.prefill_offset, p.prefill_chunk_len) == (7, 8)
+
+    kv_mgr.lengths["p"] = 15
+    sched.enque_request(p)
+    sched.form_batch()
+    assert (p.prefill_offset, p.prefill_chunk_len) == (15, 5)
+    assert not p.is_partial_prefill
+    assert sched.num_queued_requests == 0
+
+
+def test_chunked_prefill_disabled_without_kv_cache_manager():
+    sched = Scheduler(max_batch_size=2, max_num_tokens_per_batch=4, micro_batch_ratio=1)
+    sched.enque_request(make_prefill("p", 10))
+    assert sched.form_batch() == []
+
+
+def test_downstream_prefill_chunks_run_in_arrival_order():
+    sched = Scheduler(
+        max_batch_size=2,
+        max_num_tokens_per_batch=16,
+        micro_batch_ratio=1,
+        kv_cache_manager=FakeKVCacheManager(),
+    )
+
+    def make_chunk(end: int, length: int) -> IntermediateRequest:
+        return IntermediateRequest(
+            request_id="p",
+            current_position=end,
+            input_ids=[0] * 12,
+            hidden_states=mx.zeros((length, 4)),
+        )
+
+    c1, c2, c3 = make_chunk(4, 4), make_chunk(8, 4), make_chunk(12, 4)
+    for chunk in (c1, c2, c3):
+        sched.enque_request(chunk)
+
+    seen = []
+    for _ in range(3):
+        batch = sched.form_batch()
+        assert len(batch) == 1
+        seen.append(batch[0])
+    assert seen == [c1, c2, c3]
+    assert [c.is_partial_prefill for c in seen] == [True, True, False]
+    assert sched.form_batch() == []
@@ -0,0 +1,145 @@
+"""
+Tests for mixed prefill + decode passes and chunked prefill on the MLX executor,
+using a tiny random Qwen3 checkpoint.
+"""
+
+import json
+from unittest.mock import patch
+
+import mlx.core as mx
+import pytest
+
+import parallax.server.executor as executor_mod
+from parallax.server.executor import Executor
+from parallax.server.request import InitialRequest
+from parallax.server.sampling.sampling_params import SamplingParams
+
+from .test_shard_loader import _write_tiny_checkpoint
+
+EOS_TOKEN_ID = 14
+SHORT_PROMPTS = [[3, 1, 4], [5], [9, 9, 9]]
+LONG_PROMPT = [2, 7, 1, 8, 2, 8, 1, 8, 2, 8, 4, 5, 9, 0, 4, 5, 2, 3, 5, 3]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    model_dir = tmp_path_factory.mktemp("tiny-qwen3")
+    _write_tiny_checkpoint(model_dir, tie_word_embeddings=False)
+    config = json.loads((model_dir / "config.json").read_text())
+    config["eos_token_id"] = EOS_TOKEN_ID
+    (model_dir / "config.json").write_text(json.dumps(config))
+    return model_dir
+
+
+def _make_executor(model_dir, enable_mixed_batch, max_num_tokens_per_batch):
+    """Builds a single-peer MLX executor holding every layer of the checkpoint."""
+    with (
+        patch.object(executor_mod, "get_current_device", lambda: "mlx"),
+        patch.object(mx.metal, "device_info", lambda: {"max_recommended_working_set_size": 0}),
+        patch.object(mx, "set_wired_limit", lambda limit: 0),
+        patch("parallax.server.kv_cache.compute_max_tokens_in_cache", lambda **kwargs: 10**6),
+    ):
+        executor = Executor(
+            model_repo=str(model_dir),
+            start_layer=0,
+            end_layer=4,
+            dtype="float32",
+            max_batch_size=8,
+            max_tokens_in_kv_pool=1024,
+            max_num_tokens_per_batch=max_num_tokens_per_batch,
+            scheduler_wait_ms=0,
+        )
+    # The word-level tokenizer has neither a pad nor an eos token
+    executor.pad_token_id = 0
+    executor.enable_mixed_batch = enable_mixed_batch
+    return executor
+
+
+def _make_request(request_id, prompt, max_new_tokens):
+    return InitialRequest(
+        request_id=request_id,
+        input_ids=list(prompt),
+        sampling_params=SamplingParams(temperature=0.0),
+        max_new_tokens=max_new_tokens,
+    )
+
+
+def _run(executor, requests, arrivals, max_steps=64):
+    """Steps the executor until every request finishes.
+
+    `arrivals` maps a step number to the requests submitted before it. Returns the
+    kind of every forward pass that ran.
+    """
+    passes = []
+    for step in range(max_steps):
+        executor._handle_input_requests(arrivals.get(step, []))
+        if step > max(arrivals) and all(req.is_finished for req in requests):
+            break
+        executor.scheduler.admit_requests()
+        batch = executor.scheduler.form_batch()
+        inputs = executor._prepare_batch_inputs(batch)
+        if inputs is None:
+            continue
+        for kind in ("mixed_batch", "prefill_batch", "decode_batch"):
+            prepared = inputs[kind]
+            if prepared is None:
+                continue
+            passes.append(kind)
+            tokens = executor.process_batch(prepared, return_decoded_tokens=True)
+            next_requests = executor._prepare_next_batch_requests(
+                requests=prepared["requests"], hidden_states=tokens, lengths=prepared["lengths"]
+            )
+            executor._handle_input_requests(next_requests)
+            # Partially prefilled prompts queue their next chunk, as in run_loop
+            for req in prepared["requests"]:
+                if req.is_partial_prefill:
+                    executor.scheduler.enque_request(req)
+    assert all(req.is_finished for req in requests)
+    return passes
+
+
+def _greedy_reference(model_dir, prompt, max_new_tokens):
+    """Greedy decoding by re-running the whole sequence through the full model."""
+    from mlx_lm.utils import load_model
+
+    model, _ = load_model(model_dir)
+    tokens = list(prompt)
+    for _ in range(max_new_tokens):
+        logits = model(mx.array([tokens]))
+        tokens.append(int(mx.argmax(logits[0, -1])))
+        if tokens[-1] == EOS_TOKEN_ID:
+            break
+    return tokens[len(prompt) :]
+
+
+@pytest.mark.parametrize("enable_mixed_batch", [True, False])
+def test_chunked_prefill_next_to_decodes_matches_reference(model_dir, enable_mixed_batch):
+    executor = _make_executor(model_dir, enable_mixed_batch, max_num_tokens_per_batch=16)
+    short = _make_request("short", SHORT_PROMPTS[0], max_new_tokens=8)
+    long = _make_request("long", LONG_PROMPT, max_new_tokens=4)
+
+    # The long prompt arrives while the short one decodes and is prefilled in two chunks;
+    # the last one is small enough to share a pass with the decode
+    passes = _run(executor, [short, long], arrivals={0: [short], 2: [long]})
+
+    if enable_mixed_batch:
+        assert "mixed_batch" in passes
+    else:
+        assert "mixed_batch" not in passes
+    assert short.output_ids == _greedy_reference(model_dir, SHORT_PROMPTS[0], 8)
+    assert long.output_ids == _greedy_reference(model_dir, LONG_PROMPT, 4)
+
+
+def test_mixed_pass_is_skipped_when_decodes_would_be_mostly_padding(model_dir):
+    executor = _make_executor(model_dir, enable_mixed_batch=True, max_num_tokens_per_batch=64)
+    shorts = [_make_request(f"short-{i}", p, 6) for i, p in enumerate(SHORT_PROMPTS)]
+    prompt = LONG_PROMPT[:10]
+    medium = _make_request("medium", prompt, max_new_tokens=2)
+
+    # Three decodes padded to a 10-token prompt would be 40 positions for 13 tokens
+    passes = _run(executor, [*shorts, medium], arrivals={0: shorts, 2: [medium]})
+
+    assert "mixed_batch" not in passes
+    for req in shorts:
+        assert req.output_ids == _greedy_reference(model_dir, req.input_ids, 6)
+    assert medium.output_ids == _greedy_reference(model_dir, prompt, 2)
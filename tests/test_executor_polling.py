@@ -0,0 +1,122 @@
+"""
+Tests for the executor's idle wait on its receiving sockets, using inproc sockets.
+"""
+
+import threading
+import time
+from itertools import count
+
+import pytest
+import zmq
+
+from parallax.p2p.message_util import abort_request_to_proto
+from parallax.server.executor import IDLE_POLL_TIMEOUT_MS, Executor
+from parallax.server.request import IntermediateRequest, RequestStatus
+
+_endpoint_ids = count()
+
+
+class _IdleScheduler:
+    def __init__(self):
+        self.iterations = 0
+
+    def admit_requests(self):
+        pass
+
+    def get_timed_out_requests(self):
+        return []
+
+    def form_batch(self):
+        self.iterations += 1
+        return []
+
+
+@pytest.fixture
+def executor():
+    """An Executor with only its receiving sockets, bound to inproc endpoints."""
+    ctx = zmq.Context()
+    ex = Executor.__new__(Executor)
+    ex.tp_rank, ex.tp_size = 0, 1
+    ex.is_first_peer, ex.is_last_peer = True, False
+    ex.start_layer, ex.end_layer = 0, 1
+    ex.gradient_server, ex.finished_batch = None, []
+    ex.scheduler = _IdleScheduler()
+    ex.handled = []
+    ex._handle_raw_request = lambda raw: raw
+    ex._handle_input_requests = lambda reqs: reqs and ex.handled.append(list(reqs))
+
+    endpoint_id = next(_endpoint_ids)
+    ex.recv_from_ipc_socket = ctx.socket(zmq.PULL)
+    ex.recv_from_ipc_socket.bind(f"inproc://http-{endpoint_id}")
+    ex.recv_from_peer_socket = ctx.socket(zmq.PULL)
+    ex.recv_from_peer_socket.bind(f"inproc://peer-{endpoint_id}")
+    ex.poller = zmq.Poller()
+    ex.poller.register(ex.recv_from_ipc_socket, zmq.POLLIN)
+    ex.poller.register(ex.recv_from_peer_socket, zmq.POLLIN)
+
+    ex.http = ctx.socket(zmq.PUSH)
+    ex.http.connect(f"inproc://http-{endpoint_id}")
+    ex.peer = ctx.socket(zmq.PUSH)
+    ex.peer.connect(f"inproc://peer-{endpoint_id}")
+    yield ex
+    ctx.destroy(linger=0)
+
+
+def test_idle_wait_times_out_without_messages(executor):
+    start = time.monotonic()
+    executor.wait_for_requests(IDLE_POLL_TIMEOUT_MS)
+    assert time.monotonic() - start >= IDLE_POLL_TIMEOUT_MS / 1000 * 0.8
+
+
+def test_idle_wait_returns_when_a_message_arrives(executor):
+    timer = threading.Timer(0.05, lambda: executor.peer.send_multipart([b"abort", b""]))
+    timer.start()
+    start = time.monotonic()
+    executor.wait_for_requests(5000)
+    timer.join()
+    assert time.monotonic() - start < 1.0
+
+
+def test_one_pass_reads_every_available_message(executor):
+    for i in range(5):
+        executor.http.send_pyobj({"rid": f"http-{i}"})
+    for i in range(3):
+        finished = IntermediateRequest(
+            f"peer-{i}", current_position=0, status=RequestStatus.FINISHED_EOS
+        )
+        abort = abort_request_to_proto([finished])
+        executor.peer.send_multipart([b"abort", abort.SerializeToString()])
+
+    executor.wait_for_requests(IDLE_POLL_TIMEOUT_MS)
+    http_requests = executor.recv_requests_from_http()
+    peer_requests = executor.recv_requests_from_peer()
+
+    assert [r["rid"] for r in http_requests] == [f"http-{i}" for i in range(5)]
+    assert [r.request_id for r in peer_requests] == [f"peer-{i}" for i in range(3)]
+    assert executor.recv_requests_from_http() == []
+    assert executor.recv_requests_from_peer() == []
+
+
+def test_idle_run_loop_sleeps_until_requests_arrive(executor):
+    loop = threading.Thread(target=executor.run_loop)
+    loop.start()
+    try:
+        time.sleep(0.1)
+        iterations = executor.scheduler.iterations
+        time.sleep(0.3)
+        # Past the spin window the loop only wakes on messages or the poll timeout
+        max_wakeups = 0.3 / (IDLE_POLL_TIMEOUT_MS / 1000) + 2
+        assert executor.scheduler.iterations - iterations <= max_wakeups
+
+        for i in range(5):
+            executor.http.send_pyobj({"rid": f"http-{i}"})
+        deadline = time.monotonic() + 2.0
+        while sum(map(len, executor.handled)) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        executor._should_stop = True
+        loop.join(timeout=2.0)
+
+    assert [r["rid"] for batch in executor.handled for r in batch] == [
+        f"http-{i}" for i in range(5)
+    ]
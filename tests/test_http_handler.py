@@ -84,3 +84,71 @@ def test_http_handler_stream_error_pushes_queue_event():
     assert error_chunk["payload"]["type"] == "InternalServerError"
     assert error_chunk["payload"]["code"] == HTTPStatus.INTERNAL_SERVER_ERROR.value
     assert sentinel is None
+
+
+class _FakeDetokenizer:
+    def __init__(self):
+        self.last_segment = ""
+
+    def add_token(self, token_id):
+        self.last_segment = f"<{token_id}>"
+
+
+class _FakeExecutorSocket:
+    """Replays executor messages, then stops the handle loop."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+
+    async def recv_multipart(self):
+        if not self.messages:
+            raise asyncio.CancelledError
+        return self.messages.pop(0)
+
+
+def test_http_handler_fans_out_token_batches():
+    from parallax.server.token_stream import TokenBatchBuilder, error_to_frames
+
+    async def scenario():
+        handler = HTTPHandler.__new__(HTTPHandler)
+        handler.processing_requests = {}
+        for rid, stream in (("a", True), ("b", False), ("c", True)):
+            request_info = HTTPRequestInfo(id=rid, stream=stream)
+            request_info.detokenizer = _FakeDetokenizer()
+            if stream:
+                request_info.token_queue = asyncio.Queue()
+            handler.processing_requests[rid] = request_info
+
+        step1, step2 = TokenBatchBuilder(), TokenBatchBuilder()
+        step1.add("a", 11, None, 3)
+        step1.add("b", 21, None, 5)
+        step1.add("unknown", 31, None, 1)
+        step2.add("a", 12, "eos", 3)
+        step2.add("b", 22, "length", 5)
+        handler.recv_from_executor = _FakeExecutorSocket(
+            [
+                step1.to_frames(),
+                step2.to_frames(),
+                error_to_frames(
+                    {"rid": "c", "error": "boom", "error_type": "X", "status_code": 500}
+                ),
+            ]
+        )
+        try:
+            await handler._handle_loop()
+        except asyncio.CancelledError:
+            pass
+
+        stream_a = [handler.processing_requests["a"].token_queue.get_nowait() for _ in range(2)]
+        return handler.processing_requests, stream_a
+
+    requests, stream_a = asyncio.run(scenario())
+
+    assert stream_a == ["<11>", None]
+    assert requests["a"].finish_reason == "eos"
+    assert requests["a"].prompt_tokens == 3
+    assert requests["b"].text == "<21>"
+    assert requests["b"].finish_reason == "length"
+    assert requests["b"].completion_tokens == 1
+    assert requests["c"].finish_reason == "error"
+    assert requests["c"].error_status == HTTPStatus.INTERNAL_SERVER_ERROR
@@ -0,0 +1,236 @@
+"""
+Tests for the paged KV cache manager.
+"""
+
+import mlx.core as mx
+import numpy as np
+import pytest
+
+import parallax.server.kv_cache as kv_cache
+from parallax.server.kv_cache import KVCacheManager
+from parallax.server.request import InitialRequest
+
+NUM_LAYERS = 2
+NUM_KV_HEADS = 2
+HEAD_DIM = 4
+BLOCK_SIZE = 4
+
+
+def make_manager(monkeypatch, max_num_tokens, max_batch_size, **kwargs):
+    # The memory estimate needs hardware detection; cap the pool through max_num_tokens.
+    monkeypatch.setattr(kv_cache, "compute_max_tokens_in_cache", lambda **kwargs: 10**6)
+    return KVCacheManager(
+        num_kv_heads=NUM_KV_HEADS,
+        head_dim=HEAD_DIM,
+        num_layers=NUM_LAYERS,
+        dtype=mx.float32,
+        block_size=BLOCK_SIZE,
+        max_num_tokens=max_num_tokens,
+        max_batch_size=max_batch_size,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    # Half of the budget goes to 2 decode slots of 2 pages, leaving 4 pages to the pool
+    return make_manager(monkeypatch, max_num_tokens=8 * BLOCK_SIZE, max_batch_size=2)
+
+
+def make_kv(length: int, start: float = 0.0) -> mx.array:
+    size = NUM_LAYERS * NUM_KV_HEADS * length * HEAD_DIM
+    return mx.arange(start, start + size, dtype=mx.float32).reshape(
+        NUM_LAYERS, NUM_KV_HEADS, length, HEAD_DIM
+    )
+
+
+def update(manager, requests, kvs):
+    max_len = max(kv.shape[2] for kv in kvs)
+    padded = mx.stack(
+        [mx.pad(kv, [(0, 0), (0, 0), (0, max_len - kv.shape[2]), (0, 0)]) for kv in kvs]
+    )
+    lengths = mx.array([kv.shape[2] for kv in kvs])
+    return manager.update_requests(
+        requests, padded, padded + 0.5, lengths, [None] * len(kvs), [None] * len(kvs)
+    )
+
+
+def test_add_and_release_return_pages(manager):
+    assert manager.num_pages == 4
+    assert manager.max_num_tokens == 4 * BLOCK_SIZE
+
+    req = InitialRequest(request_id="a", input_ids=[0] * 5)
+    assert manager.add_request(req, 5)
+    assert manager.request_num_tokens("a") == 2 * BLOCK_SIZE
+    assert manager.tokens_in_cache == 2 * BLOCK_SIZE
+    assert manager.num_free_pages == 2
+
+    manager.release_request("a")
+    assert not manager.has_request("a")
+    assert manager.tokens_in_cache == 0
+    assert manager.num_free_pages == 4
+
+
+def test_admission_refused_when_pages_run_out(manager):
+    assert manager.add_request(InitialRequest(request_id="a", input_ids=[0] * 9), 9)
+    # 3 pages used, 1 free: a 5-token prompt needs 2 pages.
+    assert not manager.add_request(InitialRequest(request_id="b", input_ids=[0] * 5), 5)
+    assert not manager.has_request("b")
+    assert manager.add_request(InitialRequest(request_id="c", input_ids=[0] * 4), 4)
+    assert manager.num_free_pages == 0
+
+
+def test_growth_across_pages_preserves_content(manager):
+    a = InitialRequest(request_id="a", input_ids=[0] * 3)
+    b = InitialRequest(request_id="b", input_ids=[0] * 2)
+    assert manager.add_request(a, 3)
+    assert manager.add_request(b, 2)
+
+    prefill_a, prefill_b = make_kv(3), make_kv(2, start=1000.0)
+    assert update(manager, [a, b], [prefill_a, prefill_b])
+    # Decode steps for "a" spill into a second page, interleaved with "b"'s pages.
+    steps = [make_kv(1, start=2000.0 + 100 * i) for i in range(3)]
+    for step in steps:
+        assert update(manager, [a], [step])
+
+    assert manager.request_length("a") == 6
+    assert manager.request_num_tokens("a") == 2 * BLOCK_SIZE
+    keys, values, state0, state1 = manager.gather_kv_cache("a")
+    expected = mx.concatenate([prefill_a] + steps, axis=2)
+    np.testing.assert_array_equal(np.array(keys), np.array(expected))
+    np.testing.assert_array_equal(np.array(values), np.array(expected + 0.5))
+    assert state0 is None and state1 is None
+
+    keys, _, _, _ = manager.gather_kv_cache("b")
+    np.testing.assert_array_equal(np.array(keys), np.array(prefill_b))
+
+
+def test_update_fails_without_free_pages(manager):
+    a = InitialRequest(request_id="a", input_ids=[0] * 16)
+    assert manager.add_request(a, 16)
+    assert update(manager, [a], [make_kv(16)])
+    assert not update(manager, [a], [make_kv(1)])
+    # A failed update leaves the request untouched.
+    assert manager.request_length("a") == 16
+
+
+def test_released_pages_are_reused(manager):
+    a = InitialRequest(request_id="a", input_ids=[0] * 8)
+    assert manager.add_request(a, 8)
+    assert update(manager, [a], [make_kv(8)])
+    manager.release_request("a")
+
+    b = InitialRequest(request_id="b", input_ids=[0] * 16)
+    assert manager.add_request(b, 16)
+    assert manager.request_length("b") == 0
+    keys, _, _, _ = manager.gather_kv_cache("b")
+    assert keys.shape == (NUM_LAYERS, NUM_KV_HEADS, 0, HEAD_DIM)
+
+    fresh = make_kv(16, start=-500.0)
+    assert update(manager, [b], [fresh])
+    keys, _, _, _ = manager.gather_kv_cache("b")
+    np.testing.assert_array_equal(np.array(keys), np.array(fresh))
+
+
+def assert_decode_batch_matches_pool(manager, request_ids):
+    keys, values, lengths = manager.gather_decode_batch(request_ids)
+    assert lengths == [manager.request_length(rid) for rid in request_ids]
+    assert keys.shape[3] == max(lengths)
+    for i, rid in enumerate(request_ids):
+        expected_keys, expected_values, _, _ = manager.gather_kv_cache(rid)
+        np.testing.assert_array_equal(
+            np.array(keys[i, :, :, : lengths[i], :]), np.array(expected_keys)
+        )
+        np.testing.assert_array_equal(
+            np.array(values[i, :, :, : lengths[i], :]), np.array(expected_values)
+        )
+
+
+def test_decode_batch_follows_appends_and_slot_reuse(manager):
+    a = InitialRequest(request_id="a", input_ids=[0] * 3)
+    b = InitialRequest(request_id="b", input_ids=[0] * 5)
+    assert manager.add_request(a, 3)
+    assert manager.add_request(b, 5)
+    assert update(manager, [a, b], [make_kv(3), make_kv(5, start=1000.0)])
+    assert_decode_batch_matches_pool(manager, ["a", "b"])
+
+    for i in range(3):
+        assert update(manager, [a, b], [make_kv(1, start=2000.0 + i), make_kv(1, start=-i)])
+        assert_decode_batch_matches_pool(manager, ["a", "b"])
+    # Steps append to the slots instead of copying the requests back in.
+    assert manager.decode_cache.length("a") == 6
+
+    manager.release_request("a")
+    assert manager.decode_cache.length("a") == -1
+    c = InitialRequest(request_id="c", input_ids=[0] * 2)
+    assert manager.add_request(c, 2)
+    assert update(manager, [c], [make_kv(2, start=3000.0)])
+    assert_decode_batch_matches_pool(manager, ["b", "c"])
+    assert [manager.decode_slot(rid) for rid in ["b", "c"]] == [0, 1]
+
+
+def test_decode_batch_refills_after_multi_token_update(manager):
+    a = InitialRequest(request_id="a", input_ids=[0] * 2)
+    assert manager.add_request(a, 2)
+    assert update(manager, [a], [make_kv(2)])
+    assert_decode_batch_matches_pool(manager, ["a"])
+
+    # A multi-token write (e.g. a prefill chunk) invalidates the slot.
+    assert update(manager, [a], [make_kv(3, start=100.0)])
+    assert manager.decode_cache.length("a") == -1
+    assert_decode_batch_matches_pool(manager, ["a"])
+
+
+def test_decode_batches_are_served_from_stable_slots(monkeypatch):
+    manager = make_manager(monkeypatch, max_num_tokens=16 * BLOCK_SIZE, max_batch_size=4)
+    requests = [InitialRequest(request_id=rid, input_ids=[0] * 2) for rid in "abc"]
+    for i, req in enumerate(requests):
+        assert manager.add_request(req, 2)
+        assert update(manager, [req], [make_kv(2, start=100.0 * i)])
+    assert_decode_batch_matches_pool(manager, ["a", "b", "c"])
+
+    # A micro-batch without "b" is moved into a contiguous run of slots once
+    assert_decode_batch_matches_pool(manager, ["a", "c"])
+    slots = {rid: manager.decode_slot(rid) for rid in "abc"}
+    assert slots["c"] == slots["a"] + 1
+    for i in range(2):
+        batch = sorted(["c", "a"], key=manager.decode_slot)
+        assert update(
+            manager,
+            [requests[0], requests[2]],
+            [make_kv(1, start=1000.0 + i), make_kv(1, start=-1000.0 - i)],
+        )
+        assert_decode_batch_matches_pool(manager, batch)
+    assert {rid: manager.decode_slot(rid) for rid in "abc"} == slots
+
+
+def test_decode_buffer_stays_within_the_kv_budget(monkeypatch):
+    """Test that one long request among short ones can't inflate the decode buffer."""
+    budget = 64 * BLOCK_SIZE
+    manager = make_manager(monkeypatch, max_num_tokens=budget, max_batch_size=16)
+    token_bytes = NUM_LAYERS * NUM_KV_HEADS * 2 * HEAD_DIM * 4
+    buffer_shape = manager.decode_cache.keys.shape
+    assert manager.keys.nbytes + manager.values.nbytes + manager.decode_cache.nbytes <= (
+        budget * token_bytes
+    )
+
+    lengths = {"long": 23 * BLOCK_SIZE, **{f"short-{i}": 1 for i in range(7)}}
+    requests = [InitialRequest(request_id=rid, input_ids=[0] * n) for rid, n in lengths.items()]
+    for req in requests:
+        assert manager.add_request(req, lengths[req.request_id])
+        assert update(manager, [req], [make_kv(lengths[req.request_id])])
+    # A batch with a request longer than a slot is gathered from the pool
+    for step in range(2):
+        assert update(manager, requests, [make_kv(1, start=-step)] * len(requests))
+        assert_decode_batch_matches_pool(manager, sorted(lengths, key=manager.decode_slot))
+        assert manager.decode_cache.keys.shape == buffer_shape
+    assert manager.decode_cache.length("long") == -1
+
+    # Without it, the batch is served from the decode slots
+    short = requests[1:]
+    short_ids = sorted((req.request_id for req in short), key=manager.decode_slot)
+    assert_decode_batch_matches_pool(manager, short_ids)
+    assert update(manager, short, [make_kv(1, start=10.0)] * len(short))
+    assert_decode_batch_matches_pool(manager, short_ids)
+    assert manager.decode_cache.keys.shape == buffer_shape
+    assert all(manager.decode_cache.length(rid) == 4 for rid in short_ids)
@@ -7,6 +7,10 @@ import numpy as np
 import pytest
 
 from parallax.p2p.message_util import (
+    ACTIVATION_CODECS,
+    RAW_TENSOR_MAGIC,
+    DeltaHopDecoder,
+    DeltaHopEncoder,
     abort_request_to_proto,
     bytes_to_tensor,
     proto_to_abort_request,
@@ -170,6 +174,35 @@ class TestMessageUtil:
             np.array(deserialized_reqs[1].hidden_states.tolist()), np.array([[2.0]])
         )
 
+    def test_mixed_requests_round_trip(self):
+        """Test that prefill chunks and decodes share one MIXED ForwardRequest."""
+        prefill_chunk = IntermediateRequest(
+            request_id="prefill",
+            input_ids=[1, 2, 3, 4],
+            current_position=2,
+            status=RequestStatus.PREFILLING,
+            hidden_states=mx.zeros((2, 3), dtype=mx.float32),
+        )
+        decode = IntermediateRequest(
+            request_id="decode",
+            input_ids=[5, 6],
+            current_position=3,
+            status=RequestStatus.DECODING,
+            hidden_states=mx.zeros((1, 3), dtype=mx.float32),
+            next_token_id=7,
+        )
+
+        forward_request = request_to_proto([prefill_chunk, decode])
+        assert forward_request.forward_mode == forward_pb2.ForwardMode.MIXED
+
+        converted = proto_to_request(forward_request)
+        assert [r.status for r in converted] == [
+            RequestStatus.PREFILLING,
+            RequestStatus.DECODING,
+        ]
+        assert [r.current_position for r in converted] == [2, 3]
+        assert converted[0].is_partial_prefill
+
     @pytest.mark.parametrize(
         "dtype,shape",
         [
@@ -192,6 +225,165 @@ class TestMessageUtil:
             np.array(original_tensor.tolist()),
         )
 
+    @pytest.mark.parametrize("tensor_format", ["raw", "safetensors"])
+    def test_tensor_formats_decode_on_receiver(self, tensor_format):
+        """Test that receivers accept both raw frames and safetensors blobs."""
+        original_tensor = mx.arange(12, dtype=mx.bfloat16).reshape(3, 4).T
+
+        serialized_bytes = tensor_to_bytes(original_tensor, tensor_format=tensor_format)
+        assert serialized_bytes.startswith(RAW_TENSOR_MAGIC) == (tensor_format == "raw")
+        deserialized_tensor = bytes_to_tensor(serialized_bytes)
+
+        assert deserialized_tensor.shape == (4, 3)
+        assert deserialized_tensor.dtype == mx.bfloat16
+        np.testing.assert_array_equal(
+            np.array(deserialized_tensor.tolist()),
+            np.array(original_tensor.tolist()),
+        )
+
+    def test_senders_default_to_safetensors(self):
+        """Test that peers without raw frame support decode the default encoding."""
+        from safetensors.numpy import load
+
+        tensor = mx.array([[1.0, 2.0, 3.0]], dtype=mx.float32)
+        (decoded,) = load(tensor_to_bytes(tensor)).values()
+        np.testing.assert_array_equal(decoded, np.array([[1.0, 2.0, 3.0]], dtype=np.float32))
+
+    def test_raw_frame_layout(self):
+        """Test that a raw frame is the header followed by the contiguous buffer."""
+        tensor = mx.array([[1.0, 2.0, 3.0]], dtype=mx.float32)
+        frame = tensor_to_bytes(tensor, tensor_format="raw")
+        header_len = len(RAW_TENSOR_MAGIC) + 2 + 4 * tensor.ndim
+        assert len(frame) == header_len + tensor.nbytes
+        assert frame[header_len:] == np.array([[1.0, 2.0, 3.0]], dtype=np.float32).tobytes()
+
+    @pytest.mark.parametrize(
+        "codec,max_bytes_ratio,max_rel_error",
+        [
+            ("passthrough", 1.0, 0.0),
+            ("bf16", 0.5, 1e-2),
+            ("fp16", 0.5, 1e-3),
+            ("int8", 0.27, 1e-2),
+        ],
+    )
+    def test_activation_codec_round_trip(self, codec, max_bytes_ratio, max_rel_error):
+        """Test the bytes saved and the round-trip error of each activation codec."""
+        hidden_states = mx.random.normal((16, 1024), key=mx.random.key(0)) * mx.linspace(
+            0.1, 10.0, 16
+        ).reshape(16, 1)
+        request = IntermediateRequest(
+            request_id=self.request_id,
+            input_ids=[1, 2, 3],
+            current_position=3,
+            status=RequestStatus.PREFILLING,
+            hidden_states=hidden_states,
+        )
+
+        passthrough_bytes = request_to_proto([request], tensor_format="raw").ByteSize()
+        forward_request = request_to_proto([request], tensor_format="raw", activation_codec=codec)
+        assert forward_request.activation_codec == ACTIVATION_CODECS[codec].proto_value
+        assert forward_request.ByteSize() <= max_bytes_ratio * passthrough_bytes + 64
+
+        decoded = proto_to_request(
+            forward_pb2.ForwardRequest.FromString(forward_request.SerializeToString())
+        )[0].hidden_states
+        assert decoded.shape == hidden_states.shape
+        error = np.abs(np.array(decoded.astype(mx.float32)) - np.array(hidden_states))
+        row_max = np.abs(np.array(hidden_states)).max(axis=-1, keepdims=True)
+        assert (error / row_max).max() <= max_rel_error
+
+    def test_activation_codec_keeps_token_ids(self):
+        """Test that integer hidden states (sampled token ids) are never quantized."""
+        token_ids = mx.array([[151643]], dtype=mx.uint32)
+        request = IntermediateRequest(
+            request_id=self.request_id,
+            input_ids=[1, 2, 3],
+            current_position=4,
+            status=RequestStatus.DECODING,
+            hidden_states=token_ids,
+            next_token_id=151643,
+        )
+        forward_request = request_to_proto([request], activation_codec="int8")
+        assert not forward_request.reqs[0].hidden_states_scales
+        decoded = proto_to_request(forward_request)[0].hidden_states
+        assert decoded.dtype == mx.uint32
+        assert decoded.tolist() == [[151643]]
+
+    def test_unknown_activation_codec(self):
+        """Test that an unknown activation codec is rejected."""
+        request = IntermediateRequest(
+            request_id=self.request_id,
+            input_ids=[1],
+            current_position=1,
+            status=RequestStatus.PREFILLING,
+            hidden_states=mx.ones((1, 2)),
+        )
+        with pytest.raises(ValueError, match="Unsupported activation codec"):
+            request_to_proto([request], activation_codec="fp4")
+
+    def test_unknown_tensor_format(self):
+        """Test that an unknown tensor format is rejected."""
+        with pytest.raises(ValueError, match="Unsupported tensor format"):
+            tensor_to_bytes(mx.ones((1, 2)), tensor_format="pickle")
+
+    def _decode_hop(self, request_id, current_position, next_token_id):
+        return IntermediateRequest(
+            request_id=request_id,
+            input_ids=[1, 2, 3],
+            current_position=current_position,
+            status=RequestStatus.DECODING,
+            hidden_states=mx.ones((1, 4), dtype=mx.float32),
+            next_token_id=next_token_id,
+            sampling_params=self.sampling_params,
+            routing_table=["nodeA", "nodeB"],
+        )
+
+    def test_delta_hops_round_trip(self):
+        """Test that repeated hops to a peer drop and then restore the static fields."""
+        encoder, decoder = DeltaHopEncoder(), DeltaHopDecoder()
+
+        for step in range(3):
+            forward_request = request_to_proto([self._decode_hop(self.request_id, 4 + step, step)])
+            sent = forward_pb2.ForwardRequest(forward_mode=forward_request.forward_mode)
+            sent.reqs.extend(encoder.encode("nodeB", forward_request.reqs))
+            assert sent.reqs[0].delta == (step > 0)
+            if step > 0:
+                assert len(sent.reqs[0].input_ids) == 0
+                assert not sent.reqs[0].HasField("sampling_params")
+
+            received = forward_pb2.ForwardRequest.FromString(sent.SerializeToString())
+            assert decoder.decode(received) == []
+            assert received == forward_request
+
+            converted = proto_to_request(received)[0]
+            assert converted.current_position == 4 + step
+            assert converted.input_ids == [1, 2, 3]
+            assert converted.sampling_params.temperature == pytest.approx(0.7)
+
+        # A peer that has not seen the request yet gets it in full.
+        assert not encoder.encode("nodeC", forward_request.reqs)[0].delta
+
+    def test_delta_hops_report_unknown_requests(self):
+        """Test that delta hops of requests the receiver forgot are reported back."""
+        encoder, decoder = DeltaHopEncoder(), DeltaHopDecoder()
+        first = request_to_proto([self._decode_hop("known", 4, 0), self._decode_hop("lost", 4, 0)])
+        decoder.decode(first)
+        encoder.encode("nodeB", first.reqs)
+        decoder.forget(["lost"])
+
+        second = request_to_proto([self._decode_hop("known", 5, 1), self._decode_hop("lost", 5, 1)])
+        sent = forward_pb2.ForwardRequest(forward_mode=second.forward_mode)
+        sent.reqs.extend(encoder.encode("nodeB", second.reqs))
+        assert decoder.decode(sent) == ["lost"]
+        assert [req.rid for req in sent.reqs] == ["known"]
+        assert list(sent.reqs[0].input_ids) == [1, 2, 3]
+
+        # After the full resend, the next hop is a delta again.
+        encoder.mark_sent("nodeB", ["lost"])
+        assert encoder.encode("nodeB", second.reqs[1:])[0].delta
+        encoder.forget(["lost"])
+        assert not encoder.encode("nodeB", second.reqs[1:])[0].delta
+
     def test_sampling_params_conversion(self):
         """Test SamplingParams conversion to and from proto."""
         params = SamplingParams(
@@ -0,0 +1,146 @@
+"""
+Tests for coalesced metrics publishing and its ingestion by the scheduler.
+"""
+
+import threading
+import time
+
+from backend.server.rpc_connection_handler import RPCConnectionHandler
+from parallax.server.metrics import MetricsPublisher
+from scheduling.scheduler import Scheduler
+
+from .scheduler_tests.test_utils import (
+    build_model_info,
+    build_node,
+    set_rtt_from_coords,
+)
+
+
+class _Recorder:
+    def __init__(self):
+        self.messages = []
+        self.sent = threading.Event()
+
+    def __call__(self, delta):
+        self.messages.append(delta)
+        self.sent.set()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_significance_thresholds():
+    publisher = MetricsPublisher(_Recorder(), min_requests_delta=4, min_latency_rel_delta=0.1)
+    first = {"current_requests": 8, "layer_latency_ms": 10.0, "_last_update_ts": 1.0}
+    assert publisher.changes(first) == {"current_requests": 8, "layer_latency_ms": 10.0}
+    publisher._sent.update(publisher.changes(first))
+
+    assert publisher.changes({"current_requests": 10, "layer_latency_ms": 10.5}) == {}
+    assert publisher.changes({"current_requests": 12, "layer_latency_ms": 11.5}) == {
+        "current_requests": 12,
+        "layer_latency_ms": 11.5,
+    }
+    # Going idle is always worth reporting
+    assert publisher.changes({"current_requests": 0}) == {"current_requests": 0}
+
+
+def test_bursts_are_coalesced_into_one_message_per_interval():
+    recorder = _Recorder()
+    publisher = MetricsPublisher(recorder, interval_sec=0.2)
+    try:
+        start = time.monotonic()
+        for i in range(1, 501):
+            publisher({"current_requests": i, "layer_latency_ms": 5.0})
+        # Publishing never waits for the sender
+        assert time.monotonic() - start < 0.1
+
+        assert _wait_for(
+            lambda: recorder.messages and recorder.messages[-1].get("current_requests") == 500
+        )
+        time.sleep(0.3)
+        # The first snapshot goes out right away, the rest collapse into the latest value
+        assert len(recorder.messages) <= 2
+        assert recorder.messages[0]["layer_latency_ms"] == 5.0
+        assert all("layer_latency_ms" not in m for m in recorder.messages[1:])
+    finally:
+        publisher.close(timeout=1.0)
+
+
+def test_slow_sender_does_not_block_updates():
+    release = threading.Event()
+    recorder = _Recorder()
+
+    def slow_send(delta):
+        recorder(delta)
+        release.wait(2.0)
+
+    publisher = MetricsPublisher(slow_send, interval_sec=0.0)
+    try:
+        publisher({"current_requests": 1})
+        assert recorder.sent.wait(1.0)
+        start = time.monotonic()
+        for i in range(2, 100):
+            publisher({"current_requests": i})
+        assert time.monotonic() - start < 0.1
+        release.set()
+        assert _wait_for(lambda: recorder.messages[-1] == {"current_requests": 99})
+    finally:
+        release.set()
+        publisher.close(timeout=1.0)
+
+
+def test_failed_sends_are_retried_next_interval():
+    recorder = _Recorder()
+    failures = [RuntimeError("scheduler unreachable")]
+
+    def flaky_send(delta):
+        if failures:
+            raise failures.pop()
+        recorder(delta)
+
+    publisher = MetricsPublisher(flaky_send, interval_sec=0.05)
+    try:
+        # Going idle must reach the scheduler even though nothing changes afterwards
+        publisher({"current_requests": 0})
+        assert recorder.sent.wait(1.0)
+        assert recorder.messages == [{"current_requests": 0}]
+        assert publisher.changes({"current_requests": 0}) == {}
+    finally:
+        publisher.close(timeout=1.0)
+
+
+class _StandInLattica:
+    def register_service(self, service):
+        pass
+
+
+def test_node_update_applies_deltas_to_the_existing_node():
+    model = build_model_info(12)
+    node = build_node("a100-0", model, tflops=312.0, mem_gb=80.0, x=0, y=0)
+    set_rtt_from_coords([node])
+    sched = Scheduler(model, [node], strategy="greedy", min_nodes_bootstrapping=1)
+    sched.layer_allocator.global_allocation()
+    node.is_active = True
+    rtts = dict(node.rtt_to_nodes)
+    handler = RPCConnectionHandler(_StandInLattica(), sched, None)
+
+    response = handler.node_update({"node_id": "a100-0", "current_requests": 3})
+    sched._process_node_updates()
+
+    assert response["start_layer"] == node.start_layer
+    assert sched.node_id_to_node["a100-0"] is node
+    assert node.current_requests == 3
+    # Fields absent from the delta are left as they were
+    assert node.is_active
+    assert node.rtt_to_nodes == rtts
+
+    handler.node_update({"node_id": "a100-0", "layer_latency_ms": 2.5})
+    sched._process_node_updates()
+    assert node.avg_layer_latency_ms == 2.5
+    assert node.current_requests == 3
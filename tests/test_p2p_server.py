@@ -0,0 +1,105 @@
+"""
+Tests for the GradientServer node sender, with the executor socket on ipc and a
+recording stub in place of the next peer.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+import zmq
+
+from parallax.p2p.proto import forward_pb2
+from parallax.p2p.server import GradientServer
+
+SELF_PEER_ID = "peer-0"
+NEXT_PEER_ID = "peer-1"
+
+
+class _FakeLattica:
+    def peer_id(self):
+        return SELF_PEER_ID
+
+
+class _RecordingStub:
+    """Next peer that predates delta hops: it keeps every ForwardRequest as sent."""
+
+    def __init__(self):
+        self.received = []
+
+    def rpc_pp_forward(self, request):
+        # Round-trip through bytes, as the request would travel over the wire
+        self.received.append(forward_pb2.ForwardRequest.FromString(request.SerializeToString()))
+        future = Future()
+        future.set_result(forward_pb2.ForwardResponse())
+        return future
+
+
+def _decode_hop(step):
+    req = forward_pb2.Req(
+        rid="req-0",
+        output_length=step,
+        routing_table=[SELF_PEER_ID, NEXT_PEER_ID],
+        input_ids=[1, 2, 3],
+        hidden_states=b"\x00" * 8,
+    )
+    req.sampling_params.temperature = 0.5
+    req.sampling_params.max_new_tokens = 16
+    forward_request = forward_pb2.ForwardRequest(forward_mode=forward_pb2.DECODE)
+    forward_request.reqs.append(req)
+    return [b"forward", forward_request.SerializeToString()]
+
+
+def _run_sender(tmp_path, num_hops, **server_kwargs):
+    """Feeds `num_hops` hops of one request to the node sender and returns what was sent."""
+    send_to_peer_addr = f"ipc://{tmp_path}/send_to_peer"
+    server = GradientServer(
+        recv_from_peer_addr=f"ipc://{tmp_path}/recv_from_peer",
+        send_to_peer_addr=send_to_peer_addr,
+        scheduler_addr="unused",
+        **server_kwargs,
+    )
+    server.lattica = _FakeLattica()
+    stub = _RecordingStub()
+    server.get_stub = lambda peer_id: stub
+
+    sender = threading.Thread(target=server.start_node_sender, daemon=True)
+    sender.start()
+    ctx = zmq.Context()
+    executor = ctx.socket(zmq.PUSH)
+    executor.connect(send_to_peer_addr)
+    try:
+        for step in range(num_hops):
+            executor.send_multipart(_decode_hop(step))
+        deadline = time.monotonic() + 5.0
+        while len(stub.received) < num_hops and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        # The sender checks the stop event after each message
+        server.stop_event.set()
+        executor.send_multipart(_decode_hop(num_hops))
+        sender.join(timeout=5.0)
+        ctx.destroy(linger=0)
+    return [req for request in stub.received[:num_hops] for req in request.reqs]
+
+
+def test_sender_sends_full_hops_by_default(tmp_path):
+    sent = _run_sender(tmp_path, num_hops=3)
+
+    assert len(sent) == 3
+    for req in sent:
+        assert not req.delta
+        assert list(req.input_ids) == [1, 2, 3]
+        assert req.sampling_params.temperature == pytest.approx(0.5)
+        assert req.sampling_params.max_new_tokens == 16
+
+
+def test_sender_sends_delta_hops_when_enabled(tmp_path):
+    sent = _run_sender(tmp_path, num_hops=3, enable_delta_hops=True)
+
+    assert [req.delta for req in sent] == [False, True, True]
+    assert list(sent[0].input_ids) == [1, 2, 3]
+    for req in sent[1:]:
+        assert list(req.input_ids) == []
+        assert not req.HasField("sampling_params")
@@ -0,0 +1,179 @@
+"""
+Tests for the parallel weight file downloader, against a local stand-in hub.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from parallax.utils.parallel_download import ParallelDownloader, RemoteFile
+
+
+class StandInHub:
+    """Serves in-memory files over HTTP with Range support and injectable faults."""
+
+    def __init__(self, files, latency=0.0):
+        self.files = files
+        self.latency = latency
+        self.ranges = []
+        self.truncate_next = set()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                hub.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server.server_port}/{name}"
+
+    def remote_file(self, name, sha256=None):
+        data = self.files[name]
+        return RemoteFile(
+            filename=name,
+            url=self.url(name),
+            size=len(data),
+            sha256=sha256 or hashlib.sha256(data).hexdigest(),
+        )
+
+    def handle(self, request):
+        name = request.path.lstrip("/")
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.ranges.append((name, request.headers.get("Range")))
+        try:
+            time.sleep(self.latency)
+            data = self.files[name]
+            start = 0
+            if request.headers.get("Range"):
+                start = int(request.headers["Range"].split("=")[1].rstrip("-"))
+                request.send_response(206)
+            else:
+                request.send_response(200)
+            request.send_header("Content-Length", str(len(data) - start))
+            request.end_headers()
+            if name in self.truncate_next:
+                # Drop the connection halfway through the body
+                self.truncate_next.discard(name)
+                request.wfile.write(data[start : start + (len(data) - start) // 2])
+                request.close_connection = True
+                return
+            request.wfile.write(data[start:])
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def hub():
+    files = {f"model-{i:05d}-of-00006.safetensors": os.urandom(64 * 1024 + i) for i in range(6)}
+    hub = StandInHub(files)
+    yield hub
+    hub.close()
+
+
+def test_downloads_all_files_with_bounded_concurrency(hub, tmp_path):
+    hub.latency = 0.1
+    downloader = ParallelDownloader(max_workers=3)
+    files = [hub.remote_file(name) for name in hub.files]
+
+    paths = downloader.download(files, tmp_path)
+    downloader.close()
+
+    assert [p.name for p in paths] == list(hub.files)
+    for path in paths:
+        assert path.read_bytes() == hub.files[path.name]
+    assert 1 < hub.max_active <= 3
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_reports_files_as_they_complete(hub, tmp_path):
+    downloader = ParallelDownloader(max_workers=2)
+    files = [hub.remote_file(name) for name in hub.files]
+    ready = []
+
+    downloader.download(files, tmp_path, on_file_ready=lambda path: ready.append(path.exists()))
+    downloader.close()
+
+    assert ready == [True] * len(files)
+
+
+def test_skips_files_that_already_exist(hub, tmp_path):
+    name = next(iter(hub.files))
+    (tmp_path / name).write_bytes(hub.files[name])
+    downloader = ParallelDownloader(max_workers=2)
+
+    downloader.download([hub.remote_file(name) for name in hub.files], tmp_path)
+    downloader.close()
+
+    assert name not in [requested for requested, _ in hub.ranges]
+
+
+def test_interrupted_download_resumes_with_range(hub, tmp_path):
+    name = next(iter(hub.files))
+    hub.truncate_next.add(name)
+    downloader = ParallelDownloader(max_workers=1, retry_backoff_s=0.0)
+
+    (path,) = downloader.download([hub.remote_file(name)], tmp_path)
+    downloader.close()
+
+    assert path.read_bytes() == hub.files[name]
+    requests = [byte_range for requested, byte_range in hub.ranges if requested == name]
+    assert requests[0] is None
+    assert requests[1] == f"bytes={len(hub.files[name]) // 2}-"
+
+
+def test_partial_file_from_previous_run_is_resumed(hub, tmp_path):
+    name = next(iter(hub.files))
+    data = hub.files[name]
+    (tmp_path / f"{name}.part").write_bytes(data[:1000])
+    downloader = ParallelDownloader(max_workers=1)
+
+    (path,) = downloader.download([hub.remote_file(name)], tmp_path)
+    downloader.close()
+
+    assert path.read_bytes() == data
+    assert hub.ranges == [(name, "bytes=1000-")]
+
+
+def test_corrupt_partial_file_is_downloaded_again(hub, tmp_path):
+    name = next(iter(hub.files))
+    data = hub.files[name]
+    (tmp_path / f"{name}.part").write_bytes(b"\0" * 1000)
+    downloader = ParallelDownloader(max_workers=1)
+
+    (path,) = downloader.download([hub.remote_file(name)], tmp_path)
+    downloader.close()
+
+    assert path.read_bytes() == data
+    assert hub.ranges == [(name, "bytes=1000-"), (name, None)]
+
+
+def test_checksum_mismatch_raises(hub, tmp_path):
+    name = next(iter(hub.files))
+    downloader = ParallelDownloader(max_workers=1, max_retries=2)
+
+    with pytest.raises(ValueError, match="sha256 mismatch"):
+        downloader.download([hub.remote_file(name, sha256="0" * 64)], tmp_path)
+    downloader.close()
+
+    assert not (tmp_path / name).exists()
+    assert not (tmp_path / f"{name}.part").exists()
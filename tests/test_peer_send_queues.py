@@ -0,0 +1,86 @@
+"""
+Tests for the per-peer send queues used by the P2P sender.
+"""
+
+import threading
+import time
+
+from parallax.p2p.utils import PeerSendQueues
+
+LATENCY = 0.2
+
+
+class FakeStub:
+    """Records forwarded payloads after an injected RPC latency."""
+
+    def __init__(self, latency: float = LATENCY):
+        self.latency = latency
+        self.received = []
+
+    def rpc_pp_forward(self, payload):
+        time.sleep(self.latency)
+        self.received.append(payload)
+
+
+def test_sends_to_different_peers_overlap():
+    stubs = {"peer_a": FakeStub(), "peer_b": FakeStub()}
+    send_queues = PeerSendQueues()
+
+    start = time.monotonic()
+    for peer_id, stub in stubs.items():
+        send_queues.submit(peer_id, lambda stub=stub: stub.rpc_pp_forward("hidden"))
+    submit_time = time.monotonic() - start
+    send_queues.join()
+    total_time = time.monotonic() - start
+    send_queues.close()
+
+    assert submit_time < LATENCY / 2
+    assert total_time < 1.5 * LATENCY
+    assert all(stub.received == ["hidden"] for stub in stubs.values())
+
+
+def test_sends_to_one_peer_keep_their_order():
+    stub = FakeStub(latency=0.01)
+    send_queues = PeerSendQueues()
+    for step in range(10):
+        send_queues.submit("peer_a", lambda step=step: stub.rpc_pp_forward(step))
+    send_queues.join()
+    send_queues.close()
+
+    assert stub.received == list(range(10))
+
+
+def test_submit_blocks_when_pipeline_is_full():
+    release = threading.Event()
+    send_queues = PeerSendQueues(max_pending=2)
+    send_queues.submit("peer_a", release.wait)
+    send_queues.submit("peer_b", release.wait)
+
+    submitted = threading.Event()
+
+    def submit_third():
+        send_queues.submit("peer_c", lambda: None)
+        submitted.set()
+
+    threading.Thread(target=submit_third, daemon=True).start()
+    assert not submitted.wait(LATENCY)
+
+    release.set()
+    assert submitted.wait(1.0)
+    send_queues.join()
+    send_queues.close()
+
+
+def test_failed_send_does_not_stop_the_worker():
+    stub = FakeStub(latency=0.0)
+    send_queues = PeerSendQueues(max_pending=1)
+
+    def failing_send():
+        raise RuntimeError("peer unreachable")
+
+    send_queues.submit("peer_a", failing_send)
+    send_queues.submit("peer_a", lambda: stub.rpc_pp_forward("after"))
+    send_queues.join()
+    send_queues.close()
+
+    assert stub.received == ["after"]
@@ -0,0 +1,124 @@
+"""
+Tests for the queue of requests waiting for routing capacity and its use in RequestHandler.
+"""
+
+import asyncio
+import threading
+import time
+
+from backend.server.constants import NODE_STATUS_AVAILABLE
+from backend.server.pending_requests import PendingRequestQueue
+from backend.server.request_handler import RequestHandler
+from scheduling.node import RequestSignal
+
+
+def test_notify_wakes_oldest_requests_first():
+    async def scenario():
+        queue = PendingRequestQueue()
+        woken = []
+
+        async def waiter(received_ts):
+            if await queue.wait(received_ts, timeout=5.0):
+                woken.append(received_ts)
+
+        tasks = [asyncio.create_task(waiter(ts)) for ts in (3.0, 1.0, 2.0)]
+        await asyncio.sleep(0)
+        assert len(queue) == 3
+
+        assert queue.notify(2) == 2
+        await asyncio.sleep(0.01)
+        assert woken == [1.0, 2.0]
+        assert queue.notify(5) == 1
+        await asyncio.gather(*tasks)
+        assert woken == [1.0, 2.0, 3.0]
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiters_are_skipped():
+    async def scenario():
+        queue = PendingRequestQueue()
+        assert not await queue.wait(1.0, timeout=0.01)
+        assert len(queue) == 0
+        assert queue.notify() == 0
+
+        task = asyncio.create_task(queue.wait(2.0, timeout=5.0))
+        await asyncio.sleep(0)
+        assert queue.notify() == 1
+        assert await task
+
+    asyncio.run(scenario())
+
+
+def test_notify_from_another_thread():
+    async def scenario():
+        queue = PendingRequestQueue()
+        task = asyncio.create_task(queue.wait(1.0, timeout=5.0))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        threading.Timer(0.05, queue.notify).start()
+        assert await task
+        assert time.monotonic() - start < 1.0
+
+    asyncio.run(scenario())
+
+
+class _StandInSchedulerManage:
+    """Has no capacity until `free_capacity`, which wakes waiters like the scheduler."""
+
+    def __init__(self):
+        self.pending_requests = PendingRequestQueue()
+        self.has_capacity = False
+        self.attempts = 0
+
+    def get_schedule_status(self):
+        return NODE_STATUS_AVAILABLE
+
+    async def route_request_async(self, request_id, received_ts):
+        self.attempts += 1
+        request = RequestSignal(request_id, received_ts)
+        request.routing_table = ["node-0"] if self.has_capacity else []
+        return request
+
+    def free_capacity(self):
+        self.has_capacity = True
+        self.pending_requests.notify()
+
+
+def test_request_handler_retries_as_soon_as_capacity_frees_up():
+    async def scenario():
+        manage = _StandInSchedulerManage()
+        handler = RequestHandler()
+        handler.set_scheduler_manage(manage)
+        # A node that answers right away
+        handler.get_stub = lambda node_id: type(
+            "Stub", (), {"chat_completion": lambda self, data: iter([b"{}"])}
+        )()
+        start = time.monotonic()
+        asyncio.get_running_loop().call_later(0.1, manage.free_capacity)
+        response = await handler.v1_chat_completions({"stream": False}, "rid", time.time())
+        elapsed = time.monotonic() - start
+
+        assert response.status_code == 200
+        assert manage.attempts == 2
+        # Well before the fallback retry interval
+        assert elapsed < handler.RETRY_DELAY_SEC / 2
+
+    asyncio.run(scenario())
+
+
+def test_request_handler_gives_up_at_the_routing_deadline():
+    async def scenario():
+        manage = _StandInSchedulerManage()
+        handler = RequestHandler()
+        handler.set_scheduler_manage(manage)
+        handler.ROUTING_DEADLINE_SEC = 0.2
+        handler.RETRY_DELAY_SEC = 0.05
+
+        response = await handler.v1_chat_completions({"stream": False}, "rid", time.time())
+
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+        assert 2 <= manage.attempts <= 6
+
+    asyncio.run(scenario())
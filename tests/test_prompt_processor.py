@@ -0,0 +1,126 @@
+"""
+Tests for off-executor prompt processing.
+"""
+
+import asyncio
+from http import HTTPStatus
+
+from fastapi.testclient import TestClient
+from jinja2 import TemplateError
+
+from parallax.server.http_server import HTTPHandler, HTTPRequestInfo, app
+from parallax.server.prompt_processor import render_prompt, request_error_payload
+
+
+class FakeTokenizer:
+    def __init__(self, chat_template=None):
+        self.chat_template = chat_template
+        self.calls = []
+
+    def apply_chat_template(self, messages, tools, **kwargs):
+        self.calls.append((messages, tools, kwargs))
+        if messages and messages[0]["content"] == "bad":
+            raise TemplateError("bad template")
+        return [1, 2, 3]
+
+    def encode(self, prompt):
+        return [ord(c) for c in prompt]
+
+
+def test_render_prompt_applies_chat_template_kwargs():
+    tokenizer = FakeTokenizer(chat_template="{{ messages }}")
+    raw_request = {
+        "messages": [{"role": "user", "content": "hi"}],
+        "chat_template_kwargs": {"enable_thinking": False},
+        "extra_body": {"chat_template_kwargs": {"reasoning": "low"}},
+    }
+
+    assert render_prompt(tokenizer, raw_request) == [1, 2, 3]
+    _, tools, kwargs = tokenizer.calls[0]
+    assert tools is None
+    assert kwargs == {
+        "tokenize": True,
+        "add_generation_prompt": True,
+        "enable_thinking": False,
+        "reasoning": "low",
+    }
+
+
+def test_request_error_payload_status():
+    assert (
+        request_error_payload("r", TemplateError("x"))["status_code"]
+        == HTTPStatus.BAD_REQUEST.value
+    )
+    payload = request_error_payload("r", RuntimeError("boom"))
+    assert payload["status_code"] == HTTPStatus.INTERNAL_SERVER_ERROR.value
+    assert payload["error_type"] == "RuntimeError"
+
+
+class FakePromptProcessor:
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    async def process(self, raw_request):
+        return render_prompt(self.tokenizer, raw_request)
+
+
+class FakePool:
+    def __init__(self):
+        self.shutdowns = 0
+
+    def shutdown(self):
+        self.shutdowns += 1
+
+
+class FakeExecutorSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send_pyobj(self, obj):
+        self.sent.append(obj)
+
+
+def make_handler():
+    handler = HTTPHandler.__new__(HTTPHandler)
+    handler.processing_requests = {}
+    handler.prompt_processor = FakePromptProcessor(FakeTokenizer(chat_template="{{ messages }}"))
+    handler.send_to_executor = FakeExecutorSocket()
+    return handler
+
+
+def test_send_request_forwards_tokenized_prompt():
+    handler = make_handler()
+    request = {"rid": "a", "messages": [{"role": "user", "content": "hi"}]}
+    handler.processing_requests["a"] = HTTPRequestInfo(id="a")
+
+    asyncio.run(handler.send_request(request))
+
+    assert handler.send_to_executor.sent == [dict(request, input_ids=[1, 2, 3])]
+
+
+def test_send_request_reports_prompt_errors():
+    handler = make_handler()
+    request = {"rid": "b", "messages": [{"role": "user", "content": "bad"}]}
+    request_info = handler.processing_requests["b"] = HTTPRequestInfo(id="b")
+
+    asyncio.run(handler.send_request(request))
+
+    assert handler.send_to_executor.sent == []
+    assert request_info.is_finish
+    assert request_info.finish_reason == "error"
+    assert request_info.error_status == HTTPStatus.BAD_REQUEST
+
+
+def test_server_shutdown_stops_prompt_workers():
+    handler = make_handler()
+    pool = handler.prompt_processor = FakePool()
+
+    with TestClient(app):
+        app.state.http_handler = handler
+    del app.state.http_handler
+
+    assert pool.shutdowns == 1
+    assert handler.prompt_processor is None
+    # Nothing left to stop on a second shutdown
+    handler.shutdown()
+    assert pool.shutdowns == 1
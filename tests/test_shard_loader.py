@@ -4,6 +4,8 @@ Tests for the shard_loader module.
 
 from unittest.mock import Mock, patch
 
+import pytest
+
 from parallax.server.shard_loader import MLXModelLoader
 
 
@@ -165,3 +167,173 @@ class TestMLXModelLoader:
                 # This should not raise an exception, just log a warning
                 loader = MLXModelLoader("test_model_path")
                 assert not loader.block_class_map
+
+
+def _write_tiny_checkpoint(model_dir, tie_word_embeddings):
+    """Writes a 4-layer Qwen3 checkpoint with a word-level tokenizer."""
+    import json
+
+    import mlx.core as mx
+    from mlx.utils import tree_flatten
+    from mlx_lm.models import qwen3
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    config = {
+        "architectures": ["Qwen3ForCausalLM"],
+        "model_type": "qwen3",
+        "hidden_size": 32,
+        "num_hidden_layers": 4,
+        "intermediate_size": 64,
+        "num_attention_heads": 4,
+        "num_key_value_heads": 2,
+        "head_dim": 8,
+        "rms_norm_eps": 1e-6,
+        "vocab_size": 16,
+        "max_position_embeddings": 128,
+        "rope_theta": 10000.0,
+        "tie_word_embeddings": tie_word_embeddings,
+        "torch_dtype": "float32",
+    }
+    mx.random.seed(0)
+    model = qwen3.Model(qwen3.ModelArgs.from_dict(config))
+    weights = dict(tree_flatten(model.parameters()))
+    # Split the checkpoint over two files like a real sharded checkpoint
+    keys = sorted(weights)
+    mx.save_safetensors(
+        str(model_dir / "model-00001-of-00002.safetensors"), {k: weights[k] for k in keys[::2]}
+    )
+    mx.save_safetensors(
+        str(model_dir / "model-00002-of-00002.safetensors"), {k: weights[k] for k in keys[1::2]}
+    )
+    (model_dir / "config.json").write_text(json.dumps(config))
+
+    tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0, "hi": 1}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]").save_pretrained(
+        model_dir
+    )
+    return weights
+
+
+@pytest.mark.parametrize(
+    "start_layer,end_layer,tie_word_embeddings",
+    [(0, 2, False), (1, 3, False), (2, 4, False), (0, 4, True)],
+)
+def test_load_reads_only_shard_weights(tmp_path, start_layer, end_layer, tie_word_embeddings):
+    """Test that a shard is loaded with exactly its own layers and end weights."""
+    import numpy as np
+    from mlx.utils import tree_flatten
+
+    weights = _write_tiny_checkpoint(tmp_path, tie_word_embeddings)
+    loader = MLXModelLoader(str(tmp_path), start_layer=start_layer, end_layer=end_layer)
+    model_shard, config, _ = loader.load(use_selective_download=False)
+
+    expected = {}
+    for key, value in weights.items():
+        parts = key.split(".")
+        if key.startswith("model.layers."):
+            if start_layer <= int(parts[2]) < end_layer:
+                local_idx = int(parts[2]) - start_layer
+                expected[f"layers.{local_idx}.{'.'.join(parts[3:])}"] = value
+        elif "embed_tokens" in key:
+            if start_layer == 0:
+                expected["embed_tokens.weight"] = value
+            if end_layer == 4 and tie_word_embeddings:
+                expected["lm_head.weight"] = value
+        elif end_layer == 4:
+            expected[key.replace("model.", "", 1)] = value
+
+    loaded = dict(tree_flatten(model_shard.parameters()))
+    assert set(loaded) == set(expected)
+    for key, value in expected.items():
+        np.testing.assert_array_equal(np.array(loaded[key]), np.array(value))
+
+
+@pytest.mark.parametrize(
+    "old_range,new_range,tie_word_embeddings",
+    [
+        ((0, 2), (1, 3), False),
+        ((1, 3), (2, 4), False),
+        ((2, 4), (0, 2), False),
+        ((0, 2), (0, 4), True),
+    ],
+)
+def test_reshard_matches_fresh_load(tmp_path, old_range, new_range, tie_word_embeddings):
+    """Test that a resharded model equals a fresh load and keeps the shared layers."""
+    import numpy as np
+    from mlx.utils import tree_flatten
+
+    _write_tiny_checkpoint(tmp_path, tie_word_embeddings)
+    loader = MLXModelLoader(str(tmp_path), start_layer=old_range[0], end_layer=old_range[1])
+    model_shard, _, _ = loader.load(use_selective_download=False)
+    shared = {
+        idx: model_shard.layers[idx - old_range[0]]
+        for idx in range(max(old_range[0], new_range[0]), min(old_range[1], new_range[1]))
+    }
+
+    resharded = loader.reshard(model_shard, *new_range, use_selective_download=False)
+    fresh_loader = MLXModelLoader(str(tmp_path), start_layer=new_range[0], end_layer=new_range[1])
+    fresh, _, _ = fresh_loader.load(use_selective_download=False)
+
+    assert (resharded.start_layer, resharded.end_layer) == new_range
+    for idx, layer in shared.items():
+        assert resharded.layers[idx - new_range[0]] is layer
+    loaded = dict(tree_flatten(resharded.parameters()))
+    expected = dict(tree_flatten(fresh.parameters()))
+    assert set(loaded) == set(expected)
+    for key, value in expected.items():
+        np.testing.assert_array_equal(np.array(loaded[key]), np.array(value))
+
+
+def test_load_reads_each_weight_file_as_it_is_downloaded(tmp_path):
+    """Test that weight files are read while later files are still being downloaded."""
+    import shutil
+    import threading
+
+    import numpy as np
+    from mlx.utils import tree_flatten
+
+    hub_dir, snapshot_dir = tmp_path / "hub", tmp_path / "snapshot"
+    hub_dir.mkdir()
+    _write_tiny_checkpoint(hub_dir, tie_word_embeddings=False)
+    weight_files = sorted(p.name for p in hub_dir.glob("*.safetensors"))
+    shutil.copytree(hub_dir, snapshot_dir, ignore=shutil.ignore_patterns("*.safetensors"))
+
+    events = []
+    file_read = threading.Event()
+    read_weight_file = MLXModelLoader._read_weight_file
+
+    def recording_read(self, weight_file, config, model_shard):
+        weights = read_weight_file(self, weight_file, config, model_shard)
+        events.append(f"read {weight_file.name}")
+        file_read.set()
+        return weights
+
+    def fake_download(model_path_or_repo, start_layer, end_layer, local_files_only, **kwargs):
+        for name in weight_files:
+            file_read.clear()
+            shutil.copy(hub_dir / name, snapshot_dir / name)
+            events.append(f"downloaded {name}")
+            kwargs["on_weight_file_ready"](snapshot_dir / name)
+            assert file_read.wait(5.0)
+        return snapshot_dir
+
+    loader = MLXModelLoader("org/tiny-qwen3", start_layer=1, end_layer=4)
+    with (
+        patch.object(MLXModelLoader, "_read_weight_file", recording_read),
+        patch(
+            "parallax.utils.selective_download.get_model_path_with_selective_download",
+            fake_download,
+        ),
+    ):
+        model_shard, _, _ = loader.load()
+
+    assert events == [f"{step} {name}" for name in weight_files for step in ("downloaded", "read")]
+    expected_loader = MLXModelLoader(str(hub_dir), start_layer=1, end_layer=4)
+    expected, _, _ = expected_loader.load(use_selective_download=False)
+    loaded = dict(tree_flatten(model_shard.parameters()))
+    expected = dict(tree_flatten(expected.parameters()))
+    assert set(loaded) == set(expected)
+    for key, value in expected.items():
+        np.testing.assert_array_equal(np.array(loaded[key]), np.array(value))
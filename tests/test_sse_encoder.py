@@ -0,0 +1,59 @@
+"""
+Tests for the SSE chunk encoder of streaming chat completions.
+"""
+
+import json
+
+import pytest
+
+from parallax.server.sse_encoder import ChatCompletionChunkEncoder
+
+
+def reference_chunk(rid, model, created, role, content, finish_reason, **fields):
+    """The chunk as built with a full json.dumps of the nested dict."""
+    response = {
+        "id": rid,
+        "object": "chat.completion.chunk",
+        "model": model,
+        "created": created,
+        "choices": [
+            {
+                "index": 0,
+                "logprobs": fields["logprobs"],
+                "finish_reason": finish_reason,
+                "matched_stop": fields["matched_stop"],
+            },
+        ],
+        "usage": {
+            "prompt_tokens": fields["prompt_tokens"],
+            "total_tokens": fields["prompt_tokens"] + fields["completion_tokens"],
+            "completion_tokens": fields["completion_tokens"],
+        },
+    }
+    response["choices"][0]["delta"] = {"role": role, "content": content}
+    response_json = json.dumps(response, separators=(",", ":"))
+    return f"data: {response_json}\n\n".encode()
+
+
+@pytest.mark.parametrize(
+    "role,content,finish_reason,logprobs,matched_stop",
+    [
+        ("assistant", "", None, None, None),
+        ("assistant", "<think>", None, None, None),
+        (None, "Hello", None, None, None),
+        (None, ' "quoted" \\ back\nslash\t', None, None, None),
+        (None, "你好 \U0001f600 café \x00\x1f", None, -0.125, None),
+        (None, None, "eos", None, 0),
+        (None, None, "length", 1e-20, None),
+    ],
+)
+def test_chunks_match_json_dumps(role, content, finish_reason, logprobs, matched_stop):
+    rid, model, created = 'chatcmpl-é"id', "qwen/Qwen3-0.6B", 1730000000.123456
+    fields = dict(
+        logprobs=logprobs, matched_stop=matched_stop, prompt_tokens=17, completion_tokens=42
+    )
+    encoder = ChatCompletionChunkEncoder(rid, model, created)
+
+    chunk = encoder.encode(role=role, content=content, finish_reason=finish_reason, **fields)
+
+    assert chunk == reference_chunk(rid, model, created, role, content, finish_reason, **fields)